@@ -0,0 +1,276 @@
+"""
+Batch Scoring CLI
+Scores a directory tree of leaf photos offline with batched inference.
+
+Images are decoded and resized in a process pool, scored in batches with the
+same rejection rules as the /predict endpoint, and streamed to CSV or Parquet.
+Completed files are recorded in a checkpoint so an interrupted run can resume.
+
+Usage:
+    python batch_score.py BananaLSD/AugmentedSet --output scores.csv
+    python batch_score.py BananaLSD/AugmentedSet --output scores.parquet --format parquet
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "saved_models", "banana_mobilenetv2_final.keras"
+)
+DISEASES = ['cordana', 'healthy', 'pestalotiopsis', 'sigatoka']
+FIELDNAMES = [
+    "path", "predicted_class", "confidence", "entropy", "is_leaf_like",
+    "is_rejected", "rejection_reasons",
+] + [f"prob_{disease}" for disease in DISEASES] + ["error"]
+
+
+def find_images(root_dir):
+    """
+    Walk a directory tree and collect image files in a stable order.
+
+    Args:
+        root_dir: Directory to scan (e.g. BananaLSD/AugmentedSet)
+
+    Returns:
+        Sorted list of paths relative to root_dir
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), root_dir))
+    return paths
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Read the set of files already scored by a previous run.
+
+    Args:
+        checkpoint_path: Path to the checkpoint file
+
+    Returns:
+        Set of relative paths that are complete
+    """
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def decode_image(task):
+    """
+    Decode and resize one image. Runs inside the worker pool.
+
+    Args:
+        task: Tuple of (root_dir, relative_path, target_size)
+
+    Returns:
+        Tuple of (relative_path, uint8 array or None, error message or None)
+    """
+    root_dir, rel_path, target_size = task
+    try:
+        with Image.open(os.path.join(root_dir, rel_path)) as image:
+            # Same steps as BananaLeafClassifier.preprocess_image
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image = image.resize(target_size)
+            return rel_path, np.asarray(image, dtype=np.uint8), None
+    except Exception as e:
+        return rel_path, None, str(e)
+
+
+class CsvResultWriter:
+    """Appends result rows to a CSV file, flushing after every batch."""
+
+    def __init__(self, output_path):
+        write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self._file = open(output_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDNAMES)
+        if write_header:
+            self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Streams result rows to Parquet as one row group per batch.
+
+    Parquet files cannot be appended to, so every run writes a new part file
+    next to the requested output (scores.part0000.parquet, ...).
+    """
+
+    def __init__(self, output_path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+
+        self._pa = pa
+        stem, ext = os.path.splitext(output_path)
+        part = 0
+        while os.path.exists(f"{stem}.part{part:04d}{ext or '.parquet'}"):
+            part += 1
+        self.path = f"{stem}.part{part:04d}{ext or '.parquet'}"
+
+        self._schema = pa.schema(
+            [("path", pa.string()), ("predicted_class", pa.string()),
+             ("confidence", pa.float64()), ("entropy", pa.float64()),
+             ("is_leaf_like", pa.bool_()), ("is_rejected", pa.bool_()),
+             ("rejection_reasons", pa.string())]
+            + [(f"prob_{disease}", pa.float64()) for disease in DISEASES]
+            + [("error", pa.string())]
+        )
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+
+    def write(self, rows):
+        columns = {name: [row.get(name) for row in rows] for name in FIELDNAMES}
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def result_to_row(rel_path, result):
+    """Flatten a classifier result into an output row."""
+    row = {
+        "path": rel_path,
+        "predicted_class": result["predicted_class"],
+        "confidence": result["confidence"],
+        "entropy": result["entropy"],
+        "is_leaf_like": result["is_leaf_like"],
+        "is_rejected": result["is_rejected"],
+        "rejection_reasons": "; ".join(result["rejection_reasons"]),
+        "error": None,
+    }
+    for disease in DISEASES:
+        row[f"prob_{disease}"] = result["all_probabilities"].get(disease)
+    return row
+
+
+def error_row(rel_path, error):
+    """Build an output row for a file that could not be decoded."""
+    row = {name: None for name in FIELDNAMES}
+    row["path"] = rel_path
+    row["error"] = error
+    return row
+
+
+def score_directory(root_dir, output_path, model_path=DEFAULT_MODEL_PATH, output_format="csv",
+                    checkpoint_path=None, batch_size=64, workers=None, target_size=None):
+    """
+    Score every image under root_dir and stream the results to output_path.
+
+    Args:
+        root_dir: Directory tree of images
+        output_path: CSV or Parquet output file
+        model_path: Path to the Keras model
+        output_format: "csv" or "parquet"
+        checkpoint_path: File listing completed images (default: <output>.done)
+        batch_size: Number of images per forward pass
+        workers: Number of decode processes (default: CPU count)
+        target_size: (width, height) images are resized to (default: the loaded model's input size)
+
+    Returns:
+        Number of images scored in this run
+    """
+    checkpoint_path = checkpoint_path or output_path + ".done"
+    completed = load_checkpoint(checkpoint_path)
+    pending = [p for p in find_images(root_dir) if p not in completed]
+
+    print(f"📁 Found {len(pending) + len(completed)} images, {len(completed)} already scored")
+    if not pending:
+        print("✅ Nothing to do")
+        return 0
+
+    # Start the decode workers before TensorFlow is imported so they stay lightweight
+    pool = Pool(processes=workers or os.cpu_count())
+
+    from enhanced_inference import BananaLeafClassifier
+    classifier = BananaLeafClassifier(model_path)
+    target_size = target_size or (classifier.input_size, classifier.input_size)
+    print(f"🔄 Resizing images to {target_size[0]}x{target_size[1]}")
+
+    writer = ParquetResultWriter(output_path) if output_format == "parquet" else CsvResultWriter(output_path)
+    tasks = ((root_dir, rel_path, target_size) for rel_path in pending)
+
+    scored = 0
+    start = time.time()
+    try:
+        with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            decoded = pool.imap(decode_image, tasks, chunksize=8)
+            while True:
+                chunk = [item for _, item in zip(range(batch_size), decoded)]
+                if not chunk:
+                    break
+
+                ok = [(rel_path, array) for rel_path, array, error in chunk if error is None]
+                rows = [error_row(rel_path, error) for rel_path, _, error in chunk if error is not None]
+
+                if ok:
+                    img_batch = np.stack([array for _, array in ok]).astype(np.float32) / 255.0
+                    results = classifier.predict_batch(img_batch, batch_size=batch_size)
+                    rows.extend(result_to_row(rel_path, result) for (rel_path, _), result in zip(ok, results))
+
+                # Results are durable before the files are marked complete
+                writer.write(rows)
+                checkpoint.write("".join(f"{rel_path}\n" for rel_path, _, _ in chunk))
+                checkpoint.flush()
+
+                scored += len(chunk)
+                elapsed = time.time() - start
+                print(f"   {scored}/{len(pending)} images ({scored / elapsed:.1f} img/s)")
+    finally:
+        writer.close()
+        pool.close()
+        pool.join()
+
+    print(f"✅ Scored {scored} images in {time.time() - start:.1f}s")
+    return scored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory of banana leaf images offline.")
+    parser.add_argument("input_dir", help="Directory tree of images, e.g. BananaLSD/AugmentedSet")
+    parser.add_argument("--output", required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None,
+                        help="Output format (default: from the output file extension)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the Keras model")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.done)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+
+    try:
+        score_directory(
+            args.input_dir, args.output, model_path=args.model, output_format=output_format,
+            checkpoint_path=args.checkpoint, batch_size=args.batch_size, workers=args.workers,
+        )
+    except Exception as e:
+        print(f"❌ Batch scoring failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
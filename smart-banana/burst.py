@@ -0,0 +1,197 @@
+"""
+Video and Burst-frame Classification
+Temporally aggregated diagnosis for a camera sweep along a row of plants.
+
+Frames are sampled at a fixed rate, near-identical consecutive frames are
+dropped, and the remaining frames are classified in small batches. Frames
+are pulled lazily from the decoder, so decoding and inference both stop as
+soon as the running diagnosis reaches the confidence target. The cost then
+follows how much new information the frames carry, not how many there are.
+
+Usage:
+    frames = iter_video_frames("sweep.mp4", sample_fps=2)
+    result = classify_frames(classifier, frames, confidence_target=0.9)
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def iter_video_frames(video_path, sample_fps=2.0, max_frames=None):
+    """
+    Yield (timestamp in seconds, RGB uint8 frame) sampled from a video.
+
+    Frames between samples are only grabbed, not decoded into images.
+
+    Args:
+        video_path: Path to the video file
+        sample_fps: Frames per second to sample
+        max_frames: Stop after this many sampled frames
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError("Could not open video")
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(fps / sample_fps)))
+        index = sampled = 0
+        while max_frames is None or sampled < max_frames:
+            if not capture.grab():
+                break
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                sampled += 1
+                yield index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_burst_frames(files, max_frames=None):
+    """
+    Yield (frame index, RGB uint8 frame) from a burst of image files.
+
+    Args:
+        files: Iterable of paths or file-like objects, in capture order
+        max_frames: Stop after this many frames
+    """
+    for index, f in enumerate(files):
+        if max_frames is not None and index >= max_frames:
+            break
+        yield float(index), np.asarray(Image.open(f).convert("RGB"))
+
+
+class FrameDeduplicator:
+    """Drops frames that barely differ from the last kept frame."""
+
+    def __init__(self, threshold=6.0, size=32):
+        """
+        Args:
+            threshold: Mean absolute difference (0-255) on a small grayscale
+                thumbnail below which a frame counts as a duplicate
+            size: Side length of the thumbnail
+        """
+        self.threshold = threshold
+        self.size = size
+        self._last = None
+
+    def is_duplicate(self, frame):
+        thumbnail = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), (self.size, self.size),
+                               interpolation=cv2.INTER_AREA).astype(np.int16)
+        if self._last is not None and np.abs(thumbnail - self._last).mean() < self.threshold:
+            return True
+        self._last = thumbnail
+        return False
+
+
+def classify_frames(classifier, frames, batch_size=8, confidence_target=0.9, min_frames=3,
+                    dedupe_threshold=6.0):
+    """
+    Classify a stream of frames, stopping once the diagnosis is confident.
+
+    The diagnosis is the mean probability over accepted (non-rejected)
+    frames. Processing stops when its top class reaches confidence_target
+    and at least min_frames frames were accepted.
+
+    Args:
+        classifier: A BananaLeafClassifier
+        frames: Iterable of (timestamp, RGB uint8 frame), consumed lazily
+        batch_size: Frames per forward pass
+        confidence_target: Mean probability of the top class needed to stop early
+        min_frames: Accepted frames needed before stopping early
+        dedupe_threshold: See FrameDeduplicator
+
+    Returns:
+        Dictionary with the aggregated diagnosis, frame counts and a per-frame timeline
+    """
+    size = (classifier.input_size, classifier.input_size)
+    deduplicator = FrameDeduplicator(dedupe_threshold)
+    timeline = []
+    accepted = []
+    counts = {"sampled": 0, "duplicates_skipped": 0, "classified": 0, "rejected": 0}
+    stopped_early = False
+
+    def confident():
+        if len(accepted) < min_frames:
+            return False
+        return float(np.mean(accepted, axis=0).max()) >= confidence_target
+
+    batch, sizes, stamps = [], [], []
+    frames = iter(frames)
+    while True:
+        item = next(frames, None)
+        if item is not None:
+            timestamp, frame = item
+            counts["sampled"] += 1
+            if deduplicator.is_duplicate(frame):
+                counts["duplicates_skipped"] += 1
+                continue
+            batch.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            sizes.append((frame.shape[1], frame.shape[0]))
+            stamps.append(timestamp)
+            if len(batch) < batch_size:
+                continue
+        if not batch:
+            break
+
+        results = classifier.predict_batch(np.stack(batch).astype(np.float32) / 255.0, batch_size=batch_size,
+                                           original_sizes=sizes)
+        for timestamp, result in zip(stamps, results):
+            counts["classified"] += 1
+            counts["rejected"] += int(result["is_rejected"])
+            if not result["is_rejected"]:
+                accepted.append([result["all_probabilities"][d] for d in classifier.diseases])
+            timeline.append({
+                "time": round(float(timestamp), 3),
+                "predicted_class": result["predicted_class"],
+                "confidence": round(float(result["confidence"]), 4),
+                "is_rejected": bool(result["is_rejected"]),
+            })
+        batch, sizes, stamps = [], [], []
+
+        if item is None:
+            break
+        if confident():
+            stopped_early = True
+            break
+
+    summary = {"frames": dict(counts, accepted=len(accepted), stopped_early=stopped_early), "timeline": timeline}
+    if not accepted:
+        # Same fields as a gate rejection, so it is counted in the rejection rollups
+        reason = "No frame showed a recognizable banana leaf"
+        summary.update({
+            "is_rejected": True,
+            "rejection_reasons": [reason],
+            "predicted_class": "unknown",
+            "confidence": 0.0,
+            "all_probabilities": {disease: 0.0 for disease in classifier.diseases},
+            "entropy": float(np.log(len(classifier.diseases))),
+            "is_leaf_like": False,
+            "stage": None,
+            "resolution": None,
+            "tta": None,
+            "prediction_id": None,
+            "severity": None,
+            "gates": None,
+            "message": f"{reason}. Please sweep closer to the leaves.",
+        })
+        return summary
+
+    mean = np.mean(accepted, axis=0)
+    top = int(np.argmax(mean))
+    summary.update({
+        "is_rejected": False,
+        "rejection_reasons": [],
+        "predicted_class": classifier.diseases[top],
+        "confidence": float(mean[top]),
+        "entropy": float(-np.sum(mean * np.log(np.clip(mean, 1e-10, 1.0)))),
+        "all_probabilities": {disease: float(p) for disease, p in zip(classifier.diseases, mean)},
+        # Share of accepted frames that agree with the aggregated diagnosis
+        "agreement": float(np.mean(np.argmax(accepted, axis=1) == top)),
+        "message": f"Detected: {classifier.diseases[top]} with {mean[top] * 100:.1f}% confidence "
+                   f"across {len(accepted)} frames",
+    })
+    return summary
@@ -0,0 +1,306 @@
+"""
+Rejection Threshold Calibration
+Tunes the rejection thresholds of BananaLeafClassifier from labeled data.
+
+The model runs once over an in-distribution set (banana leaves, one
+sub-directory per class, or shards from dataset_shards.py) and an
+out-of-distribution set (anything that should be rejected). Probabilities,
+pooled embeddings and green ratios are cached, so threshold grids can then be
+swept in milliseconds with NumPy and re-swept without touching the model.
+
+The chosen thresholds are written to saved_models/thresholds.json, which the
+classifier (and therefore the server) loads at start-up.
+
+Usage:
+    python calibrate_thresholds.py --id-dir shards/ --ood-dir ood_images/
+    python calibrate_thresholds.py --cache calibration_cache.npz --max-ood-accept 0.02
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_score import DEFAULT_MODEL_PATH
+from dataset_shards import iter_source_batches
+
+DISEASES = ['cordana', 'healthy', 'pestalotiopsis', 'sigatoka']
+DEFAULT_CACHE_PATH = "calibration_cache.npz"
+DEFAULT_THRESHOLDS_PATH = os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), "thresholds.json")
+
+# Default sweep grids
+CONFIDENCE_GRID = np.round(np.arange(0.30, 0.951, 0.025), 3)
+ENTROPY_GRID = np.round(np.arange(0.20, 1.401, 0.05), 3)
+GREEN_RATIO_GRID = np.round(np.arange(0.00, 0.501, 0.025), 3)
+
+
+def collect_outputs(classifier, source, labeled, batch_size=64, workers=None):
+    """
+    Run the model once over a dataset and keep everything needed for sweeps.
+
+    Args:
+        classifier: A BananaLeafClassifier
+        source: Shard directory or image directory
+        labeled: Whether class labels are known (in-distribution set)
+        batch_size: Images per forward pass
+        workers: Decode processes for image directories
+
+    Returns:
+        Dictionary of arrays: probs, embeddings, green, labels
+    """
+    probs, embeddings, green, labels = [], [], [], []
+    for images, batch_labels in iter_source_batches(source, batch_size, labeled, workers):
+        img_batch = images.astype(np.float32) / 255.0
+        batch_probs, batch_embeddings = classifier.predict_batch_with_features(img_batch, batch_size=batch_size)
+        probs.append(batch_probs)
+        embeddings.append(batch_embeddings)
+        green.append([classifier.green_ratio(img_batch[i:i + 1]) for i in range(len(img_batch))])
+        labels.append(batch_labels)
+        print(f"   {sum(len(p) for p in probs)} images from {source}")
+
+    if not probs:
+        raise ValueError(f"No images found in {source}")
+
+    return {
+        "probs": np.concatenate(probs).astype(np.float32),
+        "embeddings": np.concatenate(embeddings).astype(np.float32),
+        "green": np.concatenate(green).astype(np.float32),
+        "labels": np.concatenate(labels),
+    }
+
+
+def build_cache(id_source, ood_source, cache_path, model_path=DEFAULT_MODEL_PATH, batch_size=64, workers=None):
+    """Run inference over both sets and save the outputs to cache_path."""
+    from enhanced_inference import BananaLeafClassifier
+    classifier = BananaLeafClassifier(model_path)
+
+    print("🔄 Scoring in-distribution set...")
+    id_out = collect_outputs(classifier, id_source, labeled=True, batch_size=batch_size, workers=workers)
+    print("🔄 Scoring out-of-distribution set...")
+    ood_out = collect_outputs(classifier, ood_source, labeled=False, batch_size=batch_size, workers=workers)
+
+    np.savez_compressed(
+        cache_path,
+        **{f"id_{key}": value for key, value in id_out.items()},
+        **{f"ood_{key}": value for key, value in ood_out.items()},
+    )
+    print(f"💾 Cached model outputs to {cache_path}")
+
+
+def load_cache(cache_path):
+    """Load cached outputs into {"id": {...}, "ood": {...}}."""
+    data = np.load(cache_path)
+    return {
+        split: {key: data[f"{split}_{key}"] for key in ("probs", "embeddings", "green", "labels")}
+        for split in ("id", "ood")
+    }
+
+
+def _signals(outputs):
+    """Per-image confidence and entropy, computed the same way as the classifier."""
+    probs = np.clip(outputs["probs"], 1e-10, 1.0)
+    confidence = outputs["probs"].max(axis=1)
+    entropy = -np.sum(probs * np.log(probs), axis=1)
+    return confidence, entropy, outputs["green"]
+
+
+def _accept_counts(confidence, entropy, green, weights, conf_grid, ent_grid, green_grid):
+    """
+    Weighted number of accepted images for every threshold combination.
+
+    An image is accepted when confidence >= c, entropy <= e and green > g,
+    matching BananaLeafClassifier._build_result. The three per-threshold masks
+    are combined with one matrix product instead of a loop over the grid.
+
+    Returns:
+        Array of shape (len(conf_grid), len(ent_grid), len(green_grid))
+    """
+    conf_ok = (confidence[None, :] >= conf_grid[:, None]).astype(np.float32)
+    ent_ok = (entropy[None, :] <= ent_grid[:, None]).astype(np.float32)
+    green_ok = (green[None, :] > green_grid[:, None]).astype(np.float32) * weights[None, :]
+
+    pair_ok = (conf_ok[:, None, :] * ent_ok[None, :, :]).reshape(-1, len(confidence))
+    return (pair_ok @ green_ok.T).reshape(len(conf_grid), len(ent_grid), len(green_grid))
+
+
+def sweep(cache, conf_grid=CONFIDENCE_GRID, ent_grid=ENTROPY_GRID, green_grid=GREEN_RATIO_GRID):
+    """
+    Evaluate every threshold combination against the cached outputs.
+
+    Returns:
+        Dictionary of grids plus id_accept, id_accepted_accuracy and ood_accept
+        arrays, each of shape (len(conf_grid), len(ent_grid), len(green_grid))
+    """
+    id_conf, id_ent, id_green = _signals(cache["id"])
+    ood_conf, ood_ent, ood_green = _signals(cache["ood"])
+    correct = (cache["id"]["probs"].argmax(axis=1) == cache["id"]["labels"]).astype(np.float32)
+
+    n_id, n_ood = len(id_conf), len(ood_conf)
+    id_accepted = _accept_counts(id_conf, id_ent, id_green, np.ones(n_id, np.float32),
+                                 conf_grid, ent_grid, green_grid)
+    id_correct = _accept_counts(id_conf, id_ent, id_green, correct, conf_grid, ent_grid, green_grid)
+    ood_accepted = _accept_counts(ood_conf, ood_ent, ood_green, np.ones(n_ood, np.float32),
+                                  conf_grid, ent_grid, green_grid)
+
+    return {
+        "conf_grid": conf_grid,
+        "ent_grid": ent_grid,
+        "green_grid": green_grid,
+        "id_accept": id_accepted / max(n_id, 1),
+        "id_accepted_accuracy": np.divide(id_correct, id_accepted, out=np.zeros_like(id_correct),
+                                          where=id_accepted > 0),
+        "ood_accept": ood_accepted / max(n_ood, 1),
+    }
+
+
+def _row(results, index):
+    """Thresholds and rates of one flat grid index as a row dictionary."""
+    c, e, g = np.unravel_index(index, results["id_accept"].shape)
+    return {
+        "min_confidence_threshold": float(results["conf_grid"][c]),
+        "max_entropy_threshold": float(results["ent_grid"][e]),
+        "min_green_ratio": float(results["green_grid"][g]),
+        "id_accept": float(results["id_accept"].flat[index]),
+        "id_accepted_accuracy": float(results["id_accepted_accuracy"].flat[index]),
+        "ood_accept": float(results["ood_accept"].flat[index]),
+    }
+
+
+def tradeoff_table(results, points=20):
+    """
+    ROC-style table: for a range of out-of-distribution acceptance budgets,
+    the threshold combination that keeps the most in-distribution images.
+
+    Returns:
+        List of row dictionaries, ordered by ood_accept
+    """
+    id_accept = results["id_accept"].ravel()
+    ood_accept = results["ood_accept"].ravel()
+    accuracy = results["id_accepted_accuracy"].ravel()
+
+    rows = []
+    for budget in np.linspace(0.0, 1.0, points + 1):
+        candidates = np.flatnonzero(ood_accept <= budget)
+        if len(candidates) == 0:
+            continue
+        best = candidates[np.lexsort((accuracy[candidates], id_accept[candidates]))[-1]]
+        row = _row(results, best)
+        if not rows or row != rows[-1]:
+            rows.append(row)
+    return rows
+
+
+def choose_thresholds(results, max_ood_accept=0.05, min_accuracy=0.0):
+    """
+    Pick the combination that accepts the most in-distribution images while
+    accepting at most max_ood_accept of the out-of-distribution set and
+    reaching min_accuracy on the accepted in-distribution images.
+
+    Both constraints are applied to the full grid, so a combination that
+    meets the accuracy floor is found even where it is not the best for its
+    budget in the trade-off table.
+
+    Returns:
+        Row dictionary for the chosen thresholds
+
+    Raises:
+        ValueError: Naming the constraint no combination can meet
+    """
+    id_accept = results["id_accept"].ravel()
+    ood_accept = results["ood_accept"].ravel()
+    accuracy = results["id_accepted_accuracy"].ravel()
+
+    within_budget = ood_accept <= max_ood_accept
+    if not within_budget.any():
+        raise ValueError(f"No thresholds accept <= {max_ood_accept:.1%} of out-of-distribution images")
+    candidates = np.flatnonzero(within_budget & (accuracy >= min_accuracy))
+    if len(candidates) == 0:
+        raise ValueError(
+            f"No thresholds that accept <= {max_ood_accept:.1%} of out-of-distribution images reach "
+            f"--min-accuracy {min_accuracy:.1%} (best within the budget: {accuracy[within_budget].max():.1%})"
+        )
+    return _row(results, candidates[np.lexsort((accuracy[candidates], id_accept[candidates]))[-1]])
+
+
+def write_thresholds(chosen, thresholds_path, cache_path):
+    """Write the chosen thresholds in the format BananaLeafClassifier.load_thresholds reads."""
+    config = {
+        "min_confidence_threshold": chosen["min_confidence_threshold"],
+        "max_entropy_threshold": chosen["max_entropy_threshold"],
+        "min_green_ratio": chosen["min_green_ratio"],
+        "calibration": {
+            "id_accept": chosen["id_accept"],
+            "id_accepted_accuracy": chosen["id_accepted_accuracy"],
+            "ood_accept": chosen["ood_accept"],
+            "cache": os.path.basename(cache_path),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+    }
+    os.makedirs(os.path.dirname(thresholds_path) or ".", exist_ok=True)
+    with open(thresholds_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    print(f"💾 Thresholds written to {thresholds_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the classifier's rejection thresholds.")
+    parser.add_argument("--id-dir", help="In-distribution images (class sub-directories) or shard directory")
+    parser.add_argument("--ood-dir", help="Out-of-distribution images or shard directory")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Cache of model outputs")
+    parser.add_argument("--refresh", action="store_true", help="Re-run inference even if the cache exists")
+    parser.add_argument("--max-ood-accept", type=float, default=0.05,
+                        help="Largest acceptable fraction of out-of-distribution images accepted")
+    parser.add_argument("--min-accuracy", type=float, default=0.0,
+                        help="Smallest acceptable accuracy on accepted in-distribution images")
+    parser.add_argument("--table", default="threshold_tradeoffs.csv", help="Where to write the trade-off table")
+    parser.add_argument("--output", default=DEFAULT_THRESHOLDS_PATH, help="Thresholds config to write")
+    parser.add_argument("--dry-run", action="store_true", help="Print the choice without writing the config")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.refresh or not os.path.exists(args.cache):
+            if not args.id_dir or not args.ood_dir:
+                parser.error("--id-dir and --ood-dir are required to build the cache")
+            build_cache(args.id_dir, args.ood_dir, args.cache, model_path=args.model,
+                        batch_size=args.batch_size, workers=args.workers)
+
+        cache = load_cache(args.cache)
+        start = time.perf_counter()
+        results = sweep(cache)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        n_combos = results["id_accept"].size
+        print(f"⚡ Swept {n_combos} threshold combinations in {elapsed_ms:.1f} ms")
+
+        rows = tradeoff_table(results)
+        with open(args.table, "w", encoding="utf-8") as f:
+            f.write(",".join(rows[0].keys()) + "\n")
+            for row in rows:
+                f.write(",".join(str(value) for value in row.values()) + "\n")
+
+        print(f"{'conf':>6} {'entropy':>8} {'green':>6} {'id_accept':>10} {'id_acc':>7} {'ood_accept':>11}")
+        for row in rows:
+            print(f"{row['min_confidence_threshold']:>6.3f} {row['max_entropy_threshold']:>8.3f} "
+                  f"{row['min_green_ratio']:>6.3f} {row['id_accept']:>10.1%} "
+                  f"{row['id_accepted_accuracy']:>7.1%} {row['ood_accept']:>11.1%}")
+
+        chosen = choose_thresholds(results, args.max_ood_accept, args.min_accuracy)
+        print(f"✅ Chosen: confidence >= {chosen['min_confidence_threshold']}, "
+              f"entropy <= {chosen['max_entropy_threshold']}, green > {chosen['min_green_ratio']}")
+
+        if not args.dry_run:
+            write_thresholds(chosen, args.output, args.cache)
+    except Exception as e:
+        print(f"❌ Calibration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
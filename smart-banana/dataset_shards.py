@@ -0,0 +1,471 @@
+"""
+Dataset Shards
+Converts an image dataset (one sub-directory per class) into pre-decoded,
+fixed-size uint8 shards so training, evaluation and calibration do not have to
+decode JPEGs again.
+
+Each shard is a pair of .npy files (images and labels) that can be memory
+mapped, and index.json records which source file is stored at which row.
+Rebuilding only touches shards whose source files changed or were removed;
+new images are packed into new shards. Files that fail to decode are
+recorded in the index and only retried once they change.
+
+Usage:
+    python dataset_shards.py build BananaLSD/AugmentedSet shards/
+    python dataset_shards.py info shards/
+    python dataset_shards.py evaluate shards/ --model saved_models/banana_mobilenetv2_final.keras
+"""
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+from batch_score import decode_image, find_images, IMAGE_EXTENSIONS
+
+DISEASES = ['cordana', 'healthy', 'pestalotiopsis', 'sigatoka']
+INDEX_FILE = "index.json"
+DEFAULT_SHARD_SIZE = 1024
+DEFAULT_IMAGE_SIZE = (160, 160)
+
+
+def scan_dataset(data_dir, diseases=DISEASES):
+    """
+    List every image of every class with the metadata used to detect changes.
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        diseases: Class names, in label order
+
+    Returns:
+        Dictionary mapping relative path to {"label", "size", "mtime"}
+    """
+    files = {}
+    for label, disease in enumerate(diseases):
+        class_dir = os.path.join(data_dir, disease)
+        if not os.path.exists(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stat = os.stat(os.path.join(class_dir, filename))
+            files[f"{disease}/{filename}"] = {
+                "label": label,
+                "size": stat.st_size,
+                "mtime": int(stat.st_mtime),
+            }
+    return files
+
+
+def load_index(shard_dir):
+    """Load index.json, or return an empty index if the directory is new."""
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_index(shard_dir, index):
+    """Write index.json atomically so readers never see a partial file."""
+    tmp_path = os.path.join(shard_dir, INDEX_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, os.path.join(shard_dir, INDEX_FILE))
+
+
+def _write_shard(shard_dir, name, data_dir, entries, image_size, pool):
+    """
+    Decode the given files and save them as one shard.
+
+    Returns:
+        Tuple of (shard description for index.json, or None if no file decoded,
+        list of entries that failed to decode with their error)
+    """
+    tasks = [(data_dir, entry["path"], image_size) for entry in entries]
+    images, kept, failed = [], [], []
+    for entry, (_, array, error) in zip(entries, pool.imap(decode_image, tasks, chunksize=16)):
+        if error is not None:
+            print(f"   ⚠️  Skipping {entry['path']}: {error}")
+            failed.append(dict(entry, error=error))
+            continue
+        images.append(array)
+        kept.append(entry)
+
+    if not kept:
+        return None, failed
+
+    labels = np.array([entry["label"] for entry in kept], dtype=np.int64)
+    np.save(os.path.join(shard_dir, f"{name}.images.npy"), np.stack(images))
+    np.save(os.path.join(shard_dir, f"{name}.labels.npy"), labels)
+
+    return {"name": name, "files": kept}, failed
+
+
+def build_shards(data_dir, shard_dir, shard_size=DEFAULT_SHARD_SIZE, image_size=DEFAULT_IMAGE_SIZE, workers=None):
+    """
+    Create or incrementally update the shards for a dataset.
+
+    Shards whose files are all unchanged are kept as they are. Files from
+    shards that lost or changed a member are re-packed together with newly
+    added images, and the stale shard files are deleted. Files that failed to
+    decode are listed under "failed" and skipped until their size or mtime changes.
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        shard_dir: Output directory for shards and index.json
+        shard_size: Maximum images per shard
+        image_size: (width, height) images are resized to
+        workers: Number of decode processes (default: CPU count)
+
+    Returns:
+        The updated index
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    current = scan_dataset(data_dir)
+    index = load_index(shard_dir)
+
+    if index is not None and tuple(index["image_size"]) != tuple(image_size):
+        print(f"🔄 Image size changed from {index['image_size']} to {list(image_size)}, rebuilding everything")
+        index = None
+    if index is None:
+        index = {"diseases": DISEASES, "image_size": list(image_size), "next_shard": 0, "shards": []}
+
+    def unchanged(entry):
+        meta = current.get(entry["path"])
+        return meta is not None and meta["size"] == entry["size"] and meta["mtime"] == entry["mtime"]
+
+    kept_shards, repack = [], []
+    for shard in index["shards"]:
+        # Empty shards (left by older builds) are dropped
+        if shard["files"] and all(unchanged(entry) for entry in shard["files"]):
+            kept_shards.append(shard)
+        else:
+            repack.append(shard)
+
+    failed = [entry for entry in index.get("failed", []) if unchanged(entry)]
+    stored = {entry["path"] for shard in kept_shards for entry in shard["files"]}
+    skipped = {entry["path"] for entry in failed}
+    pending = [dict(path=path, **meta) for path, meta in current.items() if path not in stored and path not in skipped]
+
+    print(f"📁 {len(current)} images: {len(stored)} up to date in {len(kept_shards)} shards, "
+          f"{len(skipped)} undecodable, {len(pending)} to write, {len(repack)} shards to replace")
+
+    new_shards = []
+    if pending:
+        with Pool(processes=workers or os.cpu_count()) as pool:
+            for start in range(0, len(pending), shard_size):
+                name = f"shard_{index['next_shard']:05d}"
+                shard, shard_failed = _write_shard(
+                    shard_dir, name, data_dir, pending[start:start + shard_size], image_size, pool
+                )
+                failed.extend(shard_failed)
+                if shard is None:
+                    continue
+                index["next_shard"] += 1
+                new_shards.append(shard)
+                print(f"   💾 {name}: {len(shard['files'])} images")
+
+    index["shards"] = kept_shards + new_shards
+    index["failed"] = failed
+    _write_index(shard_dir, index)
+
+    # Only remove old files once the new index no longer points at them
+    for shard in repack:
+        for suffix in (".images.npy", ".labels.npy"):
+            path = os.path.join(shard_dir, shard["name"] + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"✅ {sum(len(s['files']) for s in index['shards'])} images in {len(index['shards'])} shards")
+    return index
+
+
+class ShardedDataset:
+    """
+    Read-only view over a shard directory.
+
+    Images are memory mapped, so slicing within a shard returns a view of the
+    file contents without copying or decoding.
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self.index = load_index(shard_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No {INDEX_FILE} in {shard_dir}; run 'dataset_shards.py build' first")
+
+        self.diseases = self.index["diseases"]
+        self.image_size = tuple(self.index["image_size"])
+        self.images = []
+        self.shard_labels = []
+        self.paths = []
+        for shard in self.index["shards"]:
+            self.images.append(np.load(os.path.join(shard_dir, f"{shard['name']}.images.npy"), mmap_mode="r"))
+            self.shard_labels.append(np.load(os.path.join(shard_dir, f"{shard['name']}.labels.npy")))
+            self.paths.extend(entry["path"] for entry in shard["files"])
+
+        sizes = [len(labels) for labels in self.shard_labels]
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.labels = np.concatenate(self.shard_labels) if self.shard_labels else np.zeros(0, np.int64)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, idx):
+        shard = int(np.searchsorted(self._offsets, idx, side="right") - 1)
+        return self.images[shard][idx - self._offsets[shard]], self.labels[idx]
+
+    def split(self, validation_split=0.2):
+        """
+        Split into training and validation indices the same way train.py does:
+        per class, over sorted file names.
+
+        Returns:
+            Tuple of (train_indices, val_indices)
+        """
+        order = sorted(range(len(self.paths)), key=lambda i: self.paths[i])
+        train_idx, val_idx = [], []
+        for label in range(len(self.diseases)):
+            members = [i for i in order if self.labels[i] == label]
+            split_at = int(len(members) * validation_split)
+            val_idx.extend(members[:split_at])
+            train_idx.extend(members[split_at:])
+        return np.array(train_idx, dtype=np.int64), np.array(val_idx, dtype=np.int64)
+
+    def iter_batches(self, batch_size=64, indices=None):
+        """
+        Yield (images, labels, indices) batches in storage order.
+
+        Without indices, batches never cross a shard boundary, so every image
+        batch is a zero-copy slice of a memory-mapped shard. With indices, rows
+        are gathered into a new array.
+
+        Args:
+            batch_size: Maximum rows per batch
+            indices: Optional array of global row indices to read
+
+        Yields:
+            Tuple of (uint8 images, labels, global indices)
+        """
+        if indices is None:
+            for shard, images in enumerate(self.images):
+                offset = self._offsets[shard]
+                for start in range(0, len(images), batch_size):
+                    stop = min(start + batch_size, len(images))
+                    yield (images[start:stop], self.shard_labels[shard][start:stop],
+                           np.arange(offset + start, offset + stop))
+            return
+
+        indices = np.asarray(indices, dtype=np.int64)
+        shards = np.searchsorted(self._offsets, indices, side="right") - 1
+        for start in range(0, len(indices), batch_size):
+            batch_idx = indices[start:start + batch_size]
+            batch_shards = shards[start:start + batch_size]
+            images = np.stack([
+                self.images[s][i - self._offsets[s]] for s, i in zip(batch_shards, batch_idx)
+            ])
+            yield images, self.labels[batch_idx], batch_idx
+
+
+def _iter_image_dir(image_dir, batch_size, labeled, workers, paths=None):
+    """
+    Decode an image directory (or the given paths within it) in a worker pool and yield uint8 batches.
+
+    For labeled sets the first path component is the class name.
+    """
+    if paths is None:
+        paths = find_images(image_dir)
+    if labeled:
+        paths = [p for p in paths if p.replace("\\", "/").split("/")[0] in DISEASES]
+
+    with Pool(processes=workers or os.cpu_count()) as pool:
+        chunk = []
+        for item in pool.imap(decode_image, ((image_dir, p, DEFAULT_IMAGE_SIZE) for p in paths), chunksize=8):
+            if item[2] is not None:
+                print(f"   ⚠️  Skipping {item[0]}: {item[2]}")
+                continue
+            chunk.append(item)
+            if len(chunk) == batch_size:
+                yield _stack(chunk, labeled)
+                chunk = []
+        if chunk:
+            yield _stack(chunk, labeled)
+
+
+def _stack(chunk, labeled):
+    """Stack decoded images and derive labels from the class directory name."""
+    images = np.stack([array for _, array, _ in chunk])
+    labels = np.array([
+        DISEASES.index(rel_path.replace("\\", "/").split("/")[0]) if labeled else -1
+        for rel_path, _, _ in chunk
+    ], dtype=np.int64)
+    return images, labels
+
+
+def iter_source_batches(source, batch_size=64, labeled=False, workers=None):
+    """
+    Yield (uint8 images, labels) batches from a shard directory or an image directory.
+
+    Args:
+        source: Shard directory (with index.json) or a directory tree of images
+        batch_size: Maximum images per batch
+        labeled: Whether labels are wanted; unlabeled batches get -1
+        workers: Decode processes for image directories
+
+    Yields:
+        Tuple of (uint8 images of shape (N, 160, 160, 3), labels)
+    """
+    if os.path.exists(os.path.join(source, INDEX_FILE)):
+        for images, labels, _ in ShardedDataset(source).iter_batches(batch_size):
+            yield images, (labels if labeled else np.full(len(labels), -1, dtype=np.int64))
+    else:
+        yield from _iter_image_dir(source, batch_size, labeled, workers)
+
+
+def stratified_sample(labels, counts, seed=0):
+    """
+    Draw disjoint random samples of row indices, each holding the classes in proportion.
+
+    Args:
+        labels: Class (or any stratum key) of every row
+        counts: Size of each sample; later samples get fewer rows if there are not enough
+        seed: Random seed, so the same samples are drawn on every run
+
+    Returns:
+        List of sorted index arrays, one per count
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels)
+    # Shuffle each class and spread its members evenly over [0, 1), so any
+    # prefix of the merged order holds every class in proportion
+    keys = np.empty(len(labels))
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        keys[members] = (np.arange(len(members)) + rng.random()) / len(members)
+    order = np.argsort(keys, kind="stable")
+
+    samples, start = [], 0
+    for count in counts:
+        samples.append(np.sort(order[start:start + count]))
+        start += count
+    return samples
+
+
+def sample_source(source, counts, seed=0, workers=None):
+    """
+    Read disjoint, class-stratified random samples of a shard or image directory as uint8.
+
+    In an image directory the first path component is the stratum, so class
+    sub-directories are sampled in proportion whether or not they are known classes.
+    Files that fail to decode are left out of their sample.
+
+    Args:
+        source: Shard directory (with index.json) or a directory tree of images
+        counts: Size of each sample
+        seed: Random seed
+        workers: Decode processes for image directories
+
+    Returns:
+        List of uint8 arrays of shape (N, height, width, 3), one per count
+    """
+    if os.path.exists(os.path.join(source, INDEX_FILE)):
+        dataset = ShardedDataset(source)
+        width, height = dataset.image_size
+        batches = [
+            [images for images, _, _ in dataset.iter_batches(indices=indices)]
+            for indices in stratified_sample(dataset.labels, counts, seed)
+        ]
+    else:
+        width, height = DEFAULT_IMAGE_SIZE
+        paths = find_images(source)
+        strata = [os.path.dirname(p.replace("\\", "/")).split("/")[0] for p in paths]
+        batches = [
+            [images for images, _ in _iter_image_dir(source, 64, False, workers, [paths[i] for i in indices])]
+            for indices in stratified_sample(strata, counts, seed)
+        ]
+    return [np.concatenate(b) if b else np.zeros((0, height, width, 3), np.uint8) for b in batches]
+
+
+def evaluate_shards(shard_dir, model_path, batch_size=64):
+    """
+    Score every image in a shard directory and report accuracy and rejections.
+
+    Args:
+        shard_dir: Shard directory
+        model_path: Path to the Keras model
+        batch_size: Images per forward pass
+
+    Returns:
+        Dictionary with accuracy, accepted accuracy and rejection rate
+    """
+    from enhanced_inference import BananaLeafClassifier
+
+    dataset = ShardedDataset(shard_dir)
+    classifier = BananaLeafClassifier(model_path)
+
+    correct = rejected = accepted_correct = 0
+    for images, labels, _ in dataset.iter_batches(batch_size):
+        results = classifier.predict_batch(images.astype(np.float32) / 255.0, batch_size=batch_size)
+        for label, result in zip(labels, results):
+            is_correct = result["predicted_class"] == dataset.diseases[label]
+            correct += is_correct
+            rejected += result["is_rejected"]
+            accepted_correct += is_correct and not result["is_rejected"]
+
+    total = len(dataset)
+    accepted = total - rejected
+    report = {
+        "images": total,
+        "accuracy": correct / total if total else 0.0,
+        "rejection_rate": rejected / total if total else 0.0,
+        "accepted_accuracy": accepted_correct / accepted if accepted else 0.0,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and use pre-decoded dataset shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Create or update shards from an image directory")
+    build.add_argument("data_dir", help="Directory with one sub-directory per class")
+    build.add_argument("shard_dir", help="Output directory")
+    build.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    build.add_argument("--image-size", type=int, default=DEFAULT_IMAGE_SIZE[0])
+    build.add_argument("--workers", type=int, default=None)
+
+    info = subparsers.add_parser("info", help="Show shard statistics")
+    info.add_argument("shard_dir")
+
+    evaluate = subparsers.add_parser("evaluate", help="Evaluate a model on the shards")
+    evaluate.add_argument("shard_dir")
+    evaluate.add_argument("--model", required=True)
+    evaluate.add_argument("--batch-size", type=int, default=64)
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            build_shards(args.data_dir, args.shard_dir, shard_size=args.shard_size,
+                         image_size=(args.image_size, args.image_size), workers=args.workers)
+        elif args.command == "info":
+            dataset = ShardedDataset(args.shard_dir)
+            print(f"📁 {len(dataset)} images in {len(dataset.images)} shards at {dataset.image_size}")
+            for label, disease in enumerate(dataset.diseases):
+                print(f"   {disease}: {int(np.sum(dataset.labels == label))} images")
+        else:
+            evaluate_shards(args.shard_dir, args.model, batch_size=args.batch_size)
+    except Exception as e:
+        print(f"❌ {args.command} failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,234 @@
 import numpy as np
 import cv2
+import os
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import img_to_array
 from PIL import Image
 import json
+import logging
+import threading
+
+from gates import green_mask, green_ratio as green_ratio_uint8, leaf_color_stats
+from tracing import span
+
+# Rejection thresholds that may be overridden from a thresholds config
+THRESHOLD_KEYS = ('min_confidence_threshold', 'max_entropy_threshold', 'min_green_ratio')
+
+logger = logging.getLogger(__name__)
+
+class UnsupportedModelError(ValueError):
+    """Raised when an operation needs layer access that a TFLite variant does not have."""
+
+class TFLiteModel:
+    """
+    Minimal Keras-like wrapper around a TFLite interpreter, so quantized
+    variants from model_converter.py can be served by BananaLeafClassifier.
+    
+    The interpreter is not thread-safe, so predict holds a lock from the
+    input resize through reading the output. Layer access (features,
+    Grad-CAM) is not available; BananaLeafClassifier raises
+    UnsupportedModelError for those instead.
+    """
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self._input['shape'])
+        self.output_shape = tuple(self._output['shape'])
+        self._batch_size = int(self.input_shape[0])
+        self._lock = threading.Lock()
+    
+    def predict(self, img_batch, batch_size=None, verbose=0):
+        """
+        Run inference on a float batch scaled to [0, 1].
+        
+        Args:
+            img_batch: Array of shape (N, height, width, 3)
+            batch_size: Unused; the whole batch is run in one invocation
+            verbose: Unused, accepted for Keras compatibility
+            
+        Returns:
+            Array of class probabilities with shape (N, num_classes)
+        """
+        img_batch = np.asarray(img_batch, dtype=np.float32)
+        
+        # Quantize inputs for integer models
+        input_dtype = self._input['dtype']
+        if input_dtype != np.float32:
+            scale, zero_point = self._input['quantization']
+            info = np.iinfo(input_dtype)
+            img_batch = np.clip(np.round(img_batch / scale + zero_point), info.min, info.max).astype(input_dtype)
+        
+        # One caller at a time: resizing, setting the input and reading the output share interpreter state
+        with self._lock:
+            if len(img_batch) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], [len(img_batch), *self.input_shape[1:]])
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(img_batch)
+            self.interpreter.set_tensor(self._input['index'], img_batch)
+            self.interpreter.invoke()
+            # get_tensor copies, so the result is safe to use after the lock is released
+            output = self.interpreter.get_tensor(self._output['index'])
+        
+        # Dequantize integer outputs
+        if self._output['dtype'] != np.float32:
+            scale, zero_point = self._output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        
+        return output
+
+def load_any_model(model_path):
+    """Load a Keras model, or a TFLite model if the path ends in .tflite."""
+    if model_path.endswith('.tflite'):
+        return TFLiteModel(model_path)
+    return load_model(model_path, compile=False)
+
+def tile_grid(height, width, tile, overlap=0.25, max_tiles=48):
+    """
+    Plan the tile grid for predict_tiled.
+    
+    Small images are enlarged to one tile; large ones are shrunk until the grid
+    fits in max_tiles. Once the shorter side is down to one tile, the tiles
+    along the long side are spaced further apart instead.
+    
+    Args:
+        height, width: Size of the photo
+        tile: Tile size (the model input size)
+        overlap: Fraction of a tile shared with its neighbour
+        max_tiles: Maximum number of tiles in the grid
+        
+    Returns:
+        Tuple of (scale, (width, height) after scaling, tile tops, tile lefts)
+    """
+    stride = max(1, int(round(tile * (1 - overlap))))
+    
+    def grid_size(h, w):
+        return 1 + -(-max(0, h - tile) // stride), 1 + -(-max(0, w - tile) // stride)
+    
+    min_scale = tile / min(height, width)
+    scale = max(1.0, min_scale)
+    rows, cols = grid_size(int(height * scale), int(width * scale))
+    while rows * cols > max_tiles and scale > min_scale:
+        scale = max(min_scale, scale * min(0.95, np.sqrt(max_tiles / (rows * cols))))
+        rows, cols = grid_size(int(height * scale), int(width * scale))
+    if scale != 1.0:
+        width, height = max(tile, int(width * scale)), max(tile, int(height * scale))
+    
+    row_stride = col_stride = stride
+    if rows * cols > max_tiles:
+        if cols >= rows:
+            cols = max(1, max_tiles // rows)
+            col_stride = -(-(width - tile) // max(1, cols - 1))
+        else:
+            rows = max(1, max_tiles // cols)
+            row_stride = -(-(height - tile) // max(1, rows - 1))
+    
+    # Last row/column is aligned with the image edge
+    tops = np.minimum(np.arange(rows) * row_stride, height - tile)
+    lefts = np.minimum(np.arange(cols) * col_stride, width - tile)
+    return scale, (width, height), tops, lefts
+
 
 class BananaLeafClassifier:
-    def __init__(self, model_path, class_indices_path=None):
+    def __init__(self, model_path, class_indices_path=None, thresholds_path=None,
+                 cascade_model_path=None, cascade_min_confidence=0.9, cascade_max_entropy=0.35,
+                 gates=None, resolution_model_paths=None, tta_entropy_threshold=None, tta_crop_scale=0.9,
+                 input_cache=None):
         """
         Initialize the enhanced banana leaf classifier with out-of-distribution detection.
         
         Args:
             model_path: Path to the trained model
             class_indices_path: Path to class indices JSON file
+            thresholds_path: Path to a thresholds JSON written by calibrate_thresholds.py
+                (defaults to thresholds.json next to the model, if present)
+            cascade_model_path: Optional cheap model (small or low-resolution) that runs
+                first; the full model only runs when its answer is not decisive
+            cascade_min_confidence: Escalate when the cheap model's confidence is below this
+            cascade_max_entropy: Escalate when the cheap model's entropy is above this
+            gates: Optional gates.GatePipeline run before inference; images that
+                fail a gate are rejected without running the model
+            resolution_model_paths: Optional {input_size: model_path} of the same model
+                trained at other input sizes, for load-adaptive serving
+            tta_entropy_threshold: Enable test-time augmentation for images whose
+                first prediction has entropy above this (None disables it)
+            tta_crop_scale: Side length of the TTA crops relative to the image
+            input_cache: Optional explain.InputCache; when set, every prediction's
+                preprocessed input is kept under a prediction ID for later explanation
         """
-        self.model = load_model(model_path, compile=False)
+        self.model = load_any_model(model_path)
         self.diseases = ['cordana', 'healthy', 'pestalotiopsis', 'sigatoka']
+        self._feature_model = None
+        
+        # Models by input resolution; the main model serves its native size
+        self.input_size = int(self.model.input_shape[1] or 160)
+        self.resolution_models = {self.input_size: self.model}
+        for size, path in (resolution_model_paths or {}).items():
+            self.add_resolution_variant(size, path)
+        
+        # Two-stage cascade: cheap model first, full model on uncertainty
+        self.cascade_model = load_any_model(cascade_model_path) if cascade_model_path else None
+        self.cascade_min_confidence = cascade_min_confidence
+        self.cascade_max_entropy = cascade_max_entropy
+        self.stage_counts = {"cascade": 0, "full": 0, "gate": 0, "tiled": 0}
+        
+        # Cheap pre-inference checks (see gates.py)
+        self.gates = gates
+        
+        # Optional micro_batcher.MicroBatcher shared by single-image callers
+        self.batcher = None
+        
+        # Test-time augmentation for borderline images
+        self.tta_entropy_threshold = tta_entropy_threshold
+        self.tta_crop_scale = tta_crop_scale
+        self.tta_count = 0
+        
+        # Inputs kept for on-demand Grad-CAM (see explain.py)
+        self.input_cache = input_cache
         
         # Thresholds for rejection (these can be tuned based on validation data)
         self.min_confidence_threshold = 0.6  # Minimum confidence for the top prediction
         self.max_entropy_threshold = 1.2     # Maximum entropy allowed
         self.feature_similarity_threshold = 0.3  # Minimum feature similarity to training data
+        self.min_green_ratio = 0.15          # Minimum fraction of green pixels
+        
+        if thresholds_path is None:
+            thresholds_path = os.path.join(os.path.dirname(os.path.abspath(model_path)), 'thresholds.json')
+            if not os.path.exists(thresholds_path):
+                thresholds_path = None
+        if thresholds_path is not None:
+            self.load_thresholds(thresholds_path)
+        
+    def load_thresholds(self, thresholds_path):
+        """
+        Override the rejection thresholds from a JSON config.
+        
+        Args:
+            thresholds_path: Path to a JSON file with any of THRESHOLD_KEYS
+        """
+        with open(thresholds_path, 'r') as f:
+            config = json.load(f)
+        
+        for key in THRESHOLD_KEYS:
+            if key in config:
+                setattr(self, key, float(config[key]))
+        
+        logger.info("Loaded rejection thresholds", extra={"path": thresholds_path})
+        
+    def add_resolution_variant(self, size, model_path):
+        """
+        Register a model that takes size x size inputs.
+        
+        Args:
+            size: Input resolution of the model
+            model_path: Path to the model (.keras or .tflite)
+        """
+        model = load_any_model(model_path)
+        if int(model.input_shape[1]) != int(size):
+            raise ValueError(f"Model {model_path} expects {model.input_shape[1]}px inputs, not {size}px")
+        self.resolution_models[int(size)] = model
         
     def preprocess_image(self, image, target_size=(160, 160)):
         """
@@ -77,6 +285,8 @@ class BananaLeafClassifier:
         Returns:
             Feature vector from intermediate layer
         """
+        self._require_keras("Feature extraction")
+        
         # Get features from the layer before the final classification layer
         # This assumes the model has a flatten layer before the final dense layer
         intermediate_layer_model = None
@@ -98,6 +308,40 @@ class BananaLeafClassifier:
         features = intermediate_layer_model.predict(img_array, verbose=0)
         return features.flatten()
     
+    def predict_batch_with_features(self, img_batch, batch_size=32):
+        """
+        Get probabilities and pooled features for a batch in a single forward pass.
+        
+        Args:
+            img_batch: Array of shape (N, height, width, 3) scaled to [0, 1]
+            batch_size: Batch size for the forward pass
+            
+        Returns:
+            Tuple of (probabilities, features)
+        """
+        self._require_keras("Feature extraction")
+        if self._feature_model is None:
+            from tensorflow.keras.models import Model
+            feature_layer = self.model.layers[-2]
+            for layer in self.model.layers:
+                if 'flatten' in layer.name.lower() or 'global_average_pooling' in layer.name.lower():
+                    feature_layer = layer
+                    break
+            self._feature_model = Model(
+                inputs=self.model.input, outputs=[self.model.output, feature_layer.output]
+            )
+        
+        probabilities, features = self._feature_model.predict(img_batch, batch_size=batch_size, verbose=0)
+        return probabilities, features.reshape(len(features), -1)
+    
+    def _require_keras(self, purpose):
+        """Raise UnsupportedModelError when the main model is a TFLite variant."""
+        if isinstance(self.model, TFLiteModel):
+            raise UnsupportedModelError(
+                f"{purpose} needs layer access, which TFLite variants do not have; "
+                f"use the Keras model the variant was converted from"
+            )
+    
     def is_banana_leaf_like(self, img_array):
         """
         Check if the image has characteristics similar to banana leaves.
@@ -109,38 +353,502 @@ class BananaLeafClassifier:
         Returns:
             Boolean indicating if image is banana leaf-like
         """
+        return bool(self.green_ratio(img_array) > self.min_green_ratio)
+    
+    def green_ratio(self, img_array):
+        """
+        Fraction of pixels that fall in the green HSV range.
+        
+        Args:
+            img_array: Preprocessed image array
+            
+        Returns:
+            Green pixel ratio between 0 and 1
+        """
         # Convert back to image for analysis
         image = (img_array[0] * 255).astype(np.uint8)
         
         # Check for green color dominance (banana leaves are typically green)
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        
-        # Define range for green color in HSV
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        
-        # Create mask for green pixels
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-        green_ratio = np.sum(green_mask > 0) / (image.shape[0] * image.shape[1])
+        return green_ratio_uint8(image)
+    
+    def leaf_color_stats(self, img_array, hsv=None):
+        """
+        Green ratio and lesion-area severity from one HSV pass (see gates.leaf_color_stats).
         
-        # Check if the image has sufficient green content
-        return bool(green_ratio > 0.15)  # At least 15% green pixels
+        Args:
+            img_array: Preprocessed image array
+            hsv: HSV conversion of the image, if the gates already computed it
+            
+        Returns:
+            Dictionary with green_ratio, severity, chlorotic and necrotic fractions
+        """
+        return leaf_color_stats((img_array[0] * 255).astype(np.uint8), hsv)
     
-    def predict_with_rejection(self, image):
+    def predict_with_rejection(self, image, resolution=None):
         """
         Make prediction with out-of-distribution detection.
         
         Args:
             image: Input image (PIL Image or numpy array)
+            resolution: Input size to run at; must be a key of resolution_models
+                (defaults to the main model's native size)
             
         Returns:
             Dictionary containing prediction results and rejection status
         """
+        original_size = image.size if isinstance(image, Image.Image) else (image.shape[1], image.shape[0])
+        resolution = int(resolution or self.input_size)
+        if resolution not in self.resolution_models:
+            raise ValueError(f"No model for {resolution}px inputs, available: {sorted(self.resolution_models)}")
+        
         # Preprocess image
-        img_array = self.preprocess_image(image)
+        with span("preprocess", resolution=resolution):
+            img_array = self.preprocess_image(image, target_size=(resolution, resolution))
+        
+        # Reject obvious junk before it reaches the model
+        gate_report = None
+        hsv = None
+        if self.gates is not None:
+            with span("gating") as gating:
+                # One HSV conversion serves the gates and the colour statistics below
+                image_uint8 = (img_array[0] * 255).astype(np.uint8)
+                hsv = cv2.cvtColor(image_uint8, cv2.COLOR_RGB2HSV)
+                gate_report = self.gates.run(image_uint8, original_size, hsv=hsv)
+                if gating is not None:
+                    gating.set(passed=gate_report["passed"])
+            if not gate_report["passed"]:
+                return self._build_gate_rejection(gate_report)
         
         # Get model predictions
-        predictions = self.model.predict(img_array, verbose=0)[0]
+        with span("inference", batch=1) as inference:
+            predictions, stages = self._forward(img_array)
+            if inference is not None:
+                inference.set(stage=stages[0])
+        
+        # Check if image looks like a banana leaf; the same HSV pass estimates lesion coverage
+        color_stats = self.leaf_color_stats(img_array, hsv)
+        is_leaf_like = bool(color_stats["green_ratio"] > self.min_green_ratio)
+        
+        # Borderline image: average over augmented views
+        tta_report = None
+        if self.tta_entropy_threshold is not None:
+            first_entropy = self.calculate_entropy(predictions[0])
+            if first_entropy > self.tta_entropy_threshold:
+                with span("tta"):
+                    probabilities, tta_report, stage = self._predict_tta(
+                        image, img_array, predictions[0], stages[0], resolution
+                    )
+                tta_report["first_view_entropy"] = float(first_entropy)
+                predictions, stages = probabilities[np.newaxis], [stage]
+        
+        result = self._build_result(predictions[0], is_leaf_like, stage=stages[0], resolution=resolution)
+        result["tta"] = tta_report
+        result["severity"] = self._severity(color_stats)
+        if self.input_cache is not None:
+            result["prediction_id"] = self.input_cache.put(img_array[0], np.argmax(predictions[0]), resolution)
+        if gate_report is not None:
+            result["gates"] = gate_report
+        return result
+    
+    def predict_batch(self, img_batch, batch_size=32, original_sizes=None):
+        """
+        Make predictions for a batch of preprocessed images in one forward pass,
+        applying the same rejection rules as predict_with_rejection.
+        
+        Args:
+            img_batch: Array of shape (N, height, width, 3) scaled to [0, 1]
+            batch_size: Batch size for the forward pass
+            original_sizes: Optional (width, height) of each image before
+                preprocessing, for gates that check the upload size
+            
+        Returns:
+            List of result dictionaries, one per image
+        """
+        if len(img_batch) == 0:
+            return []
+        
+        results = [None] * len(img_batch)
+        passed = np.ones(len(img_batch), dtype=bool)
+        gate_reports = [None] * len(img_batch)
+        hsv = [None] * len(img_batch)
+        
+        if self.gates is not None:
+            with span("gating", images=len(img_batch)):
+                for i in range(len(img_batch)):
+                    original_size = original_sizes[i] if original_sizes is not None else None
+                    image_uint8 = (img_batch[i] * 255).astype(np.uint8)
+                    hsv[i] = cv2.cvtColor(image_uint8, cv2.COLOR_RGB2HSV)
+                    gate_reports[i] = self.gates.run(image_uint8, original_size, hsv=hsv[i])
+                    if not gate_reports[i]["passed"]:
+                        passed[i] = False
+                        results[i] = self._build_gate_rejection(gate_reports[i])
+        
+        # Only images that passed the gates go through the model
+        indices = np.flatnonzero(passed)
+        if len(indices) > 0:
+            with span("inference", batch=len(indices)):
+                predictions, stages = self._forward(img_batch[indices], batch_size)
+            for j, i in enumerate(indices):
+                color_stats = self.leaf_color_stats(img_batch[i:i + 1], hsv[i])
+                results[i] = self._build_result(
+                    predictions[j], bool(color_stats["green_ratio"] > self.min_green_ratio), stage=stages[j],
+                    resolution=img_batch.shape[1]
+                )
+                results[i]["severity"] = self._severity(color_stats)
+                if gate_reports[i] is not None:
+                    results[i]["gates"] = gate_reports[i]
+        
+        return results
+    
+    def detect_leaves(self, image, max_leaves=8, min_area_fraction=0.02, proposal_size=512):
+        """
+        Propose leaf regions as connected components of the HSV green mask.
+        
+        The mask is computed on a copy downscaled to proposal_size on its
+        longest side, so proposals cost the same for any photo size.
+        
+        Args:
+            image: RGB uint8 array
+            max_leaves: Keep at most this many regions, largest first
+            min_area_fraction: Ignore regions smaller than this fraction of the image
+            proposal_size: Longest side of the image the mask is computed on
+            
+        Returns:
+            List of (x, y, width, height, area_fraction) in original image coordinates
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, proposal_size / max(height, width))
+        small = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA) if scale < 1 else image
+        
+        # Close small gaps (veins, lesions) so one leaf is one component
+        mask = green_mask(small)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        total = float(mask.shape[0] * mask.shape[1])
+        components = sorted(stats[1:], key=lambda s: s[cv2.CC_STAT_AREA], reverse=True)
+        
+        boxes = []
+        for x, y, w, h, area in components[:max_leaves]:
+            if area / total < min_area_fraction:
+                break
+            # Back to original coordinates with a little context around the leaf
+            pad_x, pad_y = 0.05 * w / scale, 0.05 * h / scale
+            x0, y0 = max(0, int(x / scale - pad_x)), max(0, int(y / scale - pad_y))
+            x1, y1 = min(width, int((x + w) / scale + pad_x)), min(height, int((y + h) / scale + pad_y))
+            boxes.append((x0, y0, x1 - x0, y1 - y0, float(area / total)))
+        return boxes
+    
+    def predict_leaves(self, image, max_leaves=8, min_area_fraction=0.02, batch_size=32):
+        """
+        Find every leaf in a field photo and classify all of them in one batch.
+        
+        Args:
+            image: Input image (PIL Image or numpy array)
+            max_leaves: Maximum number of leaves to classify
+            min_area_fraction: Smallest leaf, as a fraction of the image area
+            batch_size: Batch size for the forward pass
+            
+        Returns:
+            Dictionary with the per-leaf results (each with a "bbox" of
+            [x, y, width, height]) and the diseases found
+        """
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert("RGB"))
+        image = np.ascontiguousarray(image[..., :3], dtype=np.uint8)
+        
+        with span("detect_leaves") as detect:
+            boxes = self.detect_leaves(image, max_leaves=max_leaves, min_area_fraction=min_area_fraction)
+            if detect is not None:
+                detect.set(leaves=len(boxes))
+        size = (self.input_size, self.input_size)
+        crops = [
+            cv2.resize(image[y:y + h, x:x + w], size, interpolation=cv2.INTER_AREA)
+            for x, y, w, h, _ in boxes
+        ]
+        
+        leaves = []
+        if crops:
+            results = self.predict_batch(np.stack(crops).astype(np.float32) / 255.0, batch_size=batch_size,
+                                         original_sizes=[(w, h) for _, _, w, h, _ in boxes])
+            for (x, y, w, h, area), result in zip(boxes, results):
+                result["bbox"] = [int(x), int(y), int(w), int(h)]
+                result["area_fraction"] = round(area, 4)
+                leaves.append(result)
+        
+        diseases_found = sorted({
+            leaf["predicted_class"] for leaf in leaves
+            if not leaf["is_rejected"] and leaf["predicted_class"] != "healthy"
+        })
+        return {
+            "count": len(leaves),
+            "image_size": [int(image.shape[1]), int(image.shape[0])],
+            "leaves": leaves,
+            "diseases_found": diseases_found,
+        }
+    
+    def predict_tiled(self, image, overlap=0.25, max_tiles=48, batch_size=32):
+        """
+        Classify a high-resolution photo from overlapping tiles at the model's
+        native size, so small lesions are not lost by shrinking the whole leaf.
+        
+        Tiles that fail the green-ratio check are skipped. Photos that would need
+        more than max_tiles tiles are downscaled first, which bounds latency; for
+        very elongated photos the tiles along the long side are spaced further
+        apart, so the grid never exceeds max_tiles.
+        A lesion found in any tile flags the image: disease probabilities are
+        max-pooled over tiles and the healthy probability is min-pooled.
+        
+        Args:
+            image: Input image (PIL Image or numpy array)
+            overlap: Fraction of a tile shared with its neighbour
+            max_tiles: Maximum number of tiles in the grid
+            batch_size: Batch size for the forward pass
+            
+        Returns:
+            Dictionary in the same format as predict_with_rejection, plus a
+            "tiles" block with the grid and a coarse lesion heatmap
+        """
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert("RGB"))
+        image = np.ascontiguousarray(image[..., :3], dtype=np.uint8)
+        
+        tile = self.input_size
+        scale, size, tops, lefts = tile_grid(image.shape[0], image.shape[1], tile,
+                                             overlap=overlap, max_tiles=max_tiles)
+        if scale != 1.0:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        rows, cols = len(tops), len(lefts)
+        
+        # Green ratio of every tile from one HSV pass and an integral image
+        integral = cv2.integral((green_mask(image) > 0).astype(np.uint8))
+        t, l = tops[:, None], lefts[None, :]
+        green = (integral[t + tile, l + tile] - integral[t, l + tile]
+                 - integral[t + tile, l] + integral[t, l]) / float(tile * tile)
+        keep = green > self.min_green_ratio
+        
+        self.stage_counts["tiled"] += 1
+        cells = np.argwhere(keep)
+        if len(cells) == 0:
+            result = self._build_result(np.full(len(self.diseases), 1.0 / len(self.diseases)), False,
+                                        stage="tiled", resolution=tile)
+            result["rejection_reasons"] = ["No tile contains enough leaf (green) area"]
+            result["tiles"] = {"grid": [int(rows), int(cols)], "tile_size": tile, "scale": round(float(scale), 4),
+                               "evaluated": 0, "skipped": int(rows * cols), "class_counts": {}, "heatmap": None}
+            return result
+        
+        tiles = np.stack([image[tops[r]:tops[r] + tile, lefts[c]:lefts[c] + tile] for r, c in cells])
+        with span("inference", batch=len(tiles)):
+            probabilities = np.asarray(self.model.predict(tiles.astype(np.float32) / 255.0,
+                                                          batch_size=batch_size, verbose=0))
+        
+        healthy = self.diseases.index("healthy")
+        pooled = probabilities.max(axis=0)
+        pooled[healthy] = probabilities[:, healthy].min()
+        pooled = pooled / pooled.sum()
+        
+        # Lesion probability per tile; None where the tile was skipped
+        heatmap = [[None] * int(cols) for _ in range(int(rows))]
+        for (r, c), p in zip(cells, probabilities):
+            heatmap[r][c] = round(float(1.0 - p[healthy]), 4)
+        
+        predicted = probabilities.argmax(axis=1)
+        result = self._build_result(pooled, True, stage="tiled", resolution=tile)
+        result["tiles"] = {
+            "grid": [int(rows), int(cols)],
+            "tile_size": tile,
+            "scale": round(float(scale), 4),
+            "evaluated": int(len(cells)),
+            "skipped": int(rows * cols - len(cells)),
+            "class_counts": {disease: int(np.sum(predicted == i)) for i, disease in enumerate(self.diseases)},
+            "heatmap": heatmap,
+        }
+        return result
+    
+    def _tta_views(self, image, img_array, size):
+        """
+        Augmented views of one decoded image: flips of the first view plus
+        center and corner crops, each resized to the model input size.
+        
+        Args:
+            image: The decoded input image (PIL Image or numpy array)
+            img_array: The first view, as returned by preprocess_image
+            size: Model input size
+            
+        Returns:
+            Array of shape (views, size, size, 3) scaled to [0, 1]
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        
+        view = img_array[0]
+        views = [view[:, ::-1], view[::-1, :]]
+        
+        width, height = image.size
+        crop_w, crop_h = width * self.tta_crop_scale, height * self.tta_crop_scale
+        offsets = [((width - crop_w) / 2, (height - crop_h) / 2),  # center
+                   (0, 0), (width - crop_w, 0), (0, height - crop_h), (width - crop_w, height - crop_h)]
+        for left, top in offsets:
+            # Crop and resize in a single resampling step
+            crop = image.resize((size, size), box=(left, top, left + crop_w, top + crop_h))
+            views.append(img_to_array(crop) / 255.0)
+        
+        return np.stack(views).astype(np.float32)
+    
+    def _predict_tta(self, image, img_array, first_probabilities, first_stage, resolution):
+        """
+        Run the augmented views through the full model in one batch and average
+        them with the first view.
+        
+        If the first view was scored by the cascade model, it is scored again
+        by the full model, so every averaged view comes from the same model.
+        
+        Returns:
+            Tuple of (averaged probabilities, report with the spread across views,
+            stage that produced the probabilities)
+        """
+        self.tta_count += 1
+        views = self._tta_views(image, img_array, resolution)
+        model = self.resolution_models[resolution]
+        if first_stage == "full":
+            view_probabilities = np.concatenate([
+                first_probabilities[np.newaxis],
+                model.predict(views, batch_size=len(views), verbose=0)
+            ])
+        else:
+            views = np.concatenate([img_array.astype(np.float32), views])
+            view_probabilities = np.asarray(model.predict(views, batch_size=len(views), verbose=0))
+            # The image is escalated after all
+            self.stage_counts[first_stage] -= 1
+            self.stage_counts["full"] += 1
+        
+        mean = view_probabilities.mean(axis=0)
+        top = int(np.argmax(mean))
+        std = view_probabilities.std(axis=0)
+        report = {
+            "views": int(len(view_probabilities)),
+            "spread": float(std[top]),  # std of the winning class's probability across views
+            "class_spread": {disease: float(value) for disease, value in zip(self.diseases, std)},
+            "agreement": float(np.mean(view_probabilities.argmax(axis=1) == top)),
+        }
+        return mean, report, "full"
+    
+    def _severity(self, color_stats):
+        """Severity block of a result: lesion share of the leaf area, split by lesion type."""
+        return {
+            "score": round(color_stats["severity"], 4),
+            "chlorotic": round(color_stats["chlorotic_fraction"], 4),
+            "necrotic": round(color_stats["necrotic_fraction"], 4),
+        }
+    
+    def _build_gate_rejection(self, gate_report):
+        """
+        Build the rejection result for an image that failed a pre-inference gate.
+        
+        Args:
+            gate_report: Report returned by GatePipeline.run
+            
+        Returns:
+            Dictionary in the same format as _build_result
+        """
+        self.stage_counts["gate"] += 1
+        green = [r["value"] for r in gate_report["results"] if r["gate"] == "green_ratio"]
+        is_leaf_like = bool(green[0] > self.min_green_ratio) if green else False
+        
+        return {
+            "is_rejected": True,
+            "rejection_reasons": [gate_report["reason"]],
+            "predicted_class": "unknown",
+            "confidence": 0.0,
+            "all_probabilities": {disease: 0.0 for disease in self.diseases},
+            "entropy": 0.0,
+            "is_leaf_like": is_leaf_like,
+            "stage": "gate",
+            "resolution": None,
+            "tta": None,
+            "prediction_id": None,
+            "severity": None,
+            "gates": gate_report,
+            "message": f"{gate_report['reason']}. Please upload a clear image of a banana leaf for disease classification."
+        }
+    
+    def _forward(self, img_batch, batch_size=32):
+        """
+        Class probabilities for a batch; a single image goes through the shared
+        MicroBatcher when one is attached, so concurrent callers share a forward pass.
+        
+        Returns:
+            Tuple of (probabilities, list of stage names per image)
+        """
+        if self.batcher is not None and len(img_batch) == 1:
+            probabilities, stage = self.batcher.submit(img_batch[0]).result(timeout=self.batcher.timeout)
+            return probabilities[np.newaxis], [stage]
+        return self._predict_probabilities(img_batch, batch_size)
+    
+    def _predict_probabilities(self, img_batch, batch_size=32):
+        """
+        Get class probabilities, running the cascade when one is configured.
+        
+        The cheap model scores the whole batch; only images where it is not
+        decisive (confidence or entropy outside the cascade limits) are sent
+        through the full model. Batches at a non-native resolution go straight
+        to the matching resolution variant.
+        
+        Args:
+            img_batch: Array of shape (N, height, width, 3) scaled to [0, 1]
+            batch_size: Batch size for the forward pass
+            
+        Returns:
+            Tuple of (probabilities, list of stage names per image)
+        """
+        resolution = int(img_batch.shape[1])
+        if resolution != self.input_size:
+            self.stage_counts["full"] += len(img_batch)
+            model = self.resolution_models[resolution]
+            return model.predict(img_batch, batch_size=batch_size, verbose=0), ["full"] * len(img_batch)
+        
+        if self.cascade_model is None:
+            self.stage_counts["full"] += len(img_batch)
+            return self.model.predict(img_batch, batch_size=batch_size, verbose=0), ["full"] * len(img_batch)
+        
+        height, width = self.cascade_model.input_shape[1:3]
+        if (height, width) != tuple(img_batch.shape[1:3]):
+            small_batch = np.stack([
+                cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA) for image in img_batch
+            ])
+        else:
+            small_batch = img_batch
+        
+        probabilities = np.array(self.cascade_model.predict(small_batch, batch_size=batch_size, verbose=0))
+        clipped = np.clip(probabilities, 1e-10, 1.0)
+        entropy = -np.sum(clipped * np.log(clipped), axis=1)
+        escalate = (probabilities.max(axis=1) < self.cascade_min_confidence) | (entropy > self.cascade_max_entropy)
+        
+        if escalate.any():
+            probabilities[escalate] = self.model.predict(img_batch[escalate], batch_size=batch_size, verbose=0)
+        
+        self.stage_counts["full"] += int(escalate.sum())
+        self.stage_counts["cascade"] += int(len(img_batch) - escalate.sum())
+        return probabilities, ["full" if e else "cascade" for e in escalate]
+    
+    def _build_result(self, predictions, is_leaf_like, stage="full", resolution=None):
+        """
+        Apply the rejection rules to the probabilities of a single image.
+        
+        Args:
+            predictions: Softmax probabilities for one image
+            is_leaf_like: Result of the leaf-likeness check for the same image
+            stage: Which model produced the probabilities ("cascade" or "full")
+            resolution: Input size the prediction was made at
+            
+        Returns:
+            Dictionary containing prediction results and rejection status
+        """
         predicted_class_idx = np.argmax(predictions)
         predicted_class = self.diseases[predicted_class_idx]
         confidence = predictions[predicted_class_idx]
@@ -148,9 +856,6 @@ class BananaLeafClassifier:
         # Calculate entropy
         entropy = self.calculate_entropy(predictions)
         
-        # Check if image looks like a banana leaf
-        is_leaf_like = self.is_banana_leaf_like(img_array)
-        
         # Decision logic for rejection
         reject_reasons = []
         
@@ -173,7 +878,9 @@ class BananaLeafClassifier:
             "confidence": float(confidence),
             "all_probabilities": {disease: float(prob) for disease, prob in zip(self.diseases, predictions)},
             "entropy": float(entropy),
-            "is_leaf_like": bool(is_leaf_like)
+            "is_leaf_like": bool(is_leaf_like),
+            "stage": stage,
+            "resolution": int(resolution) if resolution else self.input_size
         }
         
         if is_rejected:
@@ -0,0 +1,219 @@
+"""
+Grad-CAM Explanations
+Saliency maps for earlier predictions, computed only when they are requested.
+
+/predict keeps each preprocessed input in a bounded in-memory cache under a
+prediction ID. Nothing else happens until a client asks for an explanation.
+At that point the backbone runs once for all requested IDs, and its last conv
+block activations are stored next to the cached input. Grad-CAM then only
+needs the small classification head, so explaining another class of the same
+image skips the backbone. Rendered heatmaps are cached as well.
+
+Usage:
+    cache = InputCache(max_entries=256)
+    classifier = BananaLeafClassifier(model_path, input_cache=cache)
+    explainer = GradCamExplainer(classifier, cache)
+    explainer.explain([prediction_id])
+"""
+import base64
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from enhanced_inference import TFLiteModel, UnsupportedModelError
+
+
+class InputCache:
+    """LRU cache of preprocessed inputs keyed by prediction ID."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, img_array, class_index, resolution):
+        """
+        Store one preprocessed input.
+
+        Args:
+            img_array: Image of shape (height, width, 3) scaled to [0, 1]
+            class_index: Index of the predicted class
+            resolution: Input size the prediction was made at
+
+        Returns:
+            The new prediction ID
+        """
+        prediction_id = uuid.uuid4().hex
+        entry = {
+            "input": np.clip(img_array * 255.0, 0, 255).astype(np.uint8),  # a quarter of the float32 size
+            "class_index": int(class_index),
+            "resolution": int(resolution),
+            "created": time.time(),
+        }
+        with self._lock:
+            self._entries[prediction_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prediction_id
+
+    def get(self, prediction_id):
+        """The cached entry for an ID, or None if it is unknown or was evicted."""
+        with self._lock:
+            entry = self._entries.get(prediction_id)
+            if entry is not None:
+                self._entries.move_to_end(prediction_id)
+            return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class GradCamExplainer:
+    def __init__(self, classifier, cache, max_heatmaps=512, overlay_alpha=0.4):
+        """
+        Args:
+            classifier: The BananaLeafClassifier whose predictions are explained
+            cache: InputCache the classifier writes its inputs to
+            max_heatmaps: Number of rendered heatmaps kept in memory
+            overlay_alpha: Opacity of the heatmap over the input image
+        """
+        self.classifier = classifier
+        self.cache = cache
+        self.max_heatmaps = max_heatmaps
+        self.overlay_alpha = overlay_alpha
+        self._heatmaps = OrderedDict()
+        self._splits = {}
+        self._lock = threading.Lock()
+
+    def _split(self, model):
+        """
+        Split a model into the layers up to its last conv block and the head.
+
+        The models from train.py and train.ipynb are a linear stack
+        (MobileNetV2 backbone, pooling, dense head), so the last layer with a
+        4D output is the end of the last conv block.
+        """
+        key = id(model)
+        if key not in self._splits:
+            if isinstance(model, TFLiteModel):
+                raise UnsupportedModelError("Grad-CAM needs a Keras model; TFLite variants cannot be explained")
+            stack = [layer for layer in model.layers if not isinstance(layer, tf.keras.layers.InputLayer)]
+
+            last_conv = max(i for i, layer in enumerate(stack) if len(layer.output.shape) == 4)
+            self._splits[key] = (stack[:last_conv + 1], stack[last_conv + 1:])
+        return self._splits[key]
+
+    @staticmethod
+    def _run(layers, x):
+        for layer in layers:
+            x = layer(x, training=False)
+        return x
+
+    def _compute_activations(self, entries):
+        """Run the backbone once for every entry that has no activations yet."""
+        by_resolution = {}
+        for entry in entries:
+            if "activations" not in entry:
+                by_resolution.setdefault(entry["resolution"], []).append(entry)
+
+        for resolution, group in by_resolution.items():
+            backbone, _ = self._split(self.classifier.resolution_models[resolution])
+            batch = np.stack([entry["input"] for entry in group]).astype(np.float32) / 255.0
+            activations = self._run(backbone, tf.convert_to_tensor(batch)).numpy()
+            for entry, activation in zip(group, activations):
+                entry["activations"] = activation.astype(np.float16)
+
+    def _grad_cam(self, entries, class_indices):
+        """Grad-CAM maps, scaled to [0, 1], for entries at the same resolution."""
+        _, head = self._split(self.classifier.resolution_models[entries[0]["resolution"]])
+        activations = tf.convert_to_tensor(np.stack([e["activations"] for e in entries]).astype(np.float32))
+
+        with tf.GradientTape() as tape:
+            tape.watch(activations)
+            predictions = self._run(head, activations)
+            # Images are independent, so one backward pass yields every image's gradient
+            scores = tf.gather(predictions, class_indices, axis=1, batch_dims=1)
+        gradients = tape.gradient(scores, activations)
+
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * activations, axis=-1)).numpy()
+        peaks = cams.max(axis=(1, 2), keepdims=True)
+        return cams / np.where(peaks > 0, peaks, 1.0)
+
+    def _render(self, image, cam):
+        """Overlay a Grad-CAM map on the input image and encode it as base64 PNG."""
+        height, width = image.shape[:2]
+        cam = cv2.resize(cam, (width, height), interpolation=cv2.INTER_LINEAR)
+        heatmap = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
+        overlay = cv2.addWeighted(heatmap, self.overlay_alpha,
+                                  cv2.cvtColor(image, cv2.COLOR_RGB2BGR), 1 - self.overlay_alpha, 0)
+        _, png = cv2.imencode(".png", overlay)
+        return base64.b64encode(png.tobytes()).decode("ascii")
+
+    def explain(self, prediction_ids, class_name=None):
+        """
+        Grad-CAM heatmaps for a batch of earlier predictions.
+
+        Args:
+            prediction_ids: IDs returned by /predict
+            class_name: Class to explain; defaults to each prediction's own class
+
+        Returns:
+            List of dictionaries, one per ID, with the heatmap as base64 PNG
+            or an "error" for unknown IDs
+        """
+        if class_name is not None and class_name not in self.classifier.diseases:
+            raise ValueError(f"Unknown class '{class_name}', expected one of {self.classifier.diseases}")
+
+        results = {}
+        pending = []
+        for prediction_id in dict.fromkeys(prediction_ids):
+            entry = self.cache.get(prediction_id)
+            if entry is None:
+                results[prediction_id] = {"prediction_id": prediction_id,
+                                          "error": "Unknown or expired prediction ID"}
+                continue
+
+            class_index = (self.classifier.diseases.index(class_name) if class_name is not None
+                           else entry["class_index"])
+            key = (prediction_id, class_index)
+            with self._lock:
+                heatmap = self._heatmaps.get(key)
+                if heatmap is not None:
+                    self._heatmaps.move_to_end(key)
+            if heatmap is not None:
+                results[prediction_id] = self._result(prediction_id, class_index, heatmap, cached=True)
+            else:
+                pending.append((prediction_id, entry, class_index))
+
+        if pending:
+            self._compute_activations([entry for _, entry, _ in pending])
+
+            by_resolution = {}
+            for item in pending:
+                by_resolution.setdefault(item[1]["resolution"], []).append(item)
+
+            for group in by_resolution.values():
+                cams = self._grad_cam([entry for _, entry, _ in group], [c for _, _, c in group])
+                for (prediction_id, entry, class_index), cam in zip(group, cams):
+                    heatmap = self._render(entry["input"], cam)
+                    with self._lock:
+                        self._heatmaps[(prediction_id, class_index)] = heatmap
+                        while len(self._heatmaps) > self.max_heatmaps:
+                            self._heatmaps.popitem(last=False)
+                    results[prediction_id] = self._result(prediction_id, class_index, heatmap, cached=False)
+
+        return [results[prediction_id] for prediction_id in prediction_ids]
+
+    def _result(self, prediction_id, class_index, heatmap, cached):
+        return {
+            "prediction_id": prediction_id,
+            "class": self.classifier.diseases[class_index],
+            "heatmap_png": heatmap,
+            "cached": cached,
+        }
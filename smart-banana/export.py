@@ -0,0 +1,187 @@
+"""
+Prediction History Export
+Streams the server-side prediction history to CSV or Parquet for research partners.
+
+Rows are read from the history store in keyset chunks, oldest first, and
+each chunk is encoded and handed on before the next one is read, so memory
+use does not grow with the size of the export. CSV chunks are blocks of
+lines; Parquet chunks are row groups, with the file footer written last.
+
+Every exported row carries its history ID. To resume an interrupted export,
+pass the ID of the last row received as the cursor: the export continues
+with the next row.
+
+Usage:
+    python export.py --output predictions.csv --since 2024-06-01 --class sigatoka
+    python export.py --output predictions.parquet --region Kagera --cursor 182734
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+from history import COLUMNS, HistoryStore, parse_time
+
+EXPORT_COLUMNS = ("id",) + COLUMNS
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def parquet_schema():
+    """Arrow schema for exported rows; raises ImportError without pyarrow."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+
+    types = {
+        "id": pa.int64(), "created_at": pa.float64(), "confidence": pa.float64(), "entropy": pa.float64(),
+        "is_rejected": pa.bool_(), "severity": pa.float64(), "latitude": pa.float64(), "longitude": pa.float64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS])
+
+
+def csv_chunks(chunks):
+    """Encode row chunks as CSV text: the header, then one block of lines per chunk."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file object that hands out whatever was written since the last take()."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(chunks):
+    """Encode row chunks as a Parquet file: one row group per chunk, then the footer."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            columns = {name: [row.get(name) for row in rows] for name in EXPORT_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def export_stream(history, output_format="csv", chunk_size=5000, **filters):
+    """
+    Encoded export of the rows matching filters, as an iterator of chunks.
+
+    Args:
+        history: HistoryStore to read from
+        output_format: "csv" (str chunks) or "parquet" (bytes chunks)
+        chunk_size: Rows read and encoded at a time
+        **filters: Keyword arguments for HistoryStore.iter_chunks (predicted_class,
+            region, since, until, include_rejected, after_id, ...)
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown export format {output_format!r}; use one of {', '.join(FORMATS)}")
+    if output_format == "parquet":
+        # Fail before the response starts rather than halfway through it
+        parquet_schema()
+    chunks = history.iter_chunks(chunk_size=chunk_size, **filters)
+    return parquet_chunks(chunks) if output_format == "parquet" else csv_chunks(chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the prediction history to CSV or Parquet.")
+    parser.add_argument("--db", default=os.path.join(os.environ.get("BANANA_DATA_DIR", "data"), "history.db"),
+                        help="History database (default: $BANANA_DATA_DIR/history.db)")
+    parser.add_argument("--output", required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=list(FORMATS), default=None,
+                        help="Output format (default: from the output file extension)")
+    parser.add_argument("--since", default=None, help="Unix time or ISO 8601 lower bound")
+    parser.add_argument("--until", default=None, help="Unix time or ISO 8601 upper bound (exclusive)")
+    parser.add_argument("--class", dest="predicted_class", default=None, help="Only this predicted class")
+    parser.add_argument("--region", default=None, help="Only this region")
+    parser.add_argument("--include-rejected", action="store_true", help="Also export rejected predictions")
+    parser.add_argument("--cursor", type=int, default=None, help="Resume after this history ID")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ History database not found: {args.db}")
+        return 1
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    history = HistoryStore(args.db)
+
+    # read_*: rows handed to the encoder; written_*: rows whose encoding reached the file
+    read_count, read_id = 0, args.cursor
+    written_count, written_id = 0, args.cursor
+
+    def counted(chunks):
+        nonlocal read_count, read_id
+        for rows in chunks:
+            read_count += len(rows)
+            read_id = rows[-1]["id"]
+            yield rows
+
+    start = time.time()
+    try:
+        chunks = counted(history.iter_chunks(
+            predicted_class=args.predicted_class, region=args.region,
+            since=parse_time(args.since), until=parse_time(args.until),
+            include_rejected=args.include_rejected, after_id=args.cursor, chunk_size=args.chunk_size,
+        ))
+        if output_format == "parquet":
+            parquet_schema()
+            encoded, mode = parquet_chunks(chunks), "wb"
+        else:
+            encoded, mode = csv_chunks(chunks), "w"
+        with open(args.output, mode, **({} if mode == "wb" else {"newline": "", "encoding": "utf-8"})) as f:
+            for data in encoded:
+                f.write(data)
+                written_count, written_id = read_count, read_id
+    except Exception as e:
+        print(f"❌ Export failed after {written_count} rows: {e}")
+        if written_id is not None:
+            print(f"   Resume into a new file with --cursor {written_id}")
+        return 1
+
+    print(f"✅ Exported {written_count} rows to {args.output} in {time.time() - start:.1f}s")
+    if written_id is not None:
+        print(f"   Later rows can be exported with --cursor {written_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Pre-inference Gates
+Cheap checks that run on the downscaled uint8 image before the CNN, so images
+that are obviously not usable leaf photos (a car, a black frame, a blurry
+smear, a thumbnail) are rejected without paying for inference.
+
+Gates run in order and stop at the first failure. Each records its measured
+value, verdict and time taken.
+"""
+import json
+import time
+
+import cv2
+import numpy as np
+
+# Range for green color in HSV (same as BananaLeafClassifier.is_banana_leaf_like)
+LOWER_GREEN = np.array([35, 40, 40])
+UPPER_GREEN = np.array([85, 255, 255])
+
+# Hue range of yellowing (chlorotic) tissue; browner hues count as necrotic
+CHLOROTIC_HUE = (18, 35)
+
+
+def green_mask(image, hsv=None):
+    """
+    Mask of green pixels in an RGB uint8 image.
+
+    Args:
+        image: RGB uint8 array of shape (height, width, 3)
+        hsv: Precomputed HSV conversion of image, if available
+
+    Returns:
+        uint8 mask, 255 where the pixel is green
+    """
+    if hsv is None:
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    return cv2.inRange(hsv, LOWER_GREEN, UPPER_GREEN)
+
+
+def green_ratio(image, hsv=None):
+    """Fraction of pixels of an RGB uint8 image that fall in the green HSV range."""
+    return float(np.count_nonzero(green_mask(image, hsv)) / (image.shape[0] * image.shape[1]))
+
+
+def leaf_color_stats(image, hsv=None):
+    """
+    Green ratio and lesion coverage from a single HSV conversion.
+
+    The leaf is the green area with its holes filled, so yellow (chlorotic)
+    and brown/black (necrotic) lesions inside it count towards the leaf, while
+    soil or sky around it does not. Severity is the lesion share of the leaf.
+
+    Args:
+        image: RGB uint8 array of shape (height, width, 3)
+        hsv: Precomputed HSV conversion of image, if available
+
+    Returns:
+        Dictionary with green_ratio, severity, chlorotic and necrotic fractions
+    """
+    if hsv is None:
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+    green = green_mask(image, hsv)
+    total = image.shape[0] * image.shape[1]
+
+    # Fill the leaf outline so lesions enclosed by green are part of it
+    contours, _ = cv2.findContours(green, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    leaf = np.zeros_like(green)
+    cv2.drawContours(leaf, contours, -1, 255, thickness=cv2.FILLED)
+    leaf_pixels = np.count_nonzero(leaf)
+
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    inside = (leaf > 0) & (green == 0)
+    chlorotic = inside & (hue >= CHLOROTIC_HUE[0]) & (hue < CHLOROTIC_HUE[1]) & (sat >= 60) & (val >= 120)
+    necrotic = inside & ~chlorotic & ((hue < CHLOROTIC_HUE[0]) | (hue >= 170) | (val < 60)) & (val < 200)
+
+    chlorotic_count = np.count_nonzero(chlorotic)
+    necrotic_count = np.count_nonzero(necrotic)
+    return {
+        "green_ratio": float(np.count_nonzero(green) / total),
+        "severity": float((chlorotic_count + necrotic_count) / leaf_pixels) if leaf_pixels else 0.0,
+        "chlorotic_fraction": float(chlorotic_count / leaf_pixels) if leaf_pixels else 0.0,
+        "necrotic_fraction": float(necrotic_count / leaf_pixels) if leaf_pixels else 0.0,
+    }
+
+
+class Gate:
+    """Base class for a pre-inference gate."""
+    name = "gate"
+
+    def check(self, image, original_size=None, hsv=None):
+        """
+        Evaluate the gate.
+
+        Args:
+            image: Downscaled RGB uint8 image
+            original_size: (width, height) of the uploaded image, if known
+            hsv: HSV conversion of image, shared with the classifier's colour
+                statistics so it is computed once per image (may be None)
+
+        Returns:
+            Tuple of (passed, measured value, rejection reason or None)
+        """
+        raise NotImplementedError
+
+
+class MinResolutionGate(Gate):
+    """Rejects uploads whose shorter side is below min_side pixels."""
+    name = "min_resolution"
+
+    def __init__(self, min_side=64):
+        self.min_side = min_side
+
+    def check(self, image, original_size=None, hsv=None):
+        if original_size is None:
+            return True, None, None
+        shorter = min(original_size)
+        if shorter < self.min_side:
+            return False, shorter, f"Image too small ({original_size[0]}x{original_size[1]}, minimum side {self.min_side}px)"
+        return True, shorter, None
+
+
+class ExposureGate(Gate):
+    """Rejects images that are almost entirely black or blown out."""
+    name = "exposure"
+
+    def __init__(self, min_mean=20, max_mean=235, max_clipped_fraction=0.6):
+        self.min_mean = min_mean
+        self.max_mean = max_mean
+        self.max_clipped_fraction = max_clipped_fraction
+
+    def check(self, image, original_size=None, hsv=None):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        mean = float(gray.mean())
+        clipped = float(np.count_nonzero((gray < 5) | (gray > 250)) / gray.size)
+
+        if mean < self.min_mean:
+            return False, mean, f"Image too dark (mean brightness {mean:.0f} < {self.min_mean})"
+        if mean > self.max_mean:
+            return False, mean, f"Image overexposed (mean brightness {mean:.0f} > {self.max_mean})"
+        if clipped > self.max_clipped_fraction:
+            return False, mean, f"Too many under/over-exposed pixels ({clipped:.0%})"
+        return True, mean, None
+
+
+class GreenRatioGate(Gate):
+    """The HSV green-ratio check from is_banana_leaf_like, run before inference."""
+    name = "green_ratio"
+
+    def __init__(self, min_ratio=0.15):
+        self.min_ratio = min_ratio
+
+    def check(self, image, original_size=None, hsv=None):
+        ratio = green_ratio(image, hsv)
+        if ratio <= self.min_ratio:
+            return False, ratio, "Image doesn't appear to be a leaf"
+        return True, ratio, None
+
+
+class BlurGate(Gate):
+    """Rejects blurry images using the variance of the Laplacian."""
+    name = "blur"
+
+    def __init__(self, min_variance=15.0):
+        self.min_variance = min_variance
+
+    def check(self, image, original_size=None, hsv=None):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        if variance < self.min_variance:
+            return False, variance, f"Image too blurry (sharpness {variance:.1f} < {self.min_variance})"
+        return True, variance, None
+
+
+GATE_TYPES = {
+    MinResolutionGate.name: MinResolutionGate,
+    ExposureGate.name: ExposureGate,
+    GreenRatioGate.name: GreenRatioGate,
+    BlurGate.name: BlurGate,
+}
+
+
+class GatePipeline:
+    """An ordered list of gates that short-circuits on the first failure."""
+
+    def __init__(self, gates):
+        self.gates = list(gates)
+
+    @classmethod
+    def default(cls, min_green_ratio=0.15):
+        """Cheapest checks first: resolution, exposure, green ratio, blur."""
+        return cls([
+            MinResolutionGate(),
+            ExposureGate(),
+            GreenRatioGate(min_green_ratio),
+            BlurGate(),
+        ])
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a pipeline from a list of {"type": <gate name>, **parameters}.
+
+        Args:
+            config: List of gate configs, or a path to a JSON file containing one
+        """
+        if isinstance(config, str):
+            with open(config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+
+        gates = []
+        for entry in config:
+            params = dict(entry)
+            gate_type = params.pop("type")
+            if gate_type not in GATE_TYPES:
+                raise ValueError(f"Unknown gate '{gate_type}', expected one of {sorted(GATE_TYPES)}")
+            gates.append(GATE_TYPES[gate_type](**params))
+        return cls(gates)
+
+    def run(self, image, original_size=None, hsv=None):
+        """
+        Run the gates in order until one fails.
+
+        Args:
+            image: Downscaled RGB uint8 image
+            original_size: (width, height) of the uploaded image, if known
+            hsv: Precomputed HSV conversion of image, if available
+
+        Returns:
+            Dictionary with passed, rejected_by, reason, total_ms and per-gate results
+        """
+        report = {"passed": True, "rejected_by": None, "reason": None, "results": []}
+        total_start = time.perf_counter()
+
+        for gate in self.gates:
+            start = time.perf_counter()
+            passed, value, reason = gate.check(image, original_size, hsv)
+            report["results"].append({
+                "gate": gate.name,
+                "passed": bool(passed),
+                "value": None if value is None else round(float(value), 4),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+            if not passed:
+                report.update(passed=False, rejected_by=gate.name, reason=reason)
+                break
+
+        report["total_ms"] = round((time.perf_counter() - total_start) * 1000, 3)
+        return report
@@ -0,0 +1,425 @@
+"""
+Prediction History Store
+Append-only server-side record of predictions, for views across many farmers.
+
+Requests only put a row on an in-memory queue. A background thread writes
+queued rows to SQLite (WAL mode) in batches, one transaction per batch, so
+the database never sits on the request path. Rows are never updated.
+Queries page by keyset on the row ID (newest first), so reading page 100 is
+as cheap as reading page 1.
+
+Each batch also updates rollup tables in the same transaction: counts per
+hour and per day by class and region, and rejection counts by reason.
+Dashboards read those instead of scanning the raw rows.
+
+Usage:
+    history = HistoryStore("data/history.db")
+    history.record({"device_id": "phone-1", "predicted_class": "sigatoka", ...})
+    rows, next_cursor = history.query(device_id="phone-1", limit=50)
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+COLUMNS = (
+    "created_at", "device_id", "prediction_id", "predicted_class", "confidence", "entropy",
+    "is_rejected", "rejection_reason", "stage", "severity", "latitude", "longitude", "region", "source",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    device_id TEXT,
+    prediction_id TEXT,
+    predicted_class TEXT NOT NULL,
+    confidence REAL,
+    entropy REAL,
+    is_rejected INTEGER NOT NULL,
+    rejection_reason TEXT,
+    stage TEXT,
+    severity REAL,
+    latitude REAL,
+    longitude REAL,
+    region TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_device ON predictions (device_id, id);
+CREATE INDEX IF NOT EXISTS predictions_class ON predictions (predicted_class, id);
+CREATE INDEX IF NOT EXISTS predictions_region ON predictions (region, id);
+CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS predictions_location ON predictions (latitude, longitude);
+CREATE TABLE IF NOT EXISTS rollup_counts (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    predicted_class TEXT NOT NULL,
+    region TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    rejected INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, predicted_class, region)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_rejections (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, reason)
+) WITHOUT ROWID;
+"""
+
+# Rollup bucket sizes in seconds (UTC)
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_time(value):
+    """Unix time from a number or an ISO 8601 string; None if empty."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def history_row(result, device_id=None, latitude=None, longitude=None, region=None, source="predict",
+                created_at=None):
+    """
+    Build a history row from a classifier result.
+
+    Args:
+        result: Dictionary returned by BananaLeafClassifier
+        device_id: Device that sent the image
+        latitude, longitude: Optional capture location
+        region: Optional region name
+        source: Endpoint the prediction came from
+        created_at: Unix time of the prediction (defaults to now)
+    """
+    severity = result.get("severity")
+    return {
+        "created_at": created_at or time.time(),
+        "device_id": device_id,
+        "prediction_id": result.get("prediction_id"),
+        "predicted_class": result["predicted_class"],
+        "confidence": float(result["confidence"]),
+        "entropy": float(result["entropy"]),
+        "is_rejected": int(bool(result["is_rejected"])),
+        "rejection_reason": "; ".join(result["rejection_reasons"]) if result.get("rejection_reasons") else None,
+        "stage": result.get("stage"),
+        "severity": severity["score"] if severity else None,
+        "latitude": latitude,
+        "longitude": longitude,
+        "region": region,
+        "source": source,
+    }
+
+
+def reason_category(reason):
+    """Drop the measured values from a rejection reason: "Low confidence (0.41 < 0.6)" -> "Low confidence"."""
+    return reason.split(" (")[0].strip()
+
+
+def rollup_deltas(rows):
+    """
+    Count increments for the rollup tables from a batch of history rows.
+
+    Returns:
+        Tuple of ({(granularity, bucket, class, region): [total, rejected]},
+                  {(granularity, bucket, reason): count})
+    """
+    counts, rejections = {}, {}
+    for row in rows:
+        for granularity, size in GRANULARITIES.items():
+            bucket = int(row["created_at"] // size * size)
+            key = (granularity, bucket, row["predicted_class"], row.get("region") or "")
+            delta = counts.setdefault(key, [0, 0])
+            delta[0] += 1
+            if row["is_rejected"]:
+                delta[1] += 1
+                for reason in (row.get("rejection_reason") or "").split("; "):
+                    if reason:
+                        reason_key = (granularity, bucket, reason_category(reason))
+                        rejections[reason_key] = rejections.get(reason_key, 0) + 1
+    return counts, rejections
+
+
+class HistoryStore:
+    def __init__(self, db_path, flush_interval=1.0, max_batch=500, max_queue=10000):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+            flush_interval: Longest time a row waits in memory before it is written
+            max_batch: Rows per write transaction
+            max_queue: Rows held in memory; beyond this new rows are dropped
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.written = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+        self._backfill_rollups()
+
+        self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, row):
+        """Queue a row for writing. Never blocks; drops the row if the queue is full."""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(rows)
+            for _ in rows:
+                self._queue.task_done()
+
+    def _write(self, rows):
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT INTO predictions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row.get(column) for column in COLUMNS) for row in rows]
+            )
+            self._apply_rollups(conn, rows)
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            self.dropped += len(rows)
+            logger.error("Failed to write history rows", extra={"rows": len(rows), "error": str(e)})
+            return
+
+        self.written += len(rows)
+
+    @staticmethod
+    def _apply_rollups(conn, rows):
+        counts, rejections = rollup_deltas(rows)
+        conn.executemany(
+            "INSERT INTO rollup_counts (granularity, bucket, predicted_class, region, total, rejected) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (granularity, bucket, predicted_class, region) "
+            "DO UPDATE SET total = total + excluded.total, rejected = rejected + excluded.rejected",
+            [key + tuple(delta) for key, delta in counts.items()]
+        )
+        conn.executemany(
+            "INSERT INTO rollup_rejections (granularity, bucket, reason, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (granularity, bucket, reason) DO UPDATE SET count = count + excluded.count",
+            [key + (count,) for key, count in rejections.items()]
+        )
+
+    def _backfill_rollups(self, chunk_size=5000):
+        """Build the rollups once for history recorded before they existed."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM rollup_counts LIMIT 1").fetchone() is not None:
+            return
+        if conn.execute("SELECT 1 FROM predictions LIMIT 1").fetchone() is None:
+            return
+
+        logger.info("Building statistics rollups from existing history")
+        conn.execute("BEGIN")
+        cursor = conn.execute("SELECT created_at, predicted_class, region, is_rejected, rejection_reason FROM predictions")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            self._apply_rollups(conn, [dict(row) for row in rows])
+        conn.execute("COMMIT")
+
+    def statistics(self, granularity="day", since=None, until=None, region=None):
+        """
+        Prediction counts from the rollup tables.
+
+        The cost depends on the number of buckets, classes and regions in the
+        range, not on how many predictions were recorded.
+
+        Args:
+            granularity: "hour" or "day"
+            since, until: Optional Unix time bounds (rounded to whole buckets)
+            region: Only this region
+
+        Returns:
+            Dictionary with totals, per-class, per-region and per-bucket counts
+            and rejection counts by reason
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        size = GRANULARITIES[granularity]
+
+        clauses, params = ["granularity = ?"], [granularity]
+        if since is not None:
+            clauses.append("bucket >= ?")
+            params.append(int(since // size * size))
+        if until is not None:
+            clauses.append("bucket < ?")
+            params.append(int(until))
+        range_clauses, range_params = list(clauses), list(params)
+        if region is not None:
+            clauses.append("region = ?")
+            params.append(region)
+
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT bucket, predicted_class, region, total, rejected FROM rollup_counts "
+            f"WHERE {' AND '.join(clauses)}", params
+        ).fetchall()
+
+        totals = {"predictions": 0, "accepted": 0, "rejected": 0}
+        by_class, by_region, series = {}, {}, {}
+        for row in rows:
+            accepted = row["total"] - row["rejected"]
+            totals["predictions"] += row["total"]
+            totals["accepted"] += accepted
+            totals["rejected"] += row["rejected"]
+            if accepted:
+                by_class[row["predicted_class"]] = by_class.get(row["predicted_class"], 0) + accepted
+                region_counts = by_region.setdefault(row["region"] or "unknown", {})
+                region_counts[row["predicted_class"]] = region_counts.get(row["predicted_class"], 0) + accepted
+                bucket_counts = series.setdefault(row["bucket"], {})
+                bucket_counts[row["predicted_class"]] = bucket_counts.get(row["predicted_class"], 0) + accepted
+
+        # Rejection reasons are not split by region
+        reasons = conn.execute(
+            f"SELECT reason, SUM(count) AS count FROM rollup_rejections "
+            f"WHERE {' AND '.join(range_clauses)} GROUP BY reason ORDER BY count DESC", range_params
+        ).fetchall()
+
+        return {
+            "granularity": granularity,
+            "totals": totals,
+            "by_class": by_class,
+            "by_region": by_region,
+            "series": [{"bucket": bucket, "counts": series[bucket]} for bucket in sorted(series)],
+            "rejections_by_reason": {row["reason"]: row["count"] for row in reasons},
+        }
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        self._queue.join()
+
+    def query(self, device_id=None, predicted_class=None, region=None, since=None, until=None,
+              include_rejected=False, limit=50, cursor=None):
+        """
+        One page of history, newest first.
+
+        Args:
+            device_id, predicted_class, region: Optional exact-match filters
+            since, until: Optional Unix time bounds
+            include_rejected: Include predictions that were rejected
+            limit: Page size
+            cursor: next_cursor from the previous page
+
+        Returns:
+            Tuple of (list of rows, cursor for the next page or None)
+        """
+        clauses, params = self._filters(device_id, predicted_class, region, since, until, include_rejected)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM predictions {where} ORDER BY id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        for item in items:
+            item["is_rejected"] = bool(item["is_rejected"])
+        next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+        return items, next_cursor
+
+    def iter_chunks(self, device_id=None, predicted_class=None, region=None, since=None, until=None,
+                    include_rejected=False, after_id=None, chunk_size=5000):
+        """
+        Every matching row, oldest first, in chunks (for exports).
+
+        Each chunk is its own keyset query on the row ID, so no read
+        transaction stays open between chunks and memory use stays at one
+        chunk however many rows match.
+
+        Args:
+            device_id, predicted_class, region, since, until, include_rejected: As for query
+            after_id: Only rows with a larger ID (resume token from an earlier export)
+            chunk_size: Rows per chunk
+
+        Yields:
+            Lists of row dictionaries
+        """
+        clauses, params = self._filters(device_id, predicted_class, region, since, until, include_rejected)
+        clauses.append("id > ?")
+        sql = f"SELECT * FROM predictions WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+
+        last_id = int(after_id) if after_id is not None else 0
+        while True:
+            rows = self._conn().execute(sql, params + [last_id, chunk_size]).fetchall()
+            if not rows:
+                return
+            chunk = [dict(row) for row in rows]
+            for item in chunk:
+                item["is_rejected"] = bool(item["is_rejected"])
+            last_id = chunk[-1]["id"]
+            yield chunk
+            if len(rows) < chunk_size:
+                return
+
+    @staticmethod
+    def _filters(device_id, predicted_class, region, since, until, include_rejected):
+        """WHERE clauses and parameters shared by query and iter_chunks."""
+        clauses, params = [], []
+        for column, value in (("device_id", device_id), ("predicted_class", predicted_class), ("region", region)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if not include_rejected:
+            clauses.append("is_rejected = 0")
+        return clauses, params
+
+    def located_detections(self, since):
+        """Accepted, non-healthy predictions with coordinates recorded after since (for the outbreak index)."""
+        return self._conn().execute(
+            "SELECT created_at, predicted_class, latitude, longitude, severity FROM predictions "
+            "WHERE created_at >= ? AND latitude IS NOT NULL AND longitude IS NOT NULL "
+            "AND is_rejected = 0 AND predicted_class != 'healthy'",
+            (since,)
+        )
+
+    def status(self):
+        return {"written": self.written, "queued": self._queue.qsize(), "dropped": self.dropped}
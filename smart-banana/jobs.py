@@ -0,0 +1,318 @@
+"""
+Asynchronous Jobs
+A durable local job queue for slow predictions (tiling, multi-leaf, large uploads).
+
+Jobs live in a SQLite database, so queued work survives restarts and no
+outside service is needed. A worker claims a job by taking a time-limited
+lease. If the worker dies, the lease expires and another worker picks the
+job up again, which gives at-least-once processing, up to max_attempts
+leases per job. Result writes only apply while a job is unfinished, so a
+job that is processed twice keeps the first result.
+
+Usage:
+    queue = JobQueue("data/jobs.db")
+    pool = JobWorkerPool(queue, handler, workers=2)
+    job_id = queue.enqueue(image_bytes, mode="tiled")
+    queue.wait(job_id, timeout=30)
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+FINISHED = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    params TEXT NOT NULL,
+    payload BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+def json_default(value):
+    """json.dumps fallback for numpy values in results."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JobQueue:
+    def __init__(self, db_path, lease_seconds=120.0, max_attempts=3):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+            lease_seconds: How long a claimed job is reserved for its worker
+            max_attempts: Attempts before a failing job is marked failed
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._changed = threading.Condition()
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        """One connection per thread; SQLite connections cannot be shared across threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload, mode="standard", params=None):
+        """
+        Add a job.
+
+        Args:
+            payload: Encoded image bytes
+            mode: Prediction mode ("standard", "tiled" or "leaves")
+            params: Extra JSON-serializable parameters for the handler
+
+        Returns:
+            The new job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, mode, params, payload, created_at, updated_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, mode, json.dumps(params or {}), sqlite3.Binary(payload), now, now)
+        )
+        return job_id
+
+    def claim(self):
+        """
+        Lease the oldest runnable job: queued, or running with an expired lease.
+
+        A job whose lease expired after its last allowed attempt (its worker
+        died or hung every time) is marked failed instead of leased again.
+
+        Returns:
+            Dictionary with id, mode, params, payload and attempts, or None
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (f"Lease expired on all {self.max_attempts} attempts", now, now, self.max_attempts)
+            ).rowcount
+            row = conn.execute(
+                "SELECT id, mode, params, payload, attempts FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (now + self.lease_seconds, now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if expired or row is not None:
+            self._notify()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "mode": row["mode"],
+            "params": json.loads(row["params"]),
+            "payload": bytes(row["payload"]),
+            "attempts": row["attempts"] + 1,
+        }
+
+    def complete(self, job_id, result, attempts=None):
+        """
+        Store a job's result. Has no effect if the job already finished.
+
+        Args:
+            job_id: Job to complete
+            result: JSON-serializable result
+            attempts: The claim's attempt number; when given, the result is only
+                stored while that claim still holds the lease (the job was not re-claimed)
+
+        Returns:
+            True if this call wrote the result
+        """
+        sql = ("UPDATE jobs SET status = 'done', result = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+               "WHERE id = ? AND status NOT IN ('done', 'failed')")
+        params = (json.dumps(result, default=json_default), time.time(), job_id)
+        if attempts is not None:
+            sql += " AND status = 'running' AND attempts = ?"
+            params += (attempts,)
+        cursor = self._conn().execute(sql, params)
+        self._notify()
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, error, attempts):
+        """
+        Requeue a job after an error, or mark it failed after max_attempts.
+
+        Each claim increments attempts, so a worker whose lease expired and whose
+        job was claimed again no longer matches and changes nothing.
+
+        Returns:
+            True if this call requeued or failed the job
+        """
+        if attempts >= self.max_attempts:
+            sql = ("UPDATE jobs SET status = 'failed', error = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+                   "WHERE id = ? AND status = 'running' AND attempts = ?")
+        else:
+            sql = ("UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, updated_at = ? "
+                   "WHERE id = ? AND status = 'running' AND attempts = ?")
+        cursor = self._conn().execute(sql, (str(error), time.time(), job_id, attempts))
+        self._notify()
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        """Public view of a job (without the image), or None if unknown."""
+        row = self._conn().execute(
+            "SELECT id, status, mode, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "mode": row["mode"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"] if row["status"] == "failed" else None,
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def wait(self, job_id, timeout=30.0, poll_interval=0.5, changed_from=None):
+        """
+        Block until a job finishes or the timeout passes (for long-polling).
+
+        Status changes in this process wake waiters at once; the poll interval
+        covers jobs updated by workers in other processes.
+
+        Args:
+            job_id: Job to wait for
+            timeout: Longest wait in seconds
+            poll_interval: Seconds between database checks
+            changed_from: Also return as soon as the status differs from this one
+                (e.g. queued -> running), for status streams
+
+        Returns:
+            The job as returned by get, or None if unknown
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            if changed_from is not None and job["status"] != changed_from:
+                return job
+            with self._changed:
+                self._changed.wait(min(poll_interval, remaining))
+
+    def counts(self):
+        """Number of jobs per status."""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self, max_age_seconds):
+        """Delete finished jobs last updated more than max_age_seconds ago."""
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - max_age_seconds,)
+        )
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+
+class JobWorkerPool:
+    def __init__(self, queue, handler, workers=2, poll_interval=0.5, retention_seconds=24 * 3600,
+                 on_complete=None):
+        """
+        Args:
+            queue: JobQueue to take work from
+            handler: Callable(mode, params, payload) returning the JSON result
+            on_complete: Optional callable(job, result), called once per job when
+                its result is stored (not again if a re-leased job finishes twice)
+            workers: Number of worker threads
+            poll_interval: Idle wait between checks for new work
+            retention_seconds: Finished jobs older than this are purged
+        """
+        self.queue = queue
+        self.handler = handler
+        self.on_complete = on_complete
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._wakeup = threading.Event()
+        self._last_purge = 0.0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued."""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                self._maybe_purge()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                result = self.handler(job["mode"], job["params"], job["payload"])
+            except Exception as e:
+                logger.exception("Job %s failed", job["id"], extra={"job_id": job["id"], "attempt": job["attempts"]})
+                self.queue.fail(job["id"], e, job["attempts"])
+                continue
+            if self.queue.complete(job["id"], result, job["attempts"]) and self.on_complete is not None:
+                try:
+                    self.on_complete(job, result)
+                except Exception:
+                    logger.exception("Completion hook failed for job %s", job["id"], extra={"job_id": job["id"]})
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge > 600:
+            self._last_purge = now
+            self.queue.purge(self.retention_seconds)
@@ -0,0 +1,102 @@
+"""
+Live Preview Sessions
+Per-connection state for the /ws/preview WebSocket.
+
+The camera screen streams small JPEG frames. Each connection keeps only the
+newest frame it has not classified yet: when inference falls behind, older
+frames are overwritten and counted as dropped (latest-frame-wins). A worker
+thread per session classifies that frame and pushes a short hint back; the
+forward pass goes through the classifier's shared MicroBatcher, so
+concurrent sessions and /predict requests share batches.
+"""
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def preview_hint(result):
+    """Reduce a classifier result to the hint shown on the camera screen."""
+    if result["is_rejected"]:
+        return "not_a_leaf" if not result["is_leaf_like"] else "uncertain"
+    return "healthy" if result["predicted_class"] == "healthy" else "diseased"
+
+
+class LiveSession:
+    def __init__(self, send, classifier):
+        """
+        Args:
+            send: Callable that sends a text message to the client
+            classifier: BananaLeafClassifier, normally with a MicroBatcher attached
+        """
+        self.send = send
+        self.classifier = classifier
+        self.input_size = classifier.input_size
+
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+
+        self._latest = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="live-preview", daemon=True)
+        self._worker.start()
+
+    def push(self, data):
+        """
+        Accept an encoded frame from the client, replacing any frame still waiting.
+
+        Args:
+            data: JPEG or PNG bytes
+        """
+        with self._condition:
+            self.received += 1
+            if self._latest is not None:
+                self.dropped += 1
+            self._latest = (self.received, data, time.perf_counter())
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _decode(self, data):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Frame is not a valid JPEG or PNG image")
+        frame = cv2.resize(frame, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._latest is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                seq, data, received_at = self._latest
+                self._latest = None
+
+            try:
+                result = self.classifier.predict_batch(self._decode(data)[np.newaxis])[0]
+                self.processed += 1
+                message = {
+                    "seq": seq,
+                    "hint": preview_hint(result),
+                    "predicted_class": result["predicted_class"],
+                    "confidence": round(float(result["confidence"]), 4),
+                    "latency_ms": round((time.perf_counter() - received_at) * 1000, 1),
+                    "dropped": self.dropped,
+                }
+            except Exception as e:
+                message = {"seq": seq, "error": str(e)}
+
+            try:
+                self.send(json.dumps(message))
+            except Exception:
+                # Client went away; the receive loop will close the session
+                return
@@ -0,0 +1,104 @@
+"""
+Micro-batcher
+Shares forward passes between concurrent callers of BananaLeafClassifier.
+
+Callers submit single preprocessed images and get a Future back. A background
+thread collects whatever arrived within max_wait_ms (up to max_batch_size
+images) and runs it through the model in one forward pass, so many
+concurrent requests cost about as much as a few batched ones.
+
+Only the forward pass is shared: gating, rejection and severity stay with
+the caller. Attached to a classifier, the batcher serves every single-image
+forward pass, so /predict and the live preview sessions share batches.
+
+Usage:
+    batcher = MicroBatcher(classifier, max_batch_size=16, max_wait_ms=10)
+    classifier.batcher = batcher
+    result = classifier.predict_with_rejection(image)
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, classifier, max_batch_size=16, max_wait_ms=10.0, timeout=30.0):
+        """
+        Args:
+            classifier: BananaLeafClassifier used for every batch
+            max_batch_size: Largest batch sent to the model
+            max_wait_ms: How long the first image of a batch waits for others
+            timeout: Seconds a caller waits for its batch before giving up
+        """
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.timeout = timeout
+        self.batches = 0
+        self.images = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, img_array):
+        """
+        Queue one image for the next forward pass.
+
+        Args:
+            img_array: Array of shape (height, width, 3) scaled to [0, 1]
+
+        Returns:
+            Future resolving to (class probabilities, cascade stage) for the image
+        """
+        future = Future()
+        self._queue.put((img_array, future))
+        return future
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait is over."""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Images at different resolutions go to different models
+            groups = {}
+            for img, future in items:
+                groups.setdefault(img.shape, []).append((img, future))
+            for group in groups.values():
+                try:
+                    probabilities, stages = self.classifier._predict_probabilities(
+                        np.stack([img for img, _ in group]), batch_size=len(group)
+                    )
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                self.images += len(group)
+                for (_, future), p, stage in zip(group, probabilities, stages):
+                    future.set_result((p, stage))
+
+    def status(self):
+        """Counters for /model-info."""
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
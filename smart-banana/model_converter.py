@@ -1,10 +1,26 @@
 """
 Model Converter Script
 Converts the Keras 3 model to a more compatible format for deployment
+
+Running it without arguments converts to H5 and SavedModel. The quantize
+command builds TFLite variants (float16, dynamic-range, full int8) from a
+representative dataset, measures each against the float model and writes
+signed artifacts to saved_models/variants that the server can select with
+BANANA_MODEL_VARIANT:
+
+    python model_converter.py quantize --calibration-dir shards/
 """
 import tensorflow as tf
 from tensorflow import keras
+import argparse
+import json
 import os
+import sys
+import time
+
+import numpy as np
+
+QUANTIZATION_VARIANTS = ("float16", "dynamic", "int8")
 
 def convert_model_to_h5():
     """Convert the .keras model to .h5 format for better compatibility"""
@@ -65,7 +81,179 @@ def convert_model_to_savedmodel():
         traceback.print_exc()
         return False
 
-if __name__ == "__main__":
+def load_calibration_images(source, num_calibration, num_eval, seed=0):
+    """
+    Draw disjoint calibration and evaluation samples of a shard or image directory as uint8.
+
+    Sources are stored class by class, so both samples are drawn at random and
+    stratified by class rather than taken from the front.
+
+    Args:
+        source: Shard directory (dataset_shards.py) or directory tree of images
+        num_calibration: Calibration sample size
+        num_eval: Evaluation sample size
+        seed: Random seed for the samples
+
+    Returns:
+        Tuple of (calibration images, evaluation images), each of shape (N, 160, 160, 3)
+    """
+    from dataset_shards import sample_source
+
+    calibration_images, eval_images = sample_source(source, (num_calibration, num_eval), seed=seed)
+    if len(calibration_images) == 0:
+        raise ValueError(f"No images found in {source}")
+    return calibration_images, eval_images
+
+
+def convert_to_tflite(model, variant, calibration_images=None):
+    """
+    Convert a Keras model to one TFLite variant.
+
+    Args:
+        model: Loaded Keras model
+        variant: "float16", "dynamic" or "int8"
+        calibration_images: uint8 images for the int8 representative dataset
+
+    Returns:
+        Serialized TFLite model bytes
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        # Same [0, 1] scaling BananaLeafClassifier.preprocess_image feeds the model
+        def representative_data_gen():
+            for image in calibration_images:
+                yield [image[np.newaxis].astype(np.float32) / 255.0]
+
+        converter.representative_dataset = representative_data_gen
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif variant != "dynamic":
+        raise ValueError(f"Unknown variant '{variant}', expected one of {QUANTIZATION_VARIANTS}")
+
+    return converter.convert()
+
+
+def measure_latency(predict_fn, image, runs=50, warmup=5):
+    """
+    Single-image CPU latency of a predict function.
+
+    Returns:
+        Dictionary with p50_ms, p95_ms and mean_ms
+    """
+    for _ in range(warmup):
+        predict_fn(image)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict_fn(image)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings = np.array(timings)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(float(timings.mean()), 3),
+    }
+
+
+def quantize_model(model_path="saved_models/banana_mobilenetv2_final.keras", calibration_dir=None,
+                   variants=QUANTIZATION_VARIANTS, num_calibration=200, num_eval=500, variants_dir=None, seed=0):
+    """
+    Build quantized variants and report how closely each matches the float model.
+
+    For every variant this measures top-1 agreement and rejection-decision
+    agreement with the float model on held-out images, plus single-image
+    CPU latency, then writes the .tflite file and a signed manifest.
+
+    Args:
+        model_path: Float Keras model
+        calibration_dir: Shard or image directory; disjoint class-stratified random
+            samples of num_calibration and num_eval images calibrate int8 and evaluate
+        variants: Variants to build
+        num_calibration: Representative dataset size
+        num_eval: Evaluation set size
+        variants_dir: Output directory (default: saved_models/variants)
+        seed: Random seed for the calibration and evaluation samples
+
+    Returns:
+        Dictionary mapping variant name to its report
+    """
+    from enhanced_inference import BananaLeafClassifier, TFLiteModel
+    from model_registry import VARIANTS_DIR, write_manifest
+
+    variants_dir = variants_dir or VARIANTS_DIR
+    os.makedirs(variants_dir, exist_ok=True)
+
+    print(f"🔄 Loading float model from {model_path}...")
+    classifier = BananaLeafClassifier(model_path)
+    model = classifier.model
+
+    calibration_images, eval_images = load_calibration_images(calibration_dir, num_calibration, num_eval, seed=seed)
+    eval_batch = eval_images.astype(np.float32) / 255.0
+    if len(eval_batch) == 0:
+        raise ValueError(f"Need more than {num_calibration} images for evaluation")
+    print(f"   {len(calibration_images)} calibration / {len(eval_batch)} evaluation images")
+
+    leaf_like = [classifier.is_banana_leaf_like(eval_batch[i:i + 1]) for i in range(len(eval_batch))]
+    float_probs = model.predict(eval_batch, batch_size=32, verbose=0)
+    float_top1 = float_probs.argmax(axis=1)
+    float_rejected = np.array([
+        classifier._build_result(p, leaf)["is_rejected"] for p, leaf in zip(float_probs, leaf_like)
+    ])
+    float_latency = measure_latency(lambda x: model(x, training=False), eval_batch[:1])
+    print(f"   float32: p50 {float_latency['p50_ms']} ms")
+
+    reports = {}
+    for variant in variants:
+        print(f"🔄 Converting {variant}...")
+        try:
+            tflite_bytes = convert_to_tflite(model, variant, calibration_images)
+        except Exception as e:
+            print(f"❌ {variant} conversion failed: {e}")
+            continue
+
+        artifact_path = os.path.join(variants_dir, f"{variant}.tflite")
+        with open(artifact_path, "wb") as f:
+            f.write(tflite_bytes)
+
+        tflite_model = TFLiteModel(artifact_path)
+        probs = np.concatenate([tflite_model.predict(eval_batch[i:i + 32]) for i in range(0, len(eval_batch), 32)])
+        rejected = np.array([
+            classifier._build_result(p, leaf)["is_rejected"] for p, leaf in zip(probs, leaf_like)
+        ])
+
+        report = {
+            "variant": variant,
+            "source_model": os.path.basename(model_path),
+            "eval_images": int(len(eval_batch)),
+            "size_mb": round(len(tflite_bytes) / (1024 * 1024), 2),
+            "top1_agreement": round(float(np.mean(probs.argmax(axis=1) == float_top1)), 4),
+            "rejection_agreement": round(float(np.mean(rejected == float_rejected)), 4),
+            "max_abs_prob_diff": round(float(np.max(np.abs(probs - float_probs))), 4),
+            "latency": measure_latency(tflite_model.predict, eval_batch[:1]),
+            "float_latency": float_latency,
+        }
+        write_manifest(artifact_path, variant, report, variants_dir=variants_dir)
+        reports[variant] = report
+        print(f"✅ {variant}: {report['size_mb']} MB, top-1 agreement {report['top1_agreement']:.2%}, "
+              f"rejection agreement {report['rejection_agreement']:.2%}, p50 {report['latency']['p50_ms']} ms")
+
+    report_path = os.path.join(variants_dir, "quantization_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(reports, f, indent=2)
+    print(f"💾 Report written to {report_path}")
+
+    return reports
+
+
+def convert_all():
+    """Convert to H5 and SavedModel (the original behaviour of this script)."""
     print("=" * 60)
     print("Model Converter for Deployment Compatibility")
     print("=" * 60)
@@ -90,3 +278,39 @@ if __name__ == "__main__":
     if h5_success:
         print("\n✅ Recommended: Use the H5 model for deployment")
         print("   File: saved_models/banana_mobilenetv2_final.h5")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the banana model for deployment.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    quantize = subparsers.add_parser("quantize", help="Build and evaluate quantized TFLite variants")
+    quantize.add_argument("--model", default="saved_models/banana_mobilenetv2_final.keras")
+    quantize.add_argument("--calibration-dir", required=True,
+                          help="Shard directory or image directory for calibration and evaluation")
+    quantize.add_argument("--variants", nargs="+", choices=QUANTIZATION_VARIANTS, default=list(QUANTIZATION_VARIANTS))
+    quantize.add_argument("--num-calibration", type=int, default=200)
+    quantize.add_argument("--num-eval", type=int, default=500)
+    quantize.add_argument("--seed", type=int, default=0, help="Random seed for the calibration and evaluation samples")
+    quantize.add_argument("--output-dir", default=None, help="Default: saved_models/variants")
+
+    args = parser.parse_args(argv)
+
+    if args.command != "quantize":
+        convert_all()
+        return 0
+
+    try:
+        quantize_model(args.model, args.calibration_dir, variants=args.variants,
+                       num_calibration=args.num_calibration, num_eval=args.num_eval,
+                       variants_dir=args.output_dir, seed=args.seed)
+    except Exception as e:
+        print(f"❌ Quantization failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
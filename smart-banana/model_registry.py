@@ -0,0 +1,134 @@
+"""
+Model Variant Registry
+Signed manifests for the model variants produced by model_converter.py.
+
+Every variant (e.g. "int8", "float16") lives in saved_models/variants as
+<name>.tflite (or .keras) plus <name>.json. The manifest records the file's
+SHA-256, the accuracy/latency report and an HMAC-SHA256 signature made with
+BANANA_MODEL_SIGNING_KEY, so the server only loads artifacts that match what
+the conversion run produced.
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+
+VARIANTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_models", "variants")
+SIGNING_KEY_ENV = "BANANA_MODEL_SIGNING_KEY"
+
+
+class ModelVerificationError(Exception):
+    """Raised when a variant's file or signature does not match its manifest."""
+
+
+def file_sha256(path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _signing_key(key=None):
+    key = key if key is not None else os.environ.get(SIGNING_KEY_ENV)
+    return key.encode("utf-8") if isinstance(key, str) else key
+
+
+def _payload(manifest):
+    """Canonical bytes covered by the signature (everything except the signature)."""
+    unsigned = {k: v for k, v in manifest.items() if k != "signature"}
+    return json.dumps(unsigned, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def write_manifest(artifact_path, name, report=None, key=None, variants_dir=VARIANTS_DIR):
+    """
+    Write and sign the manifest for a variant.
+
+    Args:
+        artifact_path: Path to the model file inside variants_dir
+        name: Variant name the server selects it by
+        report: Accuracy/latency measurements for the variant
+        key: Signing key (defaults to BANANA_MODEL_SIGNING_KEY)
+        variants_dir: Directory holding variants and manifests
+
+    Returns:
+        Path to the manifest file
+    """
+    manifest = {
+        "name": name,
+        "file": os.path.basename(artifact_path),
+        "sha256": file_sha256(artifact_path),
+        "size_bytes": os.path.getsize(artifact_path),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "report": report or {},
+    }
+
+    signing_key = _signing_key(key)
+    if signing_key:
+        manifest["signature"] = hmac.new(signing_key, _payload(manifest), hashlib.sha256).hexdigest()
+    else:
+        print(f"⚠️  {SIGNING_KEY_ENV} is not set, manifest for '{name}' is unsigned")
+        manifest["signature"] = None
+
+    manifest_path = os.path.join(variants_dir, f"{name}.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def list_variants(variants_dir=VARIANTS_DIR):
+    """Names of all variants with a manifest."""
+    if not os.path.exists(variants_dir):
+        return []
+
+    names = []
+    for filename in sorted(os.listdir(variants_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(variants_dir, filename), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        # Skip other JSON files such as quantization_report.json
+        if "sha256" in manifest and "file" in manifest:
+            names.append(manifest["name"])
+    return names
+
+
+def resolve_variant(name, key=None, variants_dir=VARIANTS_DIR):
+    """
+    Find a variant by name and verify it before it is loaded.
+
+    The file hash is always checked. When a signing key is configured the
+    manifest must also carry a valid signature.
+
+    Args:
+        name: Variant name, e.g. "int8"
+        key: Signing key (defaults to BANANA_MODEL_SIGNING_KEY)
+        variants_dir: Directory holding variants and manifests
+
+    Returns:
+        Tuple of (artifact path, manifest)
+    """
+    manifest_path = os.path.join(variants_dir, f"{name}.json")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(
+            f"Unknown model variant '{name}'. Available: {', '.join(list_variants(variants_dir)) or 'none'}"
+        )
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    artifact_path = os.path.join(variants_dir, manifest["file"])
+    if not os.path.exists(artifact_path):
+        raise FileNotFoundError(f"Model file for variant '{name}' not found at {artifact_path}")
+    if file_sha256(artifact_path) != manifest["sha256"]:
+        raise ModelVerificationError(f"Checksum mismatch for variant '{name}'")
+
+    signing_key = _signing_key(key)
+    if signing_key:
+        expected = hmac.new(signing_key, _payload(manifest), hashlib.sha256).hexdigest()
+        if not manifest.get("signature") or not hmac.compare_digest(expected, manifest["signature"]):
+            raise ModelVerificationError(f"Invalid signature for variant '{name}'")
+
+    return artifact_path, manifest
@@ -0,0 +1,181 @@
+"""
+Geospatial Outbreak Index
+In-memory grid of recent diseased detections, for outbreak heatmaps.
+
+Detections with coordinates are bucketed into fixed-size lat/lon grid cells.
+Each cell keeps its detections in time order, so detections older than the
+window are evicted from the front of the cell as new ones arrive or cells
+are queried. Clusters are groups of neighbouring cells (8-connected) that
+hold recent detections of the same disease.
+
+The index is rebuilt from the history store on startup and updated
+incrementally afterwards.
+
+Usage:
+    index = OutbreakIndex(cell_size=0.05, window_seconds=14 * 86400)
+    index.add(-1.95, 30.06, "sigatoka")
+    index.query((29.9, -2.1, 30.2, -1.8))
+"""
+import math
+import threading
+import time
+from collections import deque
+
+# Diseases whose clusters are reported as outbreaks
+OUTBREAK_DISEASES = ("sigatoka", "cordana")
+
+
+class OutbreakIndex:
+    def __init__(self, cell_size=0.05, window_seconds=14 * 86400, max_query_cells=250000):
+        """
+        Args:
+            cell_size: Grid cell size in degrees (0.05 is roughly 5 km)
+            window_seconds: Detections older than this are evicted
+            max_query_cells: Above this many cells in a bounding box, queries
+                scan the occupied cells instead of enumerating the box
+        """
+        self.cell_size = cell_size
+        self.window_seconds = window_seconds
+        self.max_query_cells = max_query_cells
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, latitude, longitude):
+        return (int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size)))
+
+    def add(self, latitude, longitude, disease, timestamp=None, severity=None):
+        """Record one diseased detection."""
+        timestamp = timestamp or time.time()
+        if timestamp < time.time() - self.window_seconds:
+            return
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            detections = self._cells.setdefault(cell, deque())
+            detections.append((timestamp, disease, latitude, longitude, severity))
+            # Out-of-order arrivals (synced scans) are rare; keep the cell sorted
+            if len(detections) > 1 and detections[-2][0] > timestamp:
+                self._cells[cell] = deque(sorted(detections, key=lambda d: d[0]))
+            self._evict(cell)
+
+    def load(self, rows):
+        """Add detections from history rows (created_at, predicted_class, latitude, longitude, severity)."""
+        count = 0
+        for row in rows:
+            self.add(row["latitude"], row["longitude"], row["predicted_class"],
+                     timestamp=row["created_at"], severity=row["severity"])
+            count += 1
+        return count
+
+    def _evict(self, cell, now=None):
+        """Drop expired detections from one cell; caller holds the lock."""
+        cutoff = (now or time.time()) - self.window_seconds
+        detections = self._cells[cell]
+        while detections and detections[0][0] < cutoff:
+            detections.popleft()
+        if not detections:
+            del self._cells[cell]
+
+    def _cells_in(self, bbox):
+        """Occupied cells inside (min_lon, min_lat, max_lon, max_lat); caller holds the lock."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        (row0, col0), (row1, col1) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        area = (row1 - row0 + 1) * (col1 - col0 + 1)
+
+        if area <= min(self.max_query_cells, len(self._cells)):
+            return [(r, c) for r in range(row0, row1 + 1) for c in range(col0, col1 + 1) if (r, c) in self._cells]
+        return [(r, c) for r, c in self._cells if row0 <= r <= row1 and col0 <= c <= col1]
+
+    def query(self, bbox, since=None, diseases=OUTBREAK_DISEASES, min_cluster_size=3):
+        """
+        Heatmap cells and outbreak clusters inside a bounding box.
+
+        Args:
+            bbox: (min_lon, min_lat, max_lon, max_lat)
+            since: Only detections after this Unix time (within the window)
+            diseases: Diseases clusters are reported for
+            min_cluster_size: Smallest number of detections reported as a cluster
+
+        Returns:
+            Dictionary with "cells" (per-cell counts by disease) and "clusters"
+        """
+        now = time.time()
+        since = max(since or 0, now - self.window_seconds)
+
+        with self._lock:
+            cells = {}
+            for cell in self._cells_in(bbox):
+                self._evict(cell, now)
+                if cell not in self._cells:
+                    continue
+                recent = [d for d in self._cells[cell] if d[0] >= since]
+                if recent:
+                    cells[cell] = recent
+
+        heatmap = []
+        for (row, col), detections in cells.items():
+            counts = {}
+            for _, disease, _, _, _ in detections:
+                counts[disease] = counts.get(disease, 0) + 1
+            heatmap.append({
+                "cell": f"{row}:{col}",
+                "latitude": round((row + 0.5) * self.cell_size, 6),
+                "longitude": round((col + 0.5) * self.cell_size, 6),
+                "count": len(detections),
+                "counts": counts,
+                "latest": max(d[0] for d in detections),
+            })
+
+        clusters = []
+        for disease in diseases:
+            clusters.extend(self._clusters(cells, disease, min_cluster_size))
+        clusters.sort(key=lambda c: c["count"], reverse=True)
+
+        return {"cell_size": self.cell_size, "cells": heatmap, "clusters": clusters}
+
+    def _clusters(self, cells, disease, min_cluster_size):
+        """Connected groups of cells with detections of one disease."""
+        members = {cell: [d for d in detections if d[1] == disease] for cell, detections in cells.items()}
+        members = {cell: detections for cell, detections in members.items() if detections}
+
+        clusters, seen = [], set()
+        for start in members:
+            if start in seen:
+                continue
+            seen.add(start)
+            stack, group = [start], []
+            while stack:
+                row, col = stack.pop()
+                group.append((row, col))
+                for dr in (-1, 0, 1):
+                    for dc in (-1, 0, 1):
+                        neighbour = (row + dr, col + dc)
+                        if neighbour in members and neighbour not in seen:
+                            seen.add(neighbour)
+                            stack.append(neighbour)
+
+            detections = [d for cell in group for d in members[cell]]
+            if len(detections) < min_cluster_size:
+                continue
+            latitudes = [d[2] for d in detections]
+            longitudes = [d[3] for d in detections]
+            severities = [d[4] for d in detections if d[4] is not None]
+            clusters.append({
+                "disease": disease,
+                "count": len(detections),
+                "cells": len(group),
+                "latitude": round(sum(latitudes) / len(latitudes), 6),
+                "longitude": round(sum(longitudes) / len(longitudes), 6),
+                "bbox": [min(longitudes), min(latitudes), max(longitudes), max(latitudes)],
+                "mean_severity": round(sum(severities) / len(severities), 4) if severities else None,
+                "latest": max(d[0] for d in detections),
+            })
+        return clusters
+
+    def status(self):
+        with self._lock:
+            return {
+                "cells": len(self._cells),
+                "detections": sum(len(d) for d in self._cells.values()),
+                "cell_size": self.cell_size,
+                "window_seconds": self.window_seconds,
+            }
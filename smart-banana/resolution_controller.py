@@ -0,0 +1,98 @@
+"""
+Load-adaptive Resolution Controller
+Picks the model input resolution for each request from current load.
+
+When requests pile up (too many in flight) or recent latency exceeds the
+SLO, the controller steps down to the next smaller resolution the classifier
+has a model for. It steps back up only once load is comfortably below the
+limits, so it does not flap between sizes on every request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ResolutionController:
+    def __init__(self, resolutions, latency_slo_ms=500.0, max_in_flight=4, smoothing=0.2):
+        """
+        Args:
+            resolutions: Available input sizes, e.g. [160, 128]
+            latency_slo_ms: Target request latency
+            max_in_flight: Concurrent requests above which resolution is reduced
+            smoothing: Weight of the newest sample in the latency moving average
+        """
+        self.resolutions = sorted(set(resolutions), reverse=True)
+        self.latency_slo_ms = latency_slo_ms
+        self.max_in_flight = max_in_flight
+        self.smoothing = smoothing
+
+        self._lock = threading.Lock()
+        self._level = 0                 # index into self.resolutions, 0 = full size
+        self._in_flight = 0
+        self._latency_ms = 0.0
+        self._last_change = 0.0
+        self.counts = {size: 0 for size in self.resolutions}
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def latency_ms(self):
+        return self._latency_ms
+
+    def _update_level(self):
+        """Step down under pressure, step up when there is clear headroom."""
+        now = time.monotonic()
+        overloaded = self._in_flight > self.max_in_flight or self._latency_ms > self.latency_slo_ms
+        relaxed = self._in_flight <= self.max_in_flight // 2 and self._latency_ms < 0.7 * self.latency_slo_ms
+
+        # Wait a moment between changes so the latency average reflects the current level
+        if now - self._last_change < 1.0:
+            return
+        if overloaded and self._level < len(self.resolutions) - 1:
+            self._level += 1
+            self._last_change = now
+        elif relaxed and self._level > 0:
+            self._level -= 1
+            self._last_change = now
+
+    def choose(self):
+        """Resolution to use for a new request."""
+        with self._lock:
+            self._update_level()
+            size = self.resolutions[self._level]
+            self.counts[size] += 1
+            return size
+
+    @contextmanager
+    def track(self):
+        """
+        Wrap a request: counts it as in flight and records its latency.
+
+        Yields:
+            The resolution chosen for this request
+        """
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield self.choose()
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._in_flight -= 1
+                self._latency_ms = (1 - self.smoothing) * self._latency_ms + self.smoothing * elapsed_ms
+
+    def status(self):
+        """Current state, for /model-info."""
+        with self._lock:
+            return {
+                "resolutions": self.resolutions,
+                "current": self.resolutions[self._level],
+                "in_flight": self._in_flight,
+                "latency_ms": round(self._latency_ms, 1),
+                "latency_slo_ms": self.latency_slo_ms,
+                "max_in_flight": self.max_in_flight,
+                "counts": dict(self.counts),
+            }
@@ -1,9 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 import numpy as np
 from PIL import Image
 from flask_cors import CORS
 from flasgger import Swagger, swag_from
-import traceback
+import io
+import json
+import logging
+import tempfile
+import threading
+import time
+import uuid
 import os
 import sys
 import tensorflow as tf
@@ -16,8 +22,32 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-from enhanced_inference import BananaLeafClassifier
+from enhanced_inference import BananaLeafClassifier, UnsupportedModelError
+from model_registry import resolve_variant
+from gates import GatePipeline
+from resolution_controller import ResolutionController
+from explain import InputCache, GradCamExplainer
+from burst import iter_video_frames, iter_burst_frames, classify_frames
+from micro_batcher import MicroBatcher
+from live_preview import LiveSession
+from jobs import JobQueue, JobWorkerPool
+from sync import BundleError, BundleTooLarge, ProcessedKeyStore, read_bundle, process_bundle
+from history import HistoryStore, history_row, parse_time
+from outbreaks import OutbreakIndex
+from export import FORMATS as EXPORT_FORMATS, export_stream
+from telemetry import TelemetryAggregator
+from tracing import Tracer, span
+from structured_logging import configure_logging, request_id_var
 
+# WebSocket support is optional; without flask-sock the live preview is disabled
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+# JSON log lines written by a background thread, so logging never blocks a request
+log_handler = configure_logging(level=os.environ.get("BANANA_LOG_LEVEL", "INFO"))
+logger = logging.getLogger("server")
 
 
 # --- Safe model loader with TF 2.20 compatibility ---
@@ -26,34 +56,52 @@ def safe_load_model(model_path):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found at {model_path}")
         
-        print(f"🔄 Attempting to load model from {model_path}...")
-        print(f"   TensorFlow version: {tf.__version__}")
+        logger.info("Loading model", extra={"path": model_path, "tensorflow_version": tf.__version__})
         
         # For TF 2.20+, use legacy keras if model has compatibility issues
         try:
             # Try standard loading first
             model = keras.models.load_model(model_path, compile=False)
         except Exception as load_error:
-            print(f"   ⚠️  Standard loading failed: {load_error}")
-            print(f"   🔄 Trying with safe_mode=False...")
+            logger.warning("Standard model loading failed, retrying with safe_mode=False",
+                           extra={"path": model_path, "error": str(load_error)})
             # Try with safe_mode=False for backward compatibility
             import keras
             model = keras.models.load_model(model_path, compile=False, safe_mode=False)
         
-        print(f"✅ Model loaded successfully from {model_path}")
-        print(f"   Input shape: {model.input_shape}")
-        print(f"   Output shape: {model.output_shape}")
+        logger.info("Model loaded", extra={
+            "path": model_path, "input_shape": model.input_shape, "output_shape": model.output_shape
+        })
         return model
     except Exception as e:
-        print(f"❌ Model loading failed: {e}")
-        print(f"   TensorFlow version: {tf.__version__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Model loading failed", extra={"path": model_path, "tensorflow_version": tf.__version__})
         return None
 
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def assign_request_id():
+    # Every log line written while handling the request carries this ID
+    g.request_id = (request.headers.get("X-Request-ID") or uuid.uuid4().hex)[:64]
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def return_request_id(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        try:
+            request_id_var.reset(token)
+        except ValueError:
+            request_id_var.set(None)
+sock = Sock(app) if Sock is not None else None
+
 # Swagger configuration
 swagger_config = {
     "headers": [],
@@ -96,6 +144,18 @@ swagger_template = {
         {
             "name": "Model Info",
             "description": "Model information endpoints"
+        },
+        {
+            "name": "Jobs",
+            "description": "Asynchronous prediction jobs"
+        },
+        {
+            "name": "History",
+            "description": "Server-side prediction history"
+        },
+        {
+            "name": "Telemetry",
+            "description": "Client performance telemetry"
         }
     ]
 }
@@ -103,11 +163,11 @@ swagger_template = {
 swagger = Swagger(app, config=swagger_config, template=swagger_template)
 
 # Initialize the enhanced classifier
+model_variant = os.environ.get("BANANA_MODEL_VARIANT")  # e.g. "int8", see model_converter.py quantize
 try:
     # Get the directory where server.py is located
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    print(f"📁 Server running from: {current_dir}")
-    print(f"📁 Current working directory: {os.getcwd()}")
+    logger.info("Starting server", extra={"server_dir": current_dir, "cwd": os.getcwd()})
     
     # Try multiple possible paths for local and deployed environments
     possible_paths = [
@@ -121,21 +181,236 @@ try:
     for path in possible_paths:
         if os.path.exists(path):
             model_path = path
-            print(f"✅ Found model at: {path}")
+            logger.info("Found model", extra={"path": path})
             break
     
-    if model_path is None:
+    if model_variant:
+        # Quantized variants are verified against their signed manifest before loading
+        model_path, variant_manifest = resolve_variant(model_variant)
+        logger.info("Using model variant", extra={"variant": model_variant, "path": model_path})
+    elif model_path is None:
         raise FileNotFoundError(f"Model not found in any of these paths: {possible_paths}")
+    else:
+        test_model = safe_load_model(model_path)
+    
+    # Calibrated thresholds: BANANA_THRESHOLDS_PATH, else saved_models/thresholds.json if present
+    thresholds_path = os.environ.get("BANANA_THRESHOLDS_PATH")
+    default_thresholds_path = os.path.join(current_dir, "saved_models", "thresholds.json")
+    if thresholds_path is None and os.path.exists(default_thresholds_path):
+        thresholds_path = default_thresholds_path
+    
+    # Optional cascade: a cheap model answers first, the full model only runs on uncertain images
+    classifier = BananaLeafClassifier(
+        model_path,
+        thresholds_path=thresholds_path,
+        cascade_model_path=os.environ.get("BANANA_CASCADE_MODEL"),
+        cascade_min_confidence=float(os.environ.get("BANANA_CASCADE_MIN_CONFIDENCE", 0.9)),
+        cascade_max_entropy=float(os.environ.get("BANANA_CASCADE_MAX_ENTROPY", 0.35)),
+        # Test-time augmentation for borderline images, e.g. BANANA_TTA_ENTROPY=0.5
+        tta_entropy_threshold=float(os.environ["BANANA_TTA_ENTROPY"]) if os.environ.get("BANANA_TTA_ENTROPY") else None,
+        # Keep preprocessed inputs so /explain can compute Grad-CAM later
+        input_cache=InputCache(max_entries=int(os.environ.get("BANANA_EXPLAIN_CACHE_SIZE", 256)))
+    )
     
-    test_model = safe_load_model(model_path)
-    classifier = BananaLeafClassifier(model_path)
-    print("Enhanced Banana Disease Classifier loaded successfully!")
+    # Extra input sizes for load-adaptive serving, e.g. BANANA_RESOLUTION_MODELS="128=saved_models/banana_128.keras"
+    for entry in filter(None, os.environ.get("BANANA_RESOLUTION_MODELS", "").split(",")):
+        size, path = entry.split("=", 1)
+        classifier.add_resolution_variant(int(size), path.strip())
+        logger.info("Loaded resolution variant", extra={"size": int(size), "path": path.strip()})
+    
+    # Pre-inference gates are off until their thresholds are calibrated on field photos:
+    # BANANA_GATES=default enables the built-in list, a path loads a JSON gate list
+    gates_setting = os.environ.get("BANANA_GATES", "off")
+    if gates_setting == "default":
+        classifier.gates = GatePipeline.default(min_green_ratio=classifier.min_green_ratio)
+    elif gates_setting != "off":
+        classifier.gates = GatePipeline.from_config(gates_setting)
+    logger.info("Enhanced Banana Disease Classifier loaded")
 except Exception as e:
-    print(f"Error loading classifier: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.exception("Error loading classifier")
     classifier = None
 
+# Disease-specific information returned with each diagnosis
+DISEASE_INFO = {
+    "healthy": {
+        "description": "The leaf appears healthy with no visible signs of disease.",
+        "severity": "None",
+        "recommendation": "Continue regular monitoring and good agricultural practices.",
+        "urgent": False
+    },
+    "cordana": {
+        "description": "Cordana leaf spot is a fungal disease causing dark spots on leaves.",
+        "severity": "Moderate",
+        "recommendation": "Apply fungicide and improve air circulation around plants.",
+        "urgent": True
+    },
+    "pestalotiopsis": {
+        "description": "Pestalotiopsis causes leaf spots and can lead to leaf blight.",
+        "severity": "Moderate to High",
+        "recommendation": "Remove affected leaves and apply appropriate fungicide treatment.",
+        "urgent": True
+    },
+    "sigatoka": {
+        "description": "Sigatoka is a serious fungal disease causing yellowing and black streaks.",
+        "severity": "High",
+        "recommendation": "Immediate fungicide treatment and removal of affected leaves required.",
+        "urgent": True
+    }
+}
+
+# Grad-CAM on request, from the inputs cached by /predict
+explainer = GradCamExplainer(classifier, classifier.input_cache) if classifier else None
+max_explain_batch = int(os.environ.get("BANANA_EXPLAIN_MAX_BATCH", 32))
+
+# Upper bound on tiles per image in tiled mode; larger photos are downscaled to fit
+max_tiles = int(os.environ.get("BANANA_MAX_TILES", 48))
+
+# Upper bound on leaves classified per photo in leaves mode
+max_leaves = int(os.environ.get("BANANA_MAX_LEAVES", 8))
+
+# Shared batching path: concurrent single-image callers (/predict, live preview) share forward passes
+batcher = MicroBatcher(
+    classifier,
+    max_batch_size=int(os.environ.get("BANANA_BATCH_MAX_SIZE", 16)),
+    max_wait_ms=float(os.environ.get("BANANA_BATCH_MAX_WAIT_MS", 10))
+) if classifier else None
+if batcher is not None:
+    classifier.batcher = batcher
+
+# Each live session holds a server thread for as long as it is open, so they are capped
+# below the thread count (gunicorn --threads 8) to keep threads free for HTTP requests
+max_live_sessions = int(os.environ.get("BANANA_LIVE_MAX_SESSIONS", 4))
+live_slots = threading.BoundedSemaphore(max_live_sessions)
+
+# Upper bound on frames sampled from one video or burst
+max_burst_frames = int(os.environ.get("BANANA_BURST_MAX_FRAMES", 60))
+
+# Local state (job queue, ...) lives under BANANA_DATA_DIR
+data_dir = os.environ.get("BANANA_DATA_DIR", os.path.join(current_dir, "data"))
+os.makedirs(data_dir, exist_ok=True)
+
+JOB_MODES = ("standard", "tiled", "leaves")
+
+def run_job(mode, params, payload):
+    """Run one queued prediction; called by the job workers."""
+    image = Image.open(io.BytesIO(payload))
+    if mode == "tiled":
+        return classifier.predict_tiled(image, max_tiles=max_tiles)
+    if mode == "leaves":
+        return classifier.predict_leaves(image, max_leaves=max_leaves)
+    return classifier.predict_with_rejection(image)
+
+def record_job(job, result):
+    """Add a finished job's predictions to the history, with the context captured when it was queued."""
+    context = job["params"].get("context", {})
+    if job["mode"] == "leaves":
+        for leaf in result["leaves"]:
+            record_prediction(leaf, "jobs", context)
+    else:
+        record_prediction(result, "jobs", context)
+
+# Durable queue for slow predictions; queued jobs survive restarts
+job_queue = JobQueue(
+    os.environ.get("BANANA_JOBS_DB", os.path.join(data_dir, "jobs.db")),
+    lease_seconds=float(os.environ.get("BANANA_JOB_LEASE_SECONDS", 120))
+)
+
+# Idempotency keys of scans already processed through /sync
+sync_store = ProcessedKeyStore(os.environ.get("BANANA_SYNC_DB", os.path.join(data_dir, "sync.db")))
+max_sync_items = int(os.environ.get("BANANA_SYNC_MAX_ITEMS", 200))
+# Upper bound on the size of one uploaded bundle, checked before it is read
+max_sync_bytes = int(os.environ.get("BANANA_SYNC_MAX_BYTES", 100 * 1024 * 1024))
+
+# Append-only prediction history, written in batches by a background thread
+history = HistoryStore(os.environ.get("BANANA_HISTORY_DB", os.path.join(data_dir, "history.db")))
+export_chunk_rows = int(os.environ.get("BANANA_EXPORT_CHUNK_ROWS", 5000))
+
+# Recent diseased detections by grid cell, rebuilt from history on startup
+outbreak_index = OutbreakIndex(
+    cell_size=float(os.environ.get("BANANA_OUTBREAK_CELL_DEG", 0.05)),
+    window_seconds=float(os.environ.get("BANANA_OUTBREAK_WINDOW_DAYS", 14)) * 86400
+)
+logger.info("Outbreak index loaded", extra={
+    "detections": outbreak_index.load(history.located_detections(time.time() - outbreak_index.window_seconds))
+})
+
+# Workers start after the history exists, since finished jobs are recorded there
+job_workers = JobWorkerPool(
+    job_queue, run_job, workers=int(os.environ.get("BANANA_JOB_WORKERS", 2)), on_complete=record_job
+) if classifier else None
+
+# Client timing events are folded into latency sketches; raw events are never stored
+telemetry = TelemetryAggregator(
+    os.environ.get("BANANA_TELEMETRY_DB", os.path.join(data_dir, "telemetry.db")),
+    flush_interval=float(os.environ.get("BANANA_TELEMETRY_FLUSH_SECONDS", 60))
+)
+telemetry_sample_rate = float(os.environ.get("BANANA_TELEMETRY_SAMPLE_RATE", 0.1))
+max_telemetry_events = int(os.environ.get("BANANA_TELEMETRY_MAX_EVENTS", 1000))
+
+# Spans for traced endpoints; slow requests always keep their full trace
+tracer = Tracer(
+    os.environ.get("BANANA_TRACE_FILE", os.path.join(data_dir, "traces.jsonl")),
+    slow_ms=float(os.environ.get("BANANA_TRACE_SLOW_MS", 1000)),
+    sample_rate=float(os.environ.get("BANANA_TRACE_SAMPLE_RATE", 0.01)),
+    max_upstream_per_second=float(os.environ.get("BANANA_TRACE_MAX_UPSTREAM_PER_SECOND", 10))
+)
+TRACED_ENDPOINTS = {"predict"}
+
+@app.before_request
+def start_trace():
+    if request.endpoint in TRACED_ENDPOINTS:
+        g.trace = tracer.start(
+            request.headers.get("traceparent"), f"{request.method} {request.path}",
+            mode=request.args.get("mode") or "standard"
+        )
+
+@app.after_request
+def propagate_trace(response):
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers["traceparent"] = trace.traceparent()
+        trace.root.set(status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        tracer.finish(trace, error=str(exc) if exc is not None else None)
+
+def record_prediction(result, source, context, created_at=None):
+    """Append a prediction to the history and, if it is a located disease detection, the outbreak index."""
+    row = history_row(result, source=source, created_at=created_at, **context)
+    history.record(row)
+    if row["latitude"] is not None and row["longitude"] is not None \
+            and not row["is_rejected"] and row["predicted_class"] != "healthy":
+        outbreak_index.add(row["latitude"], row["longitude"], row["predicted_class"],
+                           timestamp=row["created_at"], severity=row["severity"])
+
+def request_context():
+    """Device and optional capture location sent with a request."""
+    def number(name, limit):
+        value = request.form.get(name) or request.args.get(name)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return value if -limit <= value <= limit else None
+    
+    return {
+        "device_id": request.headers.get("X-Device-ID") or request.form.get("device_id"),
+        "latitude": number("latitude", 90),
+        "longitude": number("longitude", 180),
+        "region": request.form.get("region") or request.args.get("region")
+    }
+
+# Steps down to smaller input sizes when requests queue up or latency exceeds the SLO
+resolution_controller = ResolutionController(
+    sorted(classifier.resolution_models) if classifier else [160],
+    latency_slo_ms=float(os.environ.get("BANANA_LATENCY_SLO_MS", 500)),
+    max_in_flight=int(os.environ.get("BANANA_MAX_IN_FLIGHT", 4))
+)
+
 
 @app.route("/")
 def home():
@@ -223,9 +498,41 @@ def predict():
         type: file
         required: true
         description: Image file of a banana leaf (JPG, PNG, JPEG)
+      - name: mode
+        in: query
+        type: string
+        enum: [standard, tiled, leaves]
+        required: false
+        description: "tiled" classifies overlapping native-size tiles of the full-resolution photo, for small lesions; "leaves" finds each leaf in a field photo and returns per-leaf results with bounding boxes
+      - name: device_id
+        in: formData
+        type: string
+        required: false
+        description: Sending device, recorded in the server-side history (also accepted as the X-Device-ID header)
+      - name: latitude
+        in: formData
+        type: number
+        required: false
+      - name: longitude
+        in: formData
+        type: number
+        required: false
+      - name: region
+        in: formData
+        type: string
+        required: false
+      - name: traceparent
+        in: header
+        type: string
+        required: false
+        description: W3C trace context of the app session; the server's spans join this trace
     responses:
       200:
         description: Successful prediction
+        headers:
+          traceparent:
+            type: string
+            description: Trace context of the server span, for linking the app session to server-side work
         schema:
           type: object
           properties:
@@ -238,6 +545,58 @@ def predict():
             message:
               type: string
               example: Valid banana leaf detected
+            stage:
+              type: string
+              example: cascade
+              description: What produced the answer ("gate" if a pre-inference check rejected the image, "cascade" for the cheap first stage, "full" otherwise)
+            resolution:
+              type: integer
+              example: 160
+              description: Model input size used for this request (lower under heavy load)
+            tta:
+              type: object
+              description: Present when test-time augmentation ran for a borderline image (null otherwise)
+              properties:
+                views:
+                  type: integer
+                  example: 8
+                spread:
+                  type: number
+                  example: 0.041
+                  description: Standard deviation of the predicted class's probability across views
+                agreement:
+                  type: number
+                  example: 0.875
+                  description: Fraction of views that agree with the averaged prediction
+            prediction_id:
+              type: string
+              example: 3f2b9c0e5a7d4e1f8b6c2a9d0e4f7a1b
+              description: Pass to /explain for a Grad-CAM heatmap of this prediction
+            tiles:
+              type: object
+              description: Only with mode=tiled
+              properties:
+                grid:
+                  type: array
+                  items:
+                    type: integer
+                  example: [3, 4]
+                evaluated:
+                  type: integer
+                  example: 10
+                skipped:
+                  type: integer
+                  example: 2
+                  description: Tiles skipped for having too little green area
+                class_counts:
+                  type: object
+                heatmap:
+                  type: array
+                  description: Rows of per-tile lesion probability (1 - healthy), null for skipped tiles
+                  items:
+                    type: array
+                    items:
+                      type: number
             predicted_disease:
               type: string
               example: healthy
@@ -253,6 +612,21 @@ def predict():
             certainty_score:
               type: number
               example: 0.883
+            severity:
+              type: object
+              description: Share of the leaf area covered by lesions, estimated from color
+              properties:
+                score:
+                  type: number
+                  example: 0.1342
+                chlorotic:
+                  type: number
+                  example: 0.0415
+                  description: Yellowed fraction of the leaf
+                necrotic:
+                  type: number
+                  example: 0.0927
+                  description: Brown/black fraction of the leaf
             detailed_probabilities:
               type: object
               example:
@@ -313,19 +687,66 @@ def predict():
             "message": "Please select an image file to upload."
         }), 400
 
+    request_start = time.perf_counter()
     try:
         # Open and process the image
-        image = Image.open(file.stream)
+        with span("decode") as decode:
+            image = Image.open(file.stream)
+            image.load()
+            if decode is not None:
+                decode.set(width=image.size[0], height=image.size[1], format=image.format)
+        inference_start = time.perf_counter()
+        
+        # Several leaves in one photo: per-leaf results instead of a single diagnosis
+        if request.args.get("mode") == "leaves":
+            detection = classifier.predict_leaves(image, max_leaves=max_leaves)
+            telemetry.observe_server("inference", (time.perf_counter() - inference_start) * 1000)
+            context = request_context()
+            for leaf in detection["leaves"]:
+                record_prediction(leaf, "leaves", context)
+            with span("serialization"):
+                body = jsonify({
+                    "success": True,
+                    "mode": "leaves",
+                    "leaf_count": detection["count"],
+                    "diseases_found": detection["diseases_found"],
+                    "leaves": [{
+                        "bbox": leaf["bbox"],
+                        "area_fraction": leaf["area_fraction"],
+                        "is_rejected": bool(leaf["is_rejected"]),
+                        "predicted_disease": str(leaf["predicted_class"]),
+                        "confidence_score": float(leaf["confidence"]),
+                        "entropy": float(leaf["entropy"]),
+                        "severity": leaf.get("severity"),
+                        "rejection_reasons": [str(reason) for reason in leaf["rejection_reasons"]],
+                        "disease_info": DISEASE_INFO.get(leaf["predicted_class"]) if not leaf["is_rejected"] else None
+                    } for leaf in detection["leaves"]]
+                })
+            telemetry.observe_server("request", (time.perf_counter() - request_start) * 1000)
+            return body
         
         # Get enhanced prediction with rejection capability
-        result = classifier.predict_with_rejection(image)
+        if request.args.get("mode") == "tiled":
+            result = classifier.predict_tiled(image, max_tiles=max_tiles)
+        else:
+            # Only single-image inference feeds the resolution controller; tiled and
+            # multi-leaf requests cost several forward passes and would skew its latency
+            with resolution_controller.track() as resolution:
+                result = classifier.predict_with_rejection(image, resolution=resolution)
+        telemetry.observe_server("inference", (time.perf_counter() - inference_start) * 1000)
         
         # Build comprehensive response with explicit type conversion
         response = {
             "success": True,
             "is_rejected": bool(result["is_rejected"]),
-            "message": str(result["message"])
+            "message": str(result["message"]),
+            "stage": str(result["stage"]),
+            "resolution": result["resolution"],
+            "tta": result.get("tta"),
+            "prediction_id": result.get("prediction_id")
         }
+        if "tiles" in result:
+            response["tiles"] = result["tiles"]
         
         if result["is_rejected"]:
             # Image was rejected
@@ -336,7 +757,8 @@ def predict():
                     "entropy": float(result["entropy"]),
                     "is_leaf_like": bool(result["is_leaf_like"]),
                     "predicted_class": str(result["predicted_class"]),
-                    "all_probabilities": {str(k): float(v) for k, v in result["all_probabilities"].items()}
+                    "all_probabilities": {str(k): float(v) for k, v in result["all_probabilities"].items()},
+                    "gates": result.get("gates")
                 }
             })
         else:
@@ -352,47 +774,25 @@ def predict():
                     for disease, prob in result["all_probabilities"].items()
                 },
                 "raw_probabilities": {str(k): float(v) for k, v in result["all_probabilities"].items()},
-                "is_leaf_like": bool(result["is_leaf_like"])
+                "is_leaf_like": bool(result["is_leaf_like"]),
+                "severity": result.get("severity")
             })
             
             # Add disease-specific information
-            disease_info = {
-                "healthy": {
-                    "description": "The leaf appears healthy with no visible signs of disease.",
-                    "severity": "None",
-                    "recommendation": "Continue regular monitoring and good agricultural practices.",
-                    "urgent": False
-                },
-                "cordana": {
-                    "description": "Cordana leaf spot is a fungal disease causing dark spots on leaves.",
-                    "severity": "Moderate",
-                    "recommendation": "Apply fungicide and improve air circulation around plants.",
-                    "urgent": True
-                },
-                "pestalotiopsis": {
-                    "description": "Pestalotiopsis causes leaf spots and can lead to leaf blight.",
-                    "severity": "Moderate to High",
-                    "recommendation": "Remove affected leaves and apply appropriate fungicide treatment.",
-                    "urgent": True
-                },
-                "sigatoka": {
-                    "description": "Sigatoka is a serious fungal disease causing yellowing and black streaks.",
-                    "severity": "High",
-                    "recommendation": "Immediate fungicide treatment and removal of affected leaves required.",
-                    "urgent": True
-                }
-            }
-            
             predicted_disease = result["predicted_class"]
-            if predicted_disease in disease_info:
-                response["disease_info"] = disease_info[predicted_disease]
+            if predicted_disease in DISEASE_INFO:
+                response["disease_info"] = DISEASE_INFO[predicted_disease]
         
-        return jsonify(response)
+        record_prediction(result, request.args.get("mode") or "predict", request_context())
+        with span("serialization"):
+            body = jsonify(response)
+        telemetry.observe_server("request", (time.perf_counter() - request_start) * 1000)
+        
+        return body
         
     except Exception as e:
         # Log the full error for debugging
-        print(f"Error processing image: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing image", extra={"mode": request.args.get("mode") or "standard"})
         
         return jsonify({
             "error": "Image processing failed",
@@ -416,6 +816,9 @@ def model_info():
             model_type:
               type: string
               example: Convolutional Neural Network
+            model_variant:
+              type: string
+              example: float32
             diseases:
               type: array
               items:
@@ -423,7 +826,7 @@ def model_info():
               example: ["cordana", "healthy", "pestalotiopsis", "sigatoka"]
             input_size:
               type: string
-              example: 224x224 pixels
+              example: 160x160 pixels
             features:
               type: array
               items:
@@ -437,6 +840,56 @@ def model_info():
                   type: number
                 feature_similarity:
                   type: number
+                min_green_ratio:
+                  type: number
+            cascade:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                min_confidence:
+                  type: number
+                max_entropy:
+                  type: number
+                stage_counts:
+                  type: object
+            tta:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                entropy_threshold:
+                  type: number
+                runs:
+                  type: integer
+            gates:
+              type: array
+              items:
+                type: string
+            adaptive_resolution:
+              type: object
+            micro_batching:
+              type: object
+            live_preview:
+              type: boolean
+              description: Whether the /ws/preview WebSocket is available
+            jobs:
+              type: object
+              description: Number of async jobs per status
+            history:
+              type: object
+              description: Rows written, queued and dropped by the history writer
+            outbreak_index:
+              type: object
+            telemetry:
+              type: object
+              description: Client telemetry events accepted and dropped, and the current window
+            tracing:
+              type: object
+              description: Traces kept (sampled or slow), discarded and spans written
+            log_records_dropped:
+              type: integer
+              description: Log records dropped because the log queue was full
             rejection_criteria:
               type: array
               items:
@@ -449,8 +902,9 @@ def model_info():
         
     return jsonify({
         "model_type": "Convolutional Neural Network",
+        "model_variant": model_variant or "float32",
         "diseases": classifier.diseases,
-        "input_size": "224x224 pixels",
+        "input_size": f"{classifier.input_size}x{classifier.input_size} pixels",
         "features": [
             "Disease classification",
             "Non-banana leaf rejection",
@@ -460,8 +914,30 @@ def model_info():
         "thresholds": {
             "min_confidence": classifier.min_confidence_threshold,
             "max_entropy": classifier.max_entropy_threshold,
-            "feature_similarity": classifier.feature_similarity_threshold
+            "feature_similarity": classifier.feature_similarity_threshold,
+            "min_green_ratio": classifier.min_green_ratio
+        },
+        "cascade": {
+            "enabled": classifier.cascade_model is not None,
+            "min_confidence": classifier.cascade_min_confidence,
+            "max_entropy": classifier.cascade_max_entropy,
+            "stage_counts": classifier.stage_counts
         },
+        "tta": {
+            "enabled": classifier.tta_entropy_threshold is not None,
+            "entropy_threshold": classifier.tta_entropy_threshold,
+            "runs": classifier.tta_count
+        },
+        "gates": [gate.name for gate in classifier.gates.gates] if classifier.gates else [],
+        "adaptive_resolution": resolution_controller.status(),
+        "micro_batching": batcher.status(),
+        "live_preview": sock is not None,
+        "jobs": job_queue.counts(),
+        "history": history.status(),
+        "outbreak_index": outbreak_index.status(),
+        "telemetry": telemetry.status(),
+        "tracing": tracer.status(),
+        "log_records_dropped": log_handler.dropped,
         "rejection_criteria": [
             "Low prediction confidence",
             "High uncertainty (entropy)",
@@ -469,6 +945,981 @@ def model_info():
         ]
     })
 
+@app.route("/predict/burst", methods=["POST"])
+def predict_burst():
+    """
+    Diagnose from a short video or a burst of frames
+    ---
+    tags:
+      - Prediction
+    consumes:
+      - multipart/form-data
+    parameters:
+      - name: video
+        in: formData
+        type: file
+        required: false
+        description: Short video of a camera sweep (MP4, MOV, AVI)
+      - name: files
+        in: formData
+        type: file
+        required: false
+        description: Burst of still frames, in capture order (instead of video)
+      - name: sample_fps
+        in: formData
+        type: number
+        required: false
+        default: 2
+        description: Video frames sampled per second (0-60]
+      - name: confidence_target
+        in: formData
+        type: number
+        required: false
+        default: 0.9
+        description: Stop decoding once the aggregated diagnosis reaches this confidence (0-1)
+    responses:
+      200:
+        description: Temporally aggregated diagnosis
+        schema:
+          type: object
+          properties:
+            predicted_disease:
+              type: string
+              example: sigatoka
+            confidence_score:
+              type: number
+              example: 0.93
+            agreement:
+              type: number
+              example: 0.8
+            rejection_reasons:
+              type: array
+              items:
+                type: string
+            frames:
+              type: object
+              description: sampled, duplicates_skipped, classified, rejected, accepted, stopped_early
+            timeline:
+              type: array
+              items:
+                type: object
+      400:
+        description: No video or frames provided
+    """
+    if classifier is None:
+        return jsonify({
+            "error": "Model not loaded",
+            "message": "The classification model failed to load. Please check server logs."
+        }), 500
+    
+    video = request.files.get("video")
+    files = [f for f in request.files.getlist("files") if f.filename]
+    if (video is None or video.filename == "") and not files:
+        return jsonify({
+            "error": "No video or frames provided",
+            "message": "Upload a 'video' file or one or more 'files' frames."
+        }), 400
+    
+    try:
+        sample_fps = float(request.form.get("sample_fps", 2))
+        confidence_target = float(request.form.get("confidence_target", 0.9))
+    except ValueError:
+        return jsonify({"error": "Invalid parameters", "message": "sample_fps and confidence_target must be numbers."}), 400
+    # NaN fails both comparisons, so it is rejected here too
+    if not 0 < sample_fps <= 60 or not 0 <= confidence_target <= 1:
+        return jsonify({
+            "error": "Invalid parameters",
+            "message": "sample_fps must be in (0, 60] and confidence_target in [0, 1]."
+        }), 400
+    
+    video_path = None
+    try:
+        if files:
+            frames = iter_burst_frames((f.stream for f in files), max_frames=max_burst_frames)
+        else:
+            # OpenCV decodes from a path, so the upload is spooled to a temporary file
+            suffix = os.path.splitext(video.filename)[1] or ".mp4"
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                video.save(tmp)
+                video_path = tmp.name
+            frames = iter_video_frames(video_path, sample_fps=sample_fps, max_frames=max_burst_frames)
+        
+        result = classify_frames(classifier, frames, confidence_target=confidence_target)
+        record_prediction(result, "burst", request_context())
+        
+        response = {
+            "success": True,
+            "is_rejected": result["is_rejected"],
+            "rejection_reasons": result["rejection_reasons"],
+            "message": result["message"],
+            "predicted_disease": result["predicted_class"],
+            "confidence_score": result["confidence"],
+            "detailed_probabilities": result["all_probabilities"],
+            "agreement": result.get("agreement"),
+            "frames": result["frames"],
+            "timeline": result["timeline"]
+        }
+        if not result["is_rejected"]:
+            response["disease_info"] = DISEASE_INFO.get(result["predicted_class"])
+        return jsonify(response)
+    
+    except Exception as e:
+        logger.exception("Error processing burst")
+        return jsonify({
+            "error": "Processing failed",
+            "message": f"Failed to process video or frames: {str(e)}"
+        }), 500
+    finally:
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
+
+def live_preview(ws):
+    """
+    Live camera preview over WebSocket (/ws/preview).
+    
+    The client sends small JPEG/PNG frames as binary messages and receives a
+    JSON hint per processed frame: {"seq", "hint" (healthy, diseased, uncertain
+    or not_a_leaf), "predicted_class", "confidence", "latency_ms", "dropped"}.
+    Frames that arrive while an earlier one is still being classified replace
+    it, so the client always gets a hint for its most recent view. At most
+    BANANA_LIVE_MAX_SESSIONS sessions are open at once; beyond that the client
+    gets an error message and the socket is closed.
+    """
+    if classifier is None:
+        ws.send(json.dumps({"error": "Model not loaded"}))
+        return
+    if not live_slots.acquire(blocking=False):
+        ws.send(json.dumps({"error": "Too many live sessions", "max_sessions": max_live_sessions}))
+        return
+    
+    session = LiveSession(ws.send, classifier)
+    try:
+        while True:
+            data = ws.receive()
+            if data is None:
+                break
+            if isinstance(data, bytes):
+                session.push(data)
+    finally:
+        session.close()
+        live_slots.release()
+
+if sock is not None:
+    sock.route("/ws/preview")(live_preview)
+
+@app.route("/sync", methods=["POST"])
+def sync_offline_scans():
+    """
+    Classify a bundle of scans queued while the device was offline
+    ---
+    tags:
+      - Prediction
+    consumes:
+      - multipart/form-data
+      - application/zip
+    parameters:
+      - name: bundle
+        in: formData
+        type: file
+        required: true
+        description: Zip of images plus manifest.json [{"key", "file", ...}]; without a manifest the file name is the key
+      - name: device_id
+        in: formData
+        type: string
+        required: false
+        description: Sending device (also accepted as the X-Device-ID header)
+    responses:
+      200:
+        description: One result per key, in bundle order; keys processed before are returned from storage
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            processed:
+              type: integer
+              description: Images classified in this request
+            duplicates:
+              type: integer
+              description: Keys answered from earlier results
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  key:
+                    type: string
+                  duplicate:
+                    type: boolean
+                  result:
+                    type: object
+                  error:
+                    type: string
+      400:
+        description: Missing or malformed bundle, or too many images or bytes once unpacked
+      413:
+        description: Bundle larger than BANANA_SYNC_MAX_BYTES
+    """
+    if classifier is None:
+        return jsonify({
+            "error": "Model not loaded",
+            "message": "The classification model failed to load. Please check server logs."
+        }), 500
+    
+    # Refuse oversized uploads before anything is read or parsed
+    if request.content_length is not None and request.content_length > max_sync_bytes:
+        return jsonify({
+            "error": "Bundle too large",
+            "message": f"Bundles are limited to {max_sync_bytes // (1024 * 1024)} MB; split the queued scans."
+        }), 413
+    
+    # The bundle may come as a multipart file or as the raw request body
+    bundle = request.files.get("bundle")
+    stream = bundle.stream if bundle is not None else (request.stream if request.content_length else None)
+    if stream is None:
+        return jsonify({"error": "No bundle provided", "message": "Upload a zip bundle of queued scans."}), 400
+    
+    device_id = request.headers.get("X-Device-ID") or request.form.get("device_id")
+    try:
+        items = read_bundle(stream, max_items=max_sync_items, max_upload_bytes=max_sync_bytes)
+        results = process_bundle(classifier, sync_store, items, device_id=device_id)
+    except BundleTooLarge as e:
+        return jsonify({"error": "Bundle too large", "message": str(e)}), 413
+    except BundleError as e:
+        return jsonify({"error": "Invalid bundle", "message": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error processing sync bundle")
+        return jsonify({"error": "Processing failed", "message": f"Failed to process bundle: {str(e)}"}), 500
+    
+    # Only newly processed scans go to history; the capture time comes from the manifest
+    context = request_context()
+    captured = {item["key"]: item["meta"].get("timestamp") for item in items}
+    for r in results:
+        if not r["duplicate"] and "result" in r:
+            try:
+                created_at = parse_time(captured.get(r["key"]))
+            except ValueError:
+                created_at = None
+            record_prediction(r["result"], "sync", context, created_at=created_at)
+    
+    duplicates = sum(1 for r in results if r["duplicate"])
+    return jsonify({
+        "success": True,
+        "processed": sum(1 for r in results if not r["duplicate"] and "result" in r),
+        "duplicates": duplicates,
+        "results": results
+    })
+
+@app.route("/history", methods=["GET"])
+def prediction_history():
+    """
+    Server-side prediction history, newest first
+    ---
+    tags:
+      - History
+    parameters:
+      - name: device_id
+        in: query
+        type: string
+        required: false
+      - name: class
+        in: query
+        type: string
+        required: false
+        description: Only this predicted class
+      - name: region
+        in: query
+        type: string
+        required: false
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 lower bound
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 upper bound (exclusive)
+      - name: include_rejected
+        in: query
+        type: boolean
+        required: false
+        default: false
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 50
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+    responses:
+      200:
+        description: One page of history
+        schema:
+          type: object
+          properties:
+            items:
+              type: array
+              items:
+                type: object
+            next_cursor:
+              type: string
+              description: Pass as cursor to get the next page; null on the last page
+      400:
+        description: Invalid filter
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            int(cursor)
+        items, next_cursor = history.query(
+            device_id=request.args.get("device_id"),
+            predicted_class=request.args.get("class"),
+            region=request.args.get("region"),
+            since=parse_time(request.args.get("since")),
+            until=parse_time(request.args.get("until")),
+            include_rejected=request.args.get("include_rejected", "false").lower() == "true",
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+@app.route("/stats", methods=["GET"])
+def prediction_stats():
+    """
+    Prediction statistics for dashboards, read from pre-aggregated rollups
+    ---
+    tags:
+      - History
+    parameters:
+      - name: granularity
+        in: query
+        type: string
+        enum: [hour, day]
+        required: false
+        default: day
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 lower bound
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 upper bound (exclusive)
+      - name: region
+        in: query
+        type: string
+        required: false
+    responses:
+      200:
+        description: Counts by class, region and time bucket, and rejections by reason
+        schema:
+          type: object
+          properties:
+            granularity:
+              type: string
+            totals:
+              type: object
+              example: {"predictions": 1200, "accepted": 1010, "rejected": 190}
+            by_class:
+              type: object
+              example: {"healthy": 640, "sigatoka": 250, "cordana": 80, "pestalotiopsis": 40}
+            by_region:
+              type: object
+            series:
+              type: array
+              items:
+                type: object
+                properties:
+                  bucket:
+                    type: integer
+                    description: Unix time at the start of the hour or day (UTC)
+                  counts:
+                    type: object
+            rejections_by_reason:
+              type: object
+              example: {"Low confidence": 120, "Image doesn't appear to be a leaf": 70}
+      400:
+        description: Invalid parameters
+    """
+    try:
+        stats = history.statistics(
+            granularity=request.args.get("granularity", "day"),
+            since=parse_time(request.args.get("since")),
+            until=parse_time(request.args.get("until")),
+            region=request.args.get("region")
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    return jsonify(stats)
+
+@app.route("/export", methods=["GET"])
+def export_history():
+    """
+    Stream the prediction history as CSV or Parquet, oldest first
+    ---
+    tags:
+      - History
+    produces:
+      - text/csv
+      - application/vnd.apache.parquet
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [csv, parquet]
+        required: false
+        default: csv
+      - name: class
+        in: query
+        type: string
+        required: false
+        description: Only this predicted class
+      - name: region
+        in: query
+        type: string
+        required: false
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 lower bound
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601 upper bound (exclusive)
+      - name: include_rejected
+        in: query
+        type: boolean
+        required: false
+        default: false
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: id of the last row of an interrupted export; the export resumes after it
+    responses:
+      200:
+        description: Export file, streamed in chunks; every row includes its history id
+      400:
+        description: Invalid filter or format
+      501:
+        description: Parquet requested but pyarrow is not installed
+    """
+    output_format = request.args.get("format", "csv")
+    try:
+        cursor = request.args.get("cursor")
+        stream = export_stream(
+            history, output_format, chunk_size=export_chunk_rows,
+            predicted_class=request.args.get("class"),
+            region=request.args.get("region"),
+            since=parse_time(request.args.get("since")),
+            until=parse_time(request.args.get("until")),
+            include_rejected=request.args.get("include_rejected", "false").lower() == "true",
+            after_id=int(cursor) if cursor is not None else None
+        )
+    except ImportError as e:
+        return jsonify({"error": "Export format unavailable", "message": str(e)}), 501
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+
+    filename = f"predictions-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}.{output_format}"
+    return Response(stream, mimetype=EXPORT_FORMATS[output_format],
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@app.route("/outbreaks", methods=["GET"])
+def outbreaks():
+    """
+    Disease heatmap cells and outbreak clusters in a bounding box
+    ---
+    tags:
+      - History
+    parameters:
+      - name: bbox
+        in: query
+        type: string
+        required: true
+        description: min_lon,min_lat,max_lon,max_lat
+        example: "29.9,-2.1,30.2,-1.8"
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601; defaults to the start of the retention window
+      - name: min_cluster_size
+        in: query
+        type: integer
+        required: false
+        default: 3
+    responses:
+      200:
+        description: Heatmap cells (detections per disease) and Sigatoka/Cordana clusters
+        schema:
+          type: object
+          properties:
+            cell_size:
+              type: number
+              description: Grid cell size in degrees
+            cells:
+              type: array
+              items:
+                type: object
+                properties:
+                  latitude:
+                    type: number
+                  longitude:
+                    type: number
+                  count:
+                    type: integer
+                  counts:
+                    type: object
+            clusters:
+              type: array
+              items:
+                type: object
+                properties:
+                  disease:
+                    type: string
+                  count:
+                    type: integer
+                  latitude:
+                    type: number
+                  longitude:
+                    type: number
+                  bbox:
+                    type: array
+                    items:
+                      type: number
+                  mean_severity:
+                    type: number
+                  latest:
+                    type: number
+      400:
+        description: Missing or invalid bounding box
+    """
+    try:
+        bbox = [float(v) for v in request.args.get("bbox", "").split(",")]
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        result = outbreak_index.query(
+            bbox,
+            since=parse_time(request.args.get("since")),
+            min_cluster_size=int(request.args.get("min_cluster_size", 3))
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    return jsonify(result)
+
+@app.route("/telemetry", methods=["POST"])
+def ingest_telemetry():
+    """
+    Submit a batch of sampled client timing events
+    ---
+    tags:
+      - Telemetry
+    consumes:
+      - application/json
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            app_version:
+              type: string
+              example: "1.4.0"
+            network_type:
+              type: string
+              enum: [wifi, cellular, 2g, 3g, 4g, 5g, ethernet, offline, unknown]
+            sample_rate:
+              type: number
+              description: Fraction of events the client kept (0-1]
+              example: 0.1
+            events:
+              type: array
+              items:
+                type: object
+                properties:
+                  metric:
+                    type: string
+                    enum: [end_to_end, upload, image_prep, server_response, render]
+                  value_ms:
+                    type: number
+    responses:
+      202:
+        description: Events folded into the current window
+        schema:
+          type: object
+          properties:
+            accepted:
+              type: integer
+            dropped:
+              type: integer
+              description: Events with an unknown metric or invalid value
+            sample_rate:
+              type: number
+              description: Sample rate the server asks clients to use
+      400:
+        description: Body is not a JSON batch of events, or has too many events
+    """
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict) or not isinstance(batch.get("events"), list):
+        return jsonify({"error": "Invalid batch", "message": "Send a JSON object with an events list."}), 400
+    if len(batch["events"]) > max_telemetry_events:
+        return jsonify({
+            "error": "Too many events",
+            "message": f"At most {max_telemetry_events} events per batch."
+        }), 400
+
+    try:
+        sample_rate = float(batch.get("sample_rate", 1.0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid batch", "message": "sample_rate must be a number."}), 400
+
+    accepted, dropped = telemetry.ingest(
+        batch["events"],
+        app_version=batch.get("app_version"),
+        network_type=batch.get("network_type"),
+        sample_rate=sample_rate
+    )
+    return jsonify({"accepted": accepted, "dropped": dropped, "sample_rate": telemetry_sample_rate}), 202
+
+@app.route("/telemetry", methods=["GET"])
+def telemetry_report():
+    """
+    Client latency percentiles by app version and network type, with server stage timings
+    ---
+    tags:
+      - Telemetry
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601; defaults to the last 24 hours
+      - name: until
+        in: query
+        type: string
+        required: false
+        description: Unix time or ISO 8601; only windows that started before it
+      - name: app_version
+        in: query
+        type: string
+        required: false
+      - name: network_type
+        in: query
+        type: string
+        required: false
+    responses:
+      200:
+        description: Latency summaries (count, mean and p50/p90/p99 in ms)
+        schema:
+          type: object
+          properties:
+            since:
+              type: number
+            until:
+              type: number
+            clients:
+              type: array
+              items:
+                type: object
+                properties:
+                  app_version:
+                    type: string
+                  network_type:
+                    type: string
+                  metrics:
+                    type: object
+                  outside_server_p50_ms:
+                    type: number
+                    description: Median end-to-end time minus median server request time
+            server:
+              type: object
+              description: Summaries for the request and inference stages of /predict
+      400:
+        description: Invalid since or until
+    """
+    try:
+        since = parse_time(request.args.get("since"))
+        until = parse_time(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    return jsonify(telemetry.report(
+        since=since,
+        until=until,
+        app_version=request.args.get("app_version"),
+        network_type=request.args.get("network_type")
+    ))
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Queue a prediction and return at once
+    ---
+    tags:
+      - Jobs
+    consumes:
+      - multipart/form-data
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: true
+        description: Image file of a banana leaf (JPG, PNG, JPEG)
+      - name: mode
+        in: formData
+        type: string
+        enum: [standard, tiled, leaves]
+        required: false
+        default: standard
+    responses:
+      202:
+        description: Job accepted
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status:
+              type: string
+              example: queued
+            status_url:
+              type: string
+              example: /jobs/3f2b9c0e5a7d4e1f8b6c2a9d0e4f7a1b
+      400:
+        description: No file or unknown mode
+    """
+    if job_workers is None:
+        return jsonify({
+            "error": "Model not loaded",
+            "message": "The classification model failed to load. Please check server logs."
+        }), 500
+    
+    file = request.files.get("file")
+    if file is None or file.filename == "":
+        return jsonify({"error": "No file provided", "message": "Please include an image file in your request."}), 400
+    
+    mode = request.form.get("mode") or request.args.get("mode") or "standard"
+    if mode not in JOB_MODES:
+        return jsonify({"error": "Invalid mode", "message": f"mode must be one of {', '.join(JOB_MODES)}."}), 400
+    
+    # The worker has no request, so device and location are stored with the job for the history
+    job_id = job_queue.enqueue(file.read(), mode=mode, params={"context": request_context()})
+    job_workers.notify()
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Job status and result
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+      - name: wait
+        in: query
+        type: number
+        required: false
+        description: Long-poll for up to this many seconds (max 60) until the job finishes
+    responses:
+      200:
+        description: Current job state; result holds the prediction once status is done
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status:
+              type: string
+              enum: [queued, running, done, failed]
+            mode:
+              type: string
+            result:
+              type: object
+            error:
+              type: string
+            attempts:
+              type: integer
+      404:
+        description: Unknown job ID
+    """
+    try:
+        wait = min(float(request.args.get("wait", 0)), 60.0)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters", "message": "wait must be a number."}), 400
+    
+    job = job_queue.wait(job_id, timeout=wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-sent events with the job status until it finishes
+    ---
+    tags:
+      - Jobs
+    produces:
+      - text/event-stream
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: A "status" event on every change; the last one carries the result
+      404:
+        description: Unknown job ID
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def stream():
+        current, last_status = job, None
+        deadline = time.monotonic() + 300
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield f"event: status\ndata: {json.dumps(current)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if current["status"] in ("done", "failed") or time.monotonic() >= deadline:
+                return
+            # Wakes on any status change (claim, requeue, finish), not only on completion
+            current = job_queue.wait(job_id, timeout=15, changed_from=last_status)
+    
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route("/explain/<prediction_id>", methods=["GET"])
+def explain_one(prediction_id):
+    """
+    Grad-CAM heatmap for an earlier prediction
+    ---
+    tags:
+      - Prediction
+    parameters:
+      - name: prediction_id
+        in: path
+        type: string
+        required: true
+        description: prediction_id returned by /predict
+      - name: class
+        in: query
+        type: string
+        required: false
+        description: Class to explain (defaults to the predicted class)
+    responses:
+      200:
+        description: Heatmap overlaid on the model input, as base64 PNG
+        schema:
+          type: object
+          properties:
+            prediction_id:
+              type: string
+            class:
+              type: string
+            heatmap_png:
+              type: string
+            cached:
+              type: boolean
+      404:
+        description: Unknown or expired prediction ID
+      501:
+        description: The served model is a TFLite variant, which cannot be explained
+    """
+    if explainer is None:
+        return jsonify({"error": "Model not loaded"}), 500
+    
+    try:
+        result = explainer.explain([prediction_id], class_name=request.args.get("class"))[0]
+    except UnsupportedModelError as e:
+        return jsonify({"error": "Not supported by this model", "message": str(e)}), 501
+    except ValueError as e:
+        return jsonify({"error": "Invalid request", "message": str(e)}), 400
+    
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
+@app.route("/explain", methods=["POST"])
+def explain_batch():
+    """
+    Grad-CAM heatmaps for several earlier predictions in one call
+    ---
+    tags:
+      - Prediction
+    consumes:
+      - application/json
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            prediction_ids:
+              type: array
+              items:
+                type: string
+            class:
+              type: string
+              description: Class to explain for every ID (defaults to each predicted class)
+    responses:
+      200:
+        description: One entry per ID; unknown or expired IDs carry an "error"
+        schema:
+          type: object
+          properties:
+            explanations:
+              type: array
+              items:
+                type: object
+      400:
+        description: Missing or too many prediction IDs
+      501:
+        description: The served model is a TFLite variant, which cannot be explained
+    """
+    if explainer is None:
+        return jsonify({"error": "Model not loaded"}), 500
+    
+    body = request.get_json(silent=True) or {}
+    prediction_ids = body.get("prediction_ids")
+    if not isinstance(prediction_ids, list) or not prediction_ids:
+        return jsonify({"error": "No prediction IDs", "message": "Provide a non-empty prediction_ids list."}), 400
+    if len(prediction_ids) > max_explain_batch:
+        return jsonify({
+            "error": "Too many prediction IDs",
+            "message": f"At most {max_explain_batch} IDs per request."
+        }), 400
+    
+    try:
+        explanations = explainer.explain([str(p) for p in prediction_ids], class_name=body.get("class"))
+    except UnsupportedModelError as e:
+        return jsonify({"error": "Not supported by this model", "message": str(e)}), 501
+    except ValueError as e:
+        return jsonify({"error": "Invalid request", "message": str(e)}), 400
+    return jsonify({"explanations": explanations})
+
 @app.route("/test-rejection", methods=["GET"])
 def test_rejection():
     """
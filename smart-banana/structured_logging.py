@@ -0,0 +1,183 @@
+"""
+Structured Logging
+Asynchronous JSON logging for the server and the classifier.
+
+Log calls only put a record on an in-memory queue; a background thread
+formats each record as one JSON line and writes it to stdout, so a slow or
+blocked stdout never holds up a request. When the queue is full, records are
+dropped and counted rather than waited on.
+
+Every line carries the ID of the request it was logged in (from the
+X-Request-ID header or generated) and the trace ID when the request is
+traced. Repeats of the same warning or error are rate limited per message:
+after the first few in a window they are counted, and the next line that
+gets through reports how many were suppressed.
+
+Usage:
+    configure_logging(level="INFO")
+    logger = logging.getLogger(__name__)
+    logger.info("Loaded model", extra={"path": model_path})
+    logger.exception("Image processing failed")
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from tracing import current_trace_id
+
+# ID of the request being handled; None outside a request
+request_id_var = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied extra fields
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "trace_id",
+}
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the request and trace ID while still on the logging thread."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.trace_id = current_trace_id()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, max_per_window=5, window_seconds=60.0, min_level=logging.WARNING):
+        """
+        Args:
+            max_per_window: Records per message let through in each window
+            window_seconds: Length of a rate-limit window
+            min_level: Records below this level are never limited
+        """
+        super().__init__()
+        self.max_per_window = max_per_window
+        self.window_seconds = window_seconds
+        self.min_level = min_level
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        # Keyed on the unformatted message, so "Job %s failed" is one message for every job
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.window_seconds:
+                suppressed = window[2] if window is not None else 0
+                if len(self._windows) >= 1000:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.max_per_window:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any extra fields passed to the log call."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for name, value in vars(record).items():
+            if name not in STANDARD_ATTRIBUTES and name not in entry:
+                entry[name] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback here, while the arguments and frames are still
+        # valid; the JSON encoding itself happens on the writer thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level="INFO", stream=None, max_queue=10000, rate_limit=5, rate_window=60.0):
+    """
+    Route the root logger through a queue to a background JSON writer. Safe to call more than once.
+
+    Args:
+        level: Root log level name or number
+        stream: Where lines are written (default: stdout)
+        max_queue: Records held before new ones are dropped
+        rate_limit: Repeats of one warning/error message let through per window
+        rate_window: Rate-limit window in seconds
+
+    Returns:
+        The NonBlockingQueueHandler (its dropped count is useful for status pages)
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return handler
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(max_per_window=rate_limit, window_seconds=rate_window))
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root.handlers = [handler]
+    return handler
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,308 @@
+"""
+Bulk Sync for Offline Scans
+Processes a compressed bundle of scans queued on a device while it was offline.
+
+The bundle is a zip archive of images plus a manifest.json listing each
+image with a client-generated idempotency key:
+
+    [{"key": "1718000000000abc", "file": "scan1.jpg", "timestamp": "..."}]
+
+Without a manifest, each image's file name (minus extension) is its key.
+Keys are scoped to the sending device, so two phones that both upload an
+IMG_0001 get their own results. Keys that were already processed return
+their stored result without any inference. New keys are reserved with
+INSERT OR IGNORE before inference, so when the same bundle is uploaded twice
+at once only one request classifies (and records) each key; the other waits
+briefly for that result. The reserved images are classified together in one
+batched pass.
+
+Usage:
+    store = ProcessedKeyStore("data/sync.db")
+    items = read_bundle(request.files["bundle"].stream)
+    results = process_bundle(classifier, store, items, device_id="phone-1")
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+from jobs import json_default
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_keys (
+    device_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (device_id, key)
+) WITHOUT ROWID;
+"""
+
+
+class BundleError(ValueError):
+    """Raised when a sync bundle is malformed or over the limits."""
+
+
+class BundleTooLarge(BundleError):
+    """Raised when the uploaded bundle itself is over the size limit."""
+
+
+def read_bundle(stream, max_items=200, max_bytes=100 * 1024 * 1024, max_upload_bytes=100 * 1024 * 1024):
+    """
+    Read the images and keys from a sync bundle.
+
+    Args:
+        stream: File-like object with the zip archive
+        max_items: Maximum number of images in one bundle
+        max_bytes: Maximum total uncompressed size
+        max_upload_bytes: Maximum size of the archive itself; no more than
+            this is read into memory
+
+    Returns:
+        List of dictionaries with key, data (image bytes) and meta (manifest entry)
+
+    Raises:
+        BundleTooLarge: The archive is larger than max_upload_bytes
+        BundleError: The archive is malformed or over the other limits
+    """
+    data = stream.read(max_upload_bytes + 1)
+    if len(data) > max_upload_bytes:
+        raise BundleTooLarge(f"Bundle exceeds {max_upload_bytes // (1024 * 1024)} MB")
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise BundleError("Bundle is not a valid zip archive")
+
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in members) > max_bytes:
+            raise BundleError(f"Bundle exceeds {max_bytes // (1024 * 1024)} MB uncompressed")
+
+        names = {info.filename for info in members}
+        if "manifest.json" in names:
+            try:
+                entries = json.loads(archive.read("manifest.json"))
+            except (UnicodeDecodeError, ValueError) as e:
+                raise BundleError(f"manifest.json is not valid JSON: {e}")
+            if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+                raise BundleError("manifest.json must be a list of objects with a key and a file")
+        else:
+            entries = [
+                {"key": os.path.splitext(os.path.basename(name))[0], "file": name}
+                for name in sorted(names) if name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+
+        if len(entries) > max_items:
+            raise BundleError(f"Bundle has {len(entries)} images, the limit is {max_items}")
+
+        items = []
+        for entry in entries:
+            if not entry.get("key") or not isinstance(entry.get("file"), str) or entry["file"] not in names:
+                raise BundleError(f"Manifest entry {entry!r} needs a key and a file in the bundle")
+            items.append({"key": str(entry["key"]), "data": archive.read(entry["file"]), "meta": entry})
+        return items
+
+
+class ProcessedKeyStore:
+    """Results of already-processed idempotency keys per device, in SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        """Move results from the earlier table, whose keys were not scoped to a device."""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_results'").fetchone():
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT OR IGNORE INTO sync_keys (device_id, key, result, created_at) "
+                "SELECT COALESCE(device_id, ''), key, result, created_at FROM sync_results"
+            )
+            conn.execute("DROP TABLE sync_results")
+            conn.execute("COMMIT")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _rows(self, keys, device_id):
+        """(key, result JSON or None) for each of a device's keys that has a row."""
+        rows = []
+        keys = list(keys)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows += self._conn().execute(
+                f"SELECT key, result FROM sync_keys WHERE device_id = ? "
+                f"AND key IN ({','.join('?' * len(chunk))})", [device_id or ""] + chunk
+            ).fetchall()
+        return rows
+
+    def get_many(self, keys, device_id=None):
+        """Stored results for whichever of a device's keys were processed before."""
+        return {key: json.loads(result) for key, result in self._rows(keys, device_id) if result is not None}
+
+    def reserve(self, keys, device_id=None, stale_seconds=300.0):
+        """
+        Claim a device's unprocessed keys for this request before running inference.
+
+        A reservation is a row without a result. Reservations older than
+        stale_seconds (left by a request that died) can be taken over.
+
+        Returns:
+            Set of the keys this call reserved; the others are processed or held by another request
+        """
+        now = time.time()
+        reserved = set()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key in keys:
+                cursor = conn.execute(
+                    "INSERT INTO sync_keys (device_id, key, result, created_at) VALUES (?, ?, NULL, ?) "
+                    "ON CONFLICT (device_id, key) DO UPDATE SET created_at = excluded.created_at "
+                    "WHERE sync_keys.result IS NULL AND sync_keys.created_at < ?",
+                    (device_id or "", key, now, now - stale_seconds)
+                )
+                if cursor.rowcount == 1:
+                    reserved.add(key)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return reserved
+
+    def release(self, keys, device_id=None):
+        """Drop reservations that never got a result, so a retry can process those keys."""
+        keys = list(keys)
+        conn = self._conn()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            conn.execute(
+                f"DELETE FROM sync_keys WHERE device_id = ? AND result IS NULL "
+                f"AND key IN ({','.join('?' * len(chunk))})", [device_id or ""] + chunk
+            )
+
+    def put_many(self, results, device_id=None):
+        """Store a device's results by key; keys that already have a result keep it."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO sync_keys (device_id, key, result, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (device_id, key) DO UPDATE SET result = excluded.result, created_at = excluded.created_at "
+            "WHERE sync_keys.result IS NULL",
+            [(device_id or "", key, json.dumps(result, default=json_default), now) for key, result in results.items()]
+        )
+        conn.execute("COMMIT")
+
+    def wait_for(self, keys, device_id=None, timeout=10.0, interval=0.2):
+        """
+        Poll for results of keys another request is processing.
+
+        Stops waiting for a key once it has a result or its reservation is
+        released, and for all of them after timeout seconds.
+        """
+        pending = set(keys)
+        found = {}
+        deadline = time.monotonic() + timeout
+        while pending:
+            reserved = set()
+            for key, result in self._rows(pending, device_id):
+                if result is not None:
+                    found[key] = json.loads(result)
+                else:
+                    reserved.add(key)
+            pending = reserved
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        return found
+
+
+def process_bundle(classifier, store, items, device_id=None, batch_size=32, wait_timeout=10.0):
+    """
+    Classify the new images of a bundle in one batch and return every key's result.
+
+    Args:
+        classifier: A BananaLeafClassifier
+        store: ProcessedKeyStore holding earlier results
+        items: Output of read_bundle
+        device_id: Device the bundle came from, stored with the results
+        batch_size: Batch size for the forward pass
+        wait_timeout: Seconds to wait for keys another upload is processing
+
+    Returns:
+        List of {"key", "duplicate", "result"} (or "error") in bundle order. Only
+        entries with duplicate False and a result were classified by this call.
+    """
+    keys = [item["key"] for item in items]
+    previous = store.get_many(set(keys), device_id=device_id)
+
+    # One entry per new key, even if the bundle repeats it
+    new_items = {}
+    for item in items:
+        if item["key"] not in previous:
+            new_items.setdefault(item["key"], item)
+
+    reserved = store.reserve(new_items, device_id=device_id)
+
+    errors = {}
+    processed = {}
+    try:
+        arrays, sizes, array_keys = [], [], []
+        for key in reserved:
+            try:
+                image = Image.open(io.BytesIO(new_items[key]["data"]))
+                arrays.append(classifier.preprocess_image(image)[0])
+                sizes.append(image.size)
+                array_keys.append(key)
+            except Exception as e:
+                errors[key] = f"Could not decode image: {e}"
+
+        if arrays:
+            results = classifier.predict_batch(np.stack(arrays), batch_size=batch_size, original_sizes=sizes)
+            store.put_many(dict(zip(array_keys, results)), device_id=device_id)
+            processed = dict(zip(array_keys, results))
+    finally:
+        store.release([key for key in reserved if key not in processed], device_id=device_id)
+
+    # Keys reserved by a concurrent upload of the same scans: use its results once they land
+    elsewhere = [key for key in new_items if key not in reserved]
+    if elsewhere:
+        previous.update(store.wait_for(elsewhere, device_id=device_id, timeout=wait_timeout))
+
+    response = []
+    seen = set()
+    for key in keys:
+        # A key repeated within the bundle is classified once and reported as a duplicate after that
+        if key in previous or key in seen:
+            result = previous.get(key, processed.get(key))
+            if result is not None:
+                response.append({"key": key, "duplicate": True, "result": result})
+                continue
+        seen.add(key)
+        if key in processed:
+            response.append({"key": key, "duplicate": False, "result": processed[key]})
+        elif key in reserved:
+            response.append({"key": key, "duplicate": False, "error": errors.get(key, "Not processed")})
+        else:
+            response.append({"key": key, "duplicate": False,
+                             "error": "Still being processed by another upload; retry later"})
+    return response
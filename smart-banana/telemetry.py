@@ -0,0 +1,341 @@
+"""
+Client Performance Telemetry
+Aggregates timing events sent by the app into fixed-size latency sketches.
+
+The app samples its own timings (end-to-end, upload, image preparation, ...)
+and posts them in batches. Events are never stored: each one only adds to a
+sketch for its (app version, network type, metric). A sketch is a histogram
+over logarithmic buckets, so it has the same size however many events it
+holds, and any quantile read from it is within about 2% of the true value.
+Events carry the client's sample rate and are weighted by its inverse, so
+counts stay comparable across sample rates.
+
+The current window lives in memory. Every flush interval it is written to
+SQLite as one row per sketch and a new window starts; if the write fails,
+the window is merged back and retried with the next flush. Reports merge
+the stored windows with the current one. Server-side stage timings are
+sketched the same way, so client and server latencies can be read
+side by side.
+
+Usage:
+    telemetry = TelemetryAggregator("data/telemetry.db", flush_interval=60)
+    telemetry.ingest([{"metric": "end_to_end", "value_ms": 840}], app_version="1.4.0", network_type="4g")
+    telemetry.observe_server("inference", 95.0)
+    telemetry.report(since=time.time() - 3600)
+"""
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+# Client metrics accepted by ingest; anything else is dropped
+CLIENT_METRICS = ("end_to_end", "upload", "image_prep", "server_response", "render")
+NETWORK_TYPES = ("wifi", "cellular", "2g", "3g", "4g", "5g", "ethernet", "offline", "unknown")
+SERVER_KEY = ("server", "-")
+OTHER_VERSION = "other"
+QUANTILES = (0.5, 0.9, 0.99)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry_windows (
+    window_start REAL NOT NULL,
+    app_version TEXT NOT NULL,
+    network_type TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count REAL NOT NULL,
+    total REAL NOT NULL,
+    buckets TEXT NOT NULL,
+    PRIMARY KEY (window_start, app_version, network_type, metric)
+) WITHOUT ROWID;
+"""
+
+
+class LatencySketch:
+    """Weighted histogram over log-spaced buckets with a fixed number of buckets."""
+
+    def __init__(self, relative_accuracy=0.02, min_ms=0.1, max_ms=600000.0):
+        """
+        Args:
+            relative_accuracy: Quantile error bound relative to the value
+            min_ms: Values below this share the first bucket
+            max_ms: Values above this share the last bucket
+        """
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_ms = min_ms
+        self.size = int(math.ceil(math.log(max_ms / min_ms) / self._log_gamma)) + 1
+        self.buckets = [0.0] * self.size
+        self.count = 0.0
+        self.total = 0.0
+
+    def _index(self, value_ms):
+        if value_ms <= self.min_ms:
+            return 0
+        return min(int(math.ceil(math.log(value_ms / self.min_ms) / self._log_gamma)), self.size - 1)
+
+    def add(self, value_ms, weight=1.0):
+        self.buckets[self._index(value_ms)] += weight
+        self.count += weight
+        self.total += value_ms * weight
+
+    def merge(self, other):
+        for i, weight in enumerate(other.buckets):
+            self.buckets[i] += weight
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q):
+        """Estimated q-quantile in milliseconds, or None if empty."""
+        if self.count <= 0:
+            return None
+        rank = q * self.count
+        cumulative = 0.0
+        for i, weight in enumerate(self.buckets):
+            cumulative += weight
+            if cumulative >= rank and weight > 0:
+                if i == 0:
+                    return self.min_ms
+                # Midpoint of the bucket (min * gamma^(i-1), min * gamma^i]
+                return self.min_ms * self.gamma ** i * 2 / (self.gamma + 1)
+        return self.min_ms * self.gamma ** (self.size - 1)
+
+    def summary(self):
+        if self.count <= 0:
+            return {"count": 0}
+        result = {"count": int(round(self.count)), "mean_ms": round(self.total / self.count, 1)}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}_ms"] = round(self.quantile(q), 1)
+        return result
+
+    def to_json(self):
+        """Sparse bucket weights for storage."""
+        return json.dumps({i: weight for i, weight in enumerate(self.buckets) if weight})
+
+    def load_json(self, data, count, total):
+        for i, weight in json.loads(data).items():
+            self.buckets[int(i)] += weight
+        self.count += count
+        self.total += total
+
+
+class TelemetryAggregator:
+    def __init__(self, db_path, flush_interval=60.0, max_versions=50, retention_days=30):
+        """
+        Args:
+            db_path: SQLite database for flushed windows (created if missing)
+            flush_interval: Seconds per aggregation window
+            max_versions: Distinct app versions tracked per window; later ones are counted as "other"
+            retention_days: Flushed windows older than this are deleted
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_versions = max_versions
+        self.retention_seconds = retention_days * 86400
+        self.accepted = 0
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._versions = set()
+        self._window_start = time.time()
+        self._sketches = {}
+        self._conn().executescript(SCHEMA)
+
+        self._flusher = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+        self._flusher.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _sketch(self, app_version, network_type, metric):
+        """Sketch for a key in the current window; caller holds the lock."""
+        key = (app_version, network_type, metric)
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = LatencySketch()
+        return sketch
+
+    def _version(self, app_version):
+        """
+        Bound the number of distinct versions so memory stays fixed; caller holds the lock.
+        Called only for a batch with an accepted event, so junk batches cannot use up the slots.
+        """
+        app_version = str(app_version or "unknown")[:32]
+        if app_version in self._versions:
+            return app_version
+        if len(self._versions) < self.max_versions:
+            self._versions.add(app_version)
+            return app_version
+        return OTHER_VERSION
+
+    def ingest(self, events, app_version=None, network_type=None, sample_rate=1.0):
+        """
+        Add a batch of client timing events to the current window.
+
+        Args:
+            events: List of {"metric", "value_ms"} with an optional per-event
+                "network_type" and "sample_rate"
+            app_version: App version the batch came from
+            network_type: Default network type for the batch
+            sample_rate: Fraction of events the client kept (0-1]
+
+        Returns:
+            Tuple of (accepted, dropped) event counts
+        """
+        accepted = dropped = 0
+        version = None
+        with self._lock:
+            for event in events:
+                try:
+                    metric = event["metric"]
+                    value = float(event["value_ms"])
+                    rate = float(event.get("sample_rate", sample_rate))
+                    network = str(event.get("network_type", network_type) or "unknown").lower()
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    dropped += 1
+                    continue
+                if metric not in CLIENT_METRICS or not 0 < rate <= 1 or not 0 <= value < float("inf"):
+                    dropped += 1
+                    continue
+                if network not in NETWORK_TYPES:
+                    network = "unknown"
+                if version is None:
+                    version = self._version(app_version)
+                self._sketch(version, network, metric).add(value, weight=1.0 / rate)
+                accepted += 1
+            self.accepted += accepted
+            self.dropped += dropped
+        return accepted, dropped
+
+    def observe_server(self, stage, duration_ms):
+        """Add one server-side stage timing (e.g. "request", "inference")."""
+        with self._lock:
+            self._sketch(*SERVER_KEY, stage).add(duration_ms)
+
+    def _run(self):
+        while True:
+            time.sleep(max(0.0, self._window_start + self.flush_interval - time.time()))
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Failed to flush telemetry window", extra={"error": str(e)})
+                # The window was put back and is already due; wait before retrying
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """
+        Write the current window to SQLite and start a new one.
+
+        If the write fails, the window is merged with whatever arrived since and
+        kept as the current window under its original start, and the error is raised.
+        """
+        with self._lock:
+            window_start, sketches, versions = self._window_start, self._sketches, self._versions
+            self._window_start, self._sketches, self._versions = time.time(), {}, set()
+        if not sketches:
+            return
+
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO telemetry_windows "
+                "(window_start, app_version, network_type, metric, count, total, buckets) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(window_start,) + key + (sketch.count, sketch.total, sketch.to_json())
+                 for key, sketch in sketches.items()]
+            )
+            conn.execute("DELETE FROM telemetry_windows WHERE window_start < ?",
+                         (time.time() - self.retention_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self._lock:
+                for key, sketch in self._sketches.items():
+                    if key in sketches:
+                        sketches[key].merge(sketch)
+                    else:
+                        sketches[key] = sketch
+                self._window_start, self._sketches = window_start, sketches
+                self._versions |= versions
+            raise
+
+    def report(self, since=None, until=None, app_version=None, network_type=None):
+        """
+        Latency summaries by app version and network type, next to server stage timings.
+
+        Args:
+            since: Unix time; only windows that started after it (default: last 24 hours)
+            until: Unix time; only windows that started before it (default: no limit).
+                The open window is included only if it overlaps [since, until)
+            app_version, network_type: Optional filters for the client groups
+
+        Returns:
+            Dictionary with "clients" (one entry per version/network with a
+            summary per metric and the client-side share of end-to-end time)
+            and "server" (summary per stage)
+        """
+        since = since if since is not None else time.time() - 86400
+        merged = {}
+
+        def sketch_for(key):
+            if key not in merged:
+                merged[key] = LatencySketch()
+            return merged[key]
+
+        until = until if until is not None else float("inf")
+        rows = self._conn().execute(
+            "SELECT app_version, network_type, metric, count, total, buckets FROM telemetry_windows "
+            "WHERE window_start >= ? AND window_start < ?", (since, until)
+        ).fetchall()
+        for version, network, metric, count, total, buckets in rows:
+            sketch_for((version, network, metric)).load_json(buckets, count, total)
+        with self._lock:
+            # The open window runs from its start until now
+            if self._window_start < until and time.time() >= since:
+                for key, sketch in self._sketches.items():
+                    sketch_for(key).merge(sketch)
+
+        server = {key[2]: sketch.summary() for key, sketch in merged.items() if key[:2] == SERVER_KEY}
+        server_p50 = server.get("request", {}).get("p50_ms")
+
+        clients = {}
+        for (version, network, metric), sketch in sorted(merged.items()):
+            if (version, network) == SERVER_KEY:
+                continue
+            if app_version is not None and version != app_version:
+                continue
+            if network_type is not None and network != network_type:
+                continue
+            group = clients.setdefault((version, network), {
+                "app_version": version, "network_type": network, "metrics": {}
+            })
+            group["metrics"][metric] = sketch.summary()
+
+        for group in clients.values():
+            end_to_end = group["metrics"].get("end_to_end", {}).get("p50_ms")
+            # Median time spent outside the server: upload, download and on-device work
+            group["outside_server_p50_ms"] = (
+                round(max(0.0, end_to_end - server_p50), 1) if end_to_end is not None and server_p50 is not None else None
+            )
+
+        return {"since": since, "until": until if until != float("inf") else None,
+                "clients": list(clients.values()), "server": server}
+
+    def status(self):
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "sketches": len(self._sketches),
+                "window_start": self._window_start,
+                "flush_interval": self.flush_interval,
+            }
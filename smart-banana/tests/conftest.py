@@ -0,0 +1,5 @@
+"""Shared test setup: the server modules live one directory up."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
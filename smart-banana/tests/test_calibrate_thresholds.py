@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from calibrate_thresholds import choose_thresholds, sweep
+
+CONF_GRID = np.array([0.3, 0.5, 0.7, 0.9])
+ENT_GRID = np.array([0.4, 0.8, 1.2])
+GREEN_GRID = np.array([0.0, 0.2, 0.4])
+
+
+def make_cache(seed=0, n=300):
+    rng = np.random.default_rng(seed)
+    id_probs = rng.dirichlet([0.4] * 4, n)
+    # Labels agree with the argmax for most confident images, so accuracy varies across the grid
+    labels = np.where(id_probs.max(axis=1) > 0.6, id_probs.argmax(axis=1), rng.integers(0, 4, n))
+    return {
+        "id": {"probs": id_probs, "labels": labels, "green": rng.uniform(0.1, 0.9, n)},
+        "ood": {"probs": rng.dirichlet([1.5] * 4, n), "green": rng.uniform(0.0, 0.5, n)},
+    }
+
+
+def brute_force(cache):
+    """Per-combination rates computed with plain loops, as the classifier would decide."""
+    def signals(split):
+        probs = np.clip(split["probs"], 1e-10, 1.0)
+        return split["probs"].max(axis=1), -np.sum(probs * np.log(probs), axis=1), split["green"]
+
+    id_conf, id_ent, id_green = signals(cache["id"])
+    ood_conf, ood_ent, ood_green = signals(cache["ood"])
+    correct = cache["id"]["probs"].argmax(axis=1) == cache["id"]["labels"]
+    rows = []
+    for c in CONF_GRID:
+        for e in ENT_GRID:
+            for g in GREEN_GRID:
+                id_ok = (id_conf >= c) & (id_ent <= e) & (id_green > g)
+                ood_ok = (ood_conf >= c) & (ood_ent <= e) & (ood_green > g)
+                rows.append({
+                    "thresholds": (c, e, g),
+                    "id_accept": id_ok.mean(),
+                    "accuracy": correct[id_ok].mean() if id_ok.any() else 0.0,
+                    "ood_accept": ood_ok.mean(),
+                })
+    return rows
+
+
+def test_sweep_matches_brute_force():
+    cache = make_cache()
+    results = sweep(cache, CONF_GRID, ENT_GRID, GREEN_GRID)
+    for row, id_accept, accuracy, ood_accept in zip(
+        brute_force(cache), results["id_accept"].ravel(),
+        results["id_accepted_accuracy"].ravel(), results["ood_accept"].ravel()
+    ):
+        assert id_accept == pytest.approx(row["id_accept"], abs=1e-6)
+        assert accuracy == pytest.approx(row["accuracy"], abs=1e-6)
+        assert ood_accept == pytest.approx(row["ood_accept"], abs=1e-6)
+
+
+@pytest.mark.parametrize("max_ood_accept,min_accuracy", [(0.05, 0.0), (0.2, 0.0), (0.2, 0.6), (0.5, 0.8)])
+def test_choose_thresholds_is_argmax_over_constrained_grid(max_ood_accept, min_accuracy):
+    cache = make_cache()
+    results = sweep(cache, CONF_GRID, ENT_GRID, GREEN_GRID)
+    feasible = [
+        row for row in brute_force(cache)
+        if row["ood_accept"] <= max_ood_accept + 1e-6 and row["accuracy"] >= min_accuracy - 1e-6
+    ]
+    assert feasible, "test grid should have a feasible combination"
+
+    chosen = choose_thresholds(results, max_ood_accept, min_accuracy)
+
+    assert chosen["ood_accept"] <= max_ood_accept + 1e-6
+    assert chosen["id_accepted_accuracy"] >= min_accuracy - 1e-6
+    assert chosen["id_accept"] == pytest.approx(max(row["id_accept"] for row in feasible), abs=1e-6)
+
+
+def test_choose_thresholds_names_the_ood_budget():
+    results = sweep(make_cache(), CONF_GRID, ENT_GRID, GREEN_GRID)
+    with pytest.raises(ValueError, match="out-of-distribution"):
+        choose_thresholds(results, max_ood_accept=-0.01)
+
+
+def test_choose_thresholds_names_the_accuracy_floor():
+    results = sweep(make_cache(), CONF_GRID, ENT_GRID, GREEN_GRID)
+    with pytest.raises(ValueError, match="--min-accuracy"):
+        choose_thresholds(results, max_ood_accept=1.0, min_accuracy=1.01)
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from dataset_shards import DISEASES, build_shards, sample_source, stratified_sample
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Ten images of the first class, twenty of the second, ...; the red channel encodes the class."""
+    for label, disease in enumerate(DISEASES):
+        os.makedirs(tmp_path / "data" / disease)
+        for i in range(10 * (label + 1)):
+            Image.new("RGB", (24, 16), (label * 60, i, 0)).save(tmp_path / "data" / disease / f"{i:03d}.png")
+    return str(tmp_path / "data")
+
+
+def image_classes(images):
+    return np.bincount(images[:, 0, 0, 0] // 60, minlength=len(DISEASES))
+
+
+def test_stratified_sample_is_proportional_and_disjoint():
+    labels = np.repeat([0, 1, 2, 3], [400, 100, 300, 200])
+    calibration, evaluation = stratified_sample(labels, (100, 500), seed=1)
+
+    assert np.bincount(labels[calibration]).tolist() == [40, 10, 30, 20]
+    assert np.bincount(labels[evaluation]).tolist() == [200, 50, 150, 100]
+    assert not set(calibration) & set(evaluation)
+
+
+def test_stratified_sample_is_seeded():
+    labels = np.repeat([0, 1], 50)
+    first = stratified_sample(labels, (10,), seed=3)[0]
+    assert np.array_equal(first, stratified_sample(labels, (10,), seed=3)[0])
+    assert not np.array_equal(first, stratified_sample(labels, (10,), seed=4)[0])
+
+
+def test_stratified_sample_runs_out():
+    calibration, evaluation = stratified_sample(np.zeros(5), (4, 4))
+    assert len(calibration) == 4 and len(evaluation) == 1
+
+
+@pytest.mark.parametrize("from_shards", [False, True])
+def test_sample_source_covers_every_class(data_dir, tmp_path, from_shards):
+    source = data_dir
+    if from_shards:
+        source = str(tmp_path / "shards")
+        build_shards(data_dir, source, shard_size=40, workers=1)
+
+    calibration, evaluation = sample_source(source, (10, 20), workers=1)
+
+    assert calibration.shape == (10, 160, 160, 3) and calibration.dtype == np.uint8
+    assert image_classes(calibration).tolist() == [1, 2, 3, 4]
+    assert image_classes(evaluation).tolist() == [2, 4, 6, 8]
+
+
+def shard_files(shard_dir):
+    return sorted(name for name in os.listdir(shard_dir) if name.endswith(".npy"))
+
+
+def test_undecodable_files_are_recorded_and_not_repacked(data_dir, tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    with open(os.path.join(data_dir, "healthy", "broken.png"), "wb") as f:
+        f.write(b"not an image")
+
+    index = build_shards(data_dir, shard_dir, shard_size=200, workers=1)
+    assert [entry["path"] for entry in index["failed"]] == ["healthy/broken.png"]
+    assert sum(len(shard["files"]) for shard in index["shards"]) == 100
+    files = shard_files(shard_dir)
+
+    index = build_shards(data_dir, shard_dir, shard_size=200, workers=1)
+    assert shard_files(shard_dir) == files
+    assert len(index["shards"]) == 1 and len(index["failed"]) == 1
+
+    # A changed file is tried again
+    Image.new("RGB", (24, 16), (60, 0, 0)).save(os.path.join(data_dir, "healthy", "broken.png"), "PNG")
+    index = build_shards(data_dir, shard_dir, shard_size=200, workers=1)
+    assert index["failed"] == []
+    assert sum(len(shard["files"]) for shard in index["shards"]) == 101
+
+
+def test_no_shard_is_written_without_images(data_dir, tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    build_shards(data_dir, shard_dir, workers=1)
+    files = shard_files(shard_dir)
+    with open(os.path.join(data_dir, "sigatoka", "broken.png"), "wb") as f:
+        f.write(b"not an image")
+
+    index = build_shards(data_dir, shard_dir, workers=1)
+
+    assert shard_files(shard_dir) == files
+    assert all(shard["files"] for shard in index["shards"])
+    assert index["next_shard"] == 1
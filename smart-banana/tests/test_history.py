@@ -0,0 +1,66 @@
+import pytest
+
+from history import HistoryStore, history_row
+
+
+def prediction(predicted_class="sigatoka", is_rejected=False, confidence=0.9):
+    return {
+        "predicted_class": predicted_class,
+        "confidence": confidence,
+        "entropy": 0.3,
+        "is_rejected": is_rejected,
+        "rejection_reasons": ["Low confidence"] if is_rejected else [],
+        "severity": {"score": 0.2},
+    }
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.05)
+    for i in range(7):
+        store.record(history_row(prediction(), device_id="phone-1", created_at=1000.0 + i))
+    store.record(history_row(prediction(is_rejected=True), device_id="phone-1", created_at=2000.0))
+    store.record(history_row(prediction("healthy"), device_id="phone-2", created_at=3000.0))
+    store.flush()
+    return store
+
+
+def test_query_pages_newest_first_without_gaps_or_repeats(history):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = history.query(device_id="phone-1", limit=3, cursor=cursor)
+        pages.append([row["id"] for row in rows])
+        if cursor is None:
+            break
+
+    ids = [row_id for page in pages for row_id in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 7
+
+
+def test_cursor_is_stable_when_new_rows_arrive(history):
+    first, cursor = history.query(limit=2)
+    history.record(history_row(prediction(), device_id="phone-3", created_at=4000.0))
+    history.flush()
+
+    second, _ = history.query(limit=2, cursor=cursor)
+    assert max(row["id"] for row in second) < min(row["id"] for row in first)
+
+
+def test_rejected_rows_are_opt_in(history):
+    rows, _ = history.query(device_id="phone-1", limit=50)
+    assert len(rows) == 7 and not any(row["is_rejected"] for row in rows)
+
+    rows, _ = history.query(device_id="phone-1", limit=50, include_rejected=True)
+    assert len(rows) == 8
+
+
+def test_iter_chunks_resumes_after_id(history):
+    chunks = list(history.iter_chunks(include_rejected=True, chunk_size=4))
+    ids = [row["id"] for chunk in chunks for row in chunk]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 1]
+    assert ids == sorted(ids)
+
+    resumed = [row["id"] for chunk in history.iter_chunks(include_rejected=True, after_id=ids[4]) for row in chunk]
+    assert resumed == ids[5:]
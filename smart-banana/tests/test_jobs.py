@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, JobWorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=2)
+
+
+def expire_leases(queue):
+    queue._conn().execute("UPDATE jobs SET lease_until = ? WHERE status = 'running'", (time.time() - 1,))
+
+
+def test_claim_leases_oldest_job_once(queue):
+    first = queue.enqueue(b"a")
+    second = queue.enqueue(b"b")
+
+    job = queue.claim()
+    assert job["id"] == first
+    assert job["payload"] == b"a"
+    assert job["attempts"] == 1
+    assert queue.get(first)["status"] == "running"
+
+    # A job under a live lease is not handed out again
+    assert queue.claim()["id"] == second
+    assert queue.claim() is None
+
+
+def test_expired_lease_is_claimed_again(queue):
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+    expire_leases(queue)
+
+    job = queue.claim()
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue(b"a")
+    for _ in range(2):
+        queue.claim()
+        expire_leases(queue)
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "2 attempts" in job["error"]
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    job_id = queue.enqueue(b"a")
+    queue.fail(job_id, "boom", queue.claim()["attempts"])
+    assert queue.get(job_id)["status"] == "queued"
+
+    queue.fail(job_id, "boom", queue.claim()["attempts"])
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "boom"
+
+
+def test_stale_lease_cannot_fail_or_complete_a_reclaimed_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=3)
+    job_id = queue.enqueue(b"a")
+    stale = queue.claim()
+    expire_leases(queue)
+    current = queue.claim()
+
+    assert not queue.fail(job_id, "late error", stale["attempts"])
+    assert not queue.complete(job_id, {"n": 1}, stale["attempts"])
+    assert queue.get(job_id)["status"] == "running"
+
+    assert queue.complete(job_id, {"n": 2}, current["attempts"])
+    assert queue.get(job_id)["result"] == {"n": 2}
+
+
+def test_complete_keeps_the_first_result(queue):
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+    assert queue.complete(job_id, {"n": 1})
+    assert not queue.complete(job_id, {"n": 2})
+    assert queue.get(job_id)["result"] == {"n": 1}
+
+
+def test_wait_wakes_on_claim_when_watching_for_changes(queue):
+    job_id = queue.enqueue(b"a")
+    threading.Timer(0.2, queue.claim).start()
+
+    start = time.monotonic()
+    job = queue.wait(job_id, timeout=5, poll_interval=5, changed_from="queued")
+    assert job["status"] == "running"
+    assert time.monotonic() - start < 2
+
+
+def test_worker_pool_runs_jobs_and_calls_hook_once(queue):
+    completed = []
+    pool = JobWorkerPool(queue, lambda mode, params, payload: {"size": len(payload)}, workers=2,
+                         poll_interval=0.05, on_complete=lambda job, result: completed.append(job["id"]))
+    job_id = queue.enqueue(b"abc")
+    pool.notify()
+
+    job = queue.wait(job_id, timeout=5)
+    assert job["status"] == "done"
+    assert job["result"] == {"size": 3}
+    # The hook runs just after the result is stored
+    deadline = time.monotonic() + 2
+    while not completed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert completed == [job_id]
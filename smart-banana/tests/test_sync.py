@@ -0,0 +1,193 @@
+import io
+import json
+import sqlite3
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sync import BundleError, BundleTooLarge, ProcessedKeyStore, process_bundle, read_bundle
+
+
+def png_bytes(size=(32, 32)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (40, 150, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_bundle(files, manifest=None):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+        if manifest is not None:
+            archive.writestr("manifest.json", manifest if isinstance(manifest, (str, bytes)) else json.dumps(manifest))
+    buffer.seek(0)
+    return buffer
+
+
+class FakeClassifier:
+    """Stands in for BananaLeafClassifier: counts the images it classifies."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.classified = 0
+        self._lock = threading.Lock()
+
+    def preprocess_image(self, image):
+        return np.zeros((1, 8, 8, 3), dtype=np.float32)
+
+    def predict_batch(self, img_batch, batch_size=32, original_sizes=None):
+        time.sleep(self.delay)
+        with self._lock:
+            self.classified += len(img_batch)
+        return [{"predicted_class": "healthy", "size": list(size)} for size in original_sizes]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProcessedKeyStore(str(tmp_path / "sync.db"))
+
+
+def items_for(*keys, data=None):
+    return [{"key": key, "data": data or png_bytes(), "meta": {}} for key in keys]
+
+
+# read_bundle
+
+def test_read_bundle_uses_manifest_keys():
+    bundle = make_bundle({"a.png": png_bytes()}, [{"key": "k1", "file": "a.png", "timestamp": "2024-06-01"}])
+    items = read_bundle(bundle)
+    assert [item["key"] for item in items] == ["k1"]
+    assert items[0]["meta"]["timestamp"] == "2024-06-01"
+
+
+def test_read_bundle_without_manifest_keys_by_file_name():
+    bundle = make_bundle({"scans/IMG_2.jpg": b"x", "IMG_1.png": b"y", "notes.txt": b"z"})
+    assert [item["key"] for item in read_bundle(bundle)] == ["IMG_1", "IMG_2"]
+
+
+@pytest.mark.parametrize("manifest", [
+    "{not json",
+    b"\xff\xfe\x00",
+    {"key": "k1", "file": "a.png"},
+    ["a.png"],
+    [{"key": "k1"}],
+    [{"key": "k1", "file": 3}],
+    [{"key": "k1", "file": "missing.png"}],
+    [{"file": "a.png"}],
+])
+def test_read_bundle_rejects_malformed_manifests(manifest):
+    with pytest.raises(BundleError):
+        read_bundle(make_bundle({"a.png": png_bytes()}, manifest))
+
+
+def test_read_bundle_rejects_non_zip_and_limits():
+    with pytest.raises(BundleError):
+        read_bundle(io.BytesIO(b"not a zip"))
+    with pytest.raises(BundleError):
+        read_bundle(make_bundle({f"{i}.png": b"x" for i in range(3)}), max_items=2)
+    with pytest.raises(BundleError):
+        read_bundle(make_bundle({"a.png": b"x" * 2048}), max_bytes=1024)
+
+
+def test_read_bundle_stops_reading_an_oversized_upload():
+    class Stream(io.BytesIO):
+        def read(self, size=-1):
+            assert size != -1, "the whole upload was read"
+            return super().read(size)
+
+    data = make_bundle({"a.png": png_bytes()}).getvalue()
+    with pytest.raises(BundleTooLarge):
+        read_bundle(Stream(data), max_upload_bytes=len(data) - 1)
+    assert len(read_bundle(Stream(data), max_upload_bytes=len(data))) == 1
+
+
+# ProcessedKeyStore
+
+def test_keys_are_scoped_to_the_device(store):
+    store.put_many({"IMG_1": {"n": 1}}, device_id="phone-a")
+    assert store.get_many(["IMG_1"], device_id="phone-a") == {"IMG_1": {"n": 1}}
+    assert store.get_many(["IMG_1"], device_id="phone-b") == {}
+
+
+def test_reserve_is_exclusive_until_released(store):
+    assert store.reserve(["k1", "k2"], device_id="d") == {"k1", "k2"}
+    assert store.reserve(["k1", "k3"], device_id="d") == {"k3"}
+    # A reservation is not a result
+    assert store.get_many(["k1"], device_id="d") == {}
+
+    store.release(["k1"], device_id="d")
+    assert store.reserve(["k1"], device_id="d") == {"k1"}
+
+
+def test_stale_reservations_can_be_taken_over(store):
+    store.reserve(["k1"], device_id="d")
+    assert store.reserve(["k1"], device_id="d", stale_seconds=-1) == {"k1"}
+
+
+def test_put_many_keeps_the_first_result(store):
+    store.reserve(["k1"], device_id="d")
+    store.put_many({"k1": {"n": 1}}, device_id="d")
+    store.put_many({"k1": {"n": 2}}, device_id="d")
+    assert store.get_many(["k1"], device_id="d") == {"k1": {"n": 1}}
+    assert store.reserve(["k1"], device_id="d") == set()
+
+
+def test_results_from_unscoped_table_are_migrated(tmp_path):
+    path = str(tmp_path / "sync.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sync_results (key TEXT PRIMARY KEY, device_id TEXT, result TEXT NOT NULL, created_at REAL NOT NULL)")
+    conn.execute("INSERT INTO sync_results VALUES ('k1', NULL, '{\"n\": 1}', 0)")
+    conn.commit()
+    conn.close()
+
+    store = ProcessedKeyStore(path)
+    assert store.get_many(["k1"]) == {"k1": {"n": 1}}
+
+
+# process_bundle
+
+def test_process_bundle_classifies_new_keys_once(store):
+    classifier = FakeClassifier()
+    items = items_for("a", "b", "a")
+
+    first = process_bundle(classifier, store, items, device_id="d")
+    assert [(r["key"], r["duplicate"]) for r in first] == [("a", False), ("b", False), ("a", True)]
+    assert first[0]["result"]["size"] == [32, 32]
+    assert classifier.classified == 2
+
+    again = process_bundle(classifier, store, items, device_id="d")
+    assert all(r["duplicate"] for r in again)
+    assert classifier.classified == 2
+
+
+def test_undecodable_images_are_released_for_retry(store):
+    classifier = FakeClassifier()
+    result = process_bundle(classifier, store, items_for("bad", data=b"not an image"), device_id="d")
+    assert "error" in result[0] and not result[0]["duplicate"]
+    assert store.reserve(["bad"], device_id="d") == {"bad"}
+
+
+def test_concurrent_uploads_classify_each_key_once(store):
+    classifier = FakeClassifier(delay=0.3)
+    items = items_for("a", "b")
+    responses = []
+
+    def upload():
+        responses.append(process_bundle(classifier, store, items, device_id="d"))
+
+    threads = [threading.Thread(target=upload) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert classifier.classified == 2
+    # Only entries with duplicate False and a result are recorded by the server
+    recorded = [r["key"] for response in responses for r in response if not r["duplicate"] and "result" in r]
+    assert sorted(recorded) == ["a", "b"]
+    assert all("result" in r for response in responses for r in response)
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import pytest
+
+from telemetry import LatencySketch, OTHER_VERSION, TelemetryAggregator
+
+
+@pytest.fixture
+def telemetry(tmp_path):
+    return TelemetryAggregator(str(tmp_path / "telemetry.db"), flush_interval=3600, max_versions=2)
+
+
+def event(value_ms=100.0, metric="end_to_end"):
+    return {"metric": metric, "value_ms": value_ms}
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.99])
+def test_sketch_quantiles_are_within_relative_accuracy(q):
+    values = np.random.default_rng(0).lognormal(mean=5, sigma=1, size=20000)
+    sketch = LatencySketch(relative_accuracy=0.02)
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.03)
+
+
+def test_sketch_weights_and_merge():
+    weighted, merged = LatencySketch(), LatencySketch()
+    weighted.add(10.0, weight=10)
+    weighted.add(1000.0, weight=10)
+    for value in (10.0, 1000.0):
+        part = LatencySketch()
+        for _ in range(10):
+            part.add(value)
+        merged.merge(part)
+
+    assert weighted.buckets == merged.buckets
+    assert weighted.summary() == merged.summary()
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_sketch_round_trips_through_json():
+    sketch = LatencySketch()
+    for value in (0.01, 5.0, 250.0, 10 ** 7):
+        sketch.add(value)
+    loaded = LatencySketch()
+    loaded.load_json(sketch.to_json(), sketch.count, sketch.total)
+    assert loaded.buckets == sketch.buckets
+
+
+def test_ingest_weights_by_sample_rate_and_drops_invalid_events(telemetry):
+    accepted, dropped = telemetry.ingest(
+        [event(), event(metric="bogus"), {"metric": "upload"}, event(float("nan")), event(-1)],
+        app_version="1.0", sample_rate=0.25
+    )
+    assert (accepted, dropped) == (1, 4)
+    sketch = telemetry._sketches[("1.0", "unknown", "end_to_end")]
+    assert sketch.count == pytest.approx(4.0)
+
+
+def test_rejected_batches_do_not_take_version_slots(telemetry):
+    for version in ("junk-1", "junk-2", "junk-3"):
+        telemetry.ingest([event(metric="bogus")], app_version=version)
+    telemetry.ingest([event()], app_version="1.0")
+    telemetry.ingest([event()], app_version="2.0")
+    telemetry.ingest([event()], app_version="3.0")
+
+    versions = {key[0] for key in telemetry._sketches}
+    assert versions == {"1.0", "2.0", OTHER_VERSION}
+
+
+def test_version_slots_reset_with_each_window(telemetry):
+    telemetry.ingest([event()], app_version="1.0")
+    telemetry.ingest([event()], app_version="2.0")
+    telemetry.flush()
+    telemetry.ingest([event()], app_version="3.0")
+    assert ("3.0", "unknown", "end_to_end") in telemetry._sketches
+
+
+def test_failed_flush_keeps_the_window(telemetry):
+    telemetry.ingest([event(100.0)], app_version="1.0")
+
+    class BrokenConnection:
+        in_transaction = False
+
+        def execute(self, *args):
+            raise OSError("disk full")
+
+    connection = telemetry._conn()
+    telemetry._local.conn = BrokenConnection()
+    with pytest.raises(OSError):
+        telemetry.flush()
+    telemetry.ingest([event(200.0)], app_version="1.0")
+
+    telemetry._local.conn = connection
+    telemetry.flush()
+    assert telemetry._sketches == {}
+    clients = telemetry.report(since=0)["clients"]
+    assert clients[0]["metrics"]["end_to_end"]["count"] == 2
+
+
+def test_report_includes_the_open_window_only_when_it_overlaps(telemetry):
+    telemetry.ingest([event(100.0)], app_version="1.0")
+    telemetry.flush()
+    flushed_start = telemetry._conn().execute("SELECT MAX(window_start) FROM telemetry_windows").fetchone()[0]
+    telemetry.ingest([event(100.0)], app_version="1.0")
+
+    def count(**kwargs):
+        clients = telemetry.report(**kwargs)["clients"]
+        return clients[0]["metrics"]["end_to_end"]["count"] if clients else 0
+
+    assert count() == 2
+    # A closed range before the open window only sees flushed data
+    assert count(since=flushed_start, until=telemetry._window_start) == 1
+    assert count(since=flushed_start - 10, until=flushed_start) == 0
+    assert count(since=time.time() + 60) == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+from enhanced_inference import tile_grid  # noqa: E402
+
+TILE = 160
+
+
+def covered(tops, lefts, size):
+    """Mask of the pixels of a (width, height) image that fall in at least one tile."""
+    width, height = size
+    mask = np.zeros((height, width), dtype=bool)
+    for top in tops:
+        for left in lefts:
+            mask[top:top + TILE, left:left + TILE] = True
+    return mask
+
+
+@pytest.mark.parametrize("height,width", [(160, 160), (400, 500), (3000, 4000), (100, 80)])
+def test_grid_covers_the_image_within_max_tiles(height, width):
+    scale, size, tops, lefts = tile_grid(height, width, TILE, overlap=0.25, max_tiles=48)
+
+    assert len(tops) * len(lefts) <= 48
+    assert min(size) >= TILE
+    assert tops[0] == 0 and lefts[0] == 0
+    # Last tile is aligned with the edge and every pixel is in some tile
+    assert tops[-1] == size[1] - TILE and lefts[-1] == size[0] - TILE
+    assert covered(tops, lefts, size).all()
+
+
+def test_small_images_are_enlarged_to_one_tile():
+    scale, size, tops, lefts = tile_grid(100, 80, TILE)
+    assert scale == pytest.approx(2.0)
+    assert min(size) == TILE
+
+
+def test_image_that_fits_is_not_rescaled():
+    scale, size, tops, lefts = tile_grid(400, 500, TILE, max_tiles=48)
+    assert scale == 1.0
+    assert size == (500, 400)
+
+
+@pytest.mark.parametrize("height,width", [(160, 20000), (20000, 200), (200, 9000)])
+@pytest.mark.parametrize("max_tiles", [1, 7, 48])
+def test_extreme_aspect_ratios_stay_within_max_tiles(height, width, max_tiles):
+    scale, size, tops, lefts = tile_grid(height, width, TILE, max_tiles=max_tiles)
+
+    assert len(tops) * len(lefts) <= max_tiles
+    assert min(size) == TILE
+    assert np.all(np.diff(tops) > 0) and np.all(np.diff(lefts) > 0)
+    assert tops.max() <= size[1] - TILE and lefts.max() <= size[0] - TILE
@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+
+from tracing import Tracer, current_trace_id, parse_traceparent, span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SAMPLED = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+NOT_SAMPLED = f"00-{TRACE_ID}-00f067aa0ba902b7-00"
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(SAMPLED) == (TRACE_ID, "00f067aa0ba902b7", True)
+    assert parse_traceparent(NOT_SAMPLED.upper()) == (TRACE_ID, "00f067aa0ba902b7", False)
+    assert parse_traceparent(f"  {SAMPLED}  ") is not None
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "garbage",
+    f"ff-{TRACE_ID}-00f067aa0ba902b7-01",
+    f"00-{'0' * 32}-00f067aa0ba902b7-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+    f"00-{TRACE_ID[:-1]}-00f067aa0ba902b7-01",
+    f"00-{TRACE_ID}-00f067aa0ba902b7",
+])
+def test_parse_traceparent_rejects_invalid_headers(header):
+    assert parse_traceparent(header) is None
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    return Tracer(str(tmp_path / "traces.jsonl"), slow_ms=10000, sample_rate=0.0, max_upstream_per_second=5,
+                  flush_interval=0.05)
+
+
+def test_trace_joins_the_caller_and_records_child_spans(tracer):
+    trace = tracer.start(SAMPLED, "POST /predict")
+    with span("inference", batch=1):
+        assert current_trace_id() == TRACE_ID
+    assert tracer.finish(trace, status=200)
+    assert current_trace_id() is None
+    assert trace.traceparent().startswith(f"00-{TRACE_ID}-") and trace.traceparent().endswith("-01")
+
+    tracer.flush()
+    with open(tracer.path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    root, child = spans
+    assert root["parentSpanId"] == "00f067aa0ba902b7"
+    assert child["parentSpanId"] == root["spanId"]
+    assert child["attributes"] == {"batch": 1}
+
+
+def test_unsampled_fast_traces_are_discarded(tracer):
+    assert not tracer.finish(tracer.start(NOT_SAMPLED))
+    assert not tracer.finish(tracer.start(None))
+    assert tracer.status()["discarded"] == 2
+
+
+def test_slow_traces_are_always_kept(tracer):
+    tracer.slow_ms = 0
+    assert tracer.finish(tracer.start(None))
+    assert tracer.status()["kept"]["slow"] == 1
+
+
+def test_upstream_sampling_is_rate_limited_across_threads(tracer):
+    def run():
+        for _ in range(50):
+            tracer.finish(tracer.start(SAMPLED))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    status = tracer.status()
+    # A five-token bucket that refills at 5/s; the loop takes well under a second
+    assert 5 <= status["kept"]["sampled"] <= 10
+    assert status["kept"]["sampled"] + status["discarded"] == 200
+    assert status["upstream_limited"] == status["discarded"]
+
+
+def test_rate_limited_trace_is_not_propagated_as_sampled(tracer):
+    tracer.max_upstream_per_second = tracer._upstream_tokens = 0
+    trace = tracer.start(SAMPLED)
+    assert trace.traceparent().endswith("-00")
+    tracer.finish(trace)
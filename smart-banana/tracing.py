@@ -0,0 +1,295 @@
+"""
+Request Tracing
+W3C trace-context propagation and span recording for the prediction pipeline.
+
+A request that arrives with a traceparent header joins the caller's trace;
+otherwise a new trace is started. The response carries a traceparent for
+the server span, so an app session can be linked to the server-side work.
+
+Spans (decode, gating, inference, serialization, ...) are collected in
+memory while the request runs. When it finishes, the whole trace is kept
+if the caller sampled it, if it falls in the random head sample, or if the
+request was slower than the threshold, so every slow request has its full
+trace. Callers' sampled flags are honoured up to a rate limit, so a client
+that samples everything cannot make the server keep every trace. Kept spans go on a queue; a background thread appends them to a
+JSON lines file in batches, so the request never waits on the disk.
+
+Usage:
+    tracer = Tracer("data/traces.jsonl", slow_ms=1000, sample_rate=0.01)
+    trace = tracer.start(request.headers.get("traceparent"), "POST /predict")
+    with span("inference", resolution=160):
+        ...
+    tracer.finish(trace)
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SAMPLED_FLAG = 0x01
+
+logger = logging.getLogger(__name__)
+
+# Span the current request is in; None outside a traced request
+_current = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header):
+    """
+    Parse a W3C traceparent header.
+
+    Returns:
+        Tuple of (trace_id, parent_span_id, sampled) or None if absent or invalid
+    """
+    match = TRACEPARENT.match((header or "").strip().lower())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & SAMPLED_FLAG)
+
+
+def current_trace_id():
+    """Trace ID of the request being traced in this context, or None."""
+    current = _current.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def _new_id(length):
+    return f"{random.getrandbits(length * 4):0{length}x}"
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = _new_id(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """The spans of one request, held until the sampling decision is made."""
+
+    def __init__(self, name, traceparent=None, head_sampled=False, attributes=None):
+        parsed = parse_traceparent(traceparent)
+        if parsed is not None:
+            self.trace_id, parent_id, upstream_sampled = parsed
+        else:
+            self.trace_id, parent_id, upstream_sampled = _new_id(32), None, False
+        self.upstream_sampled = upstream_sampled
+        self.sampled = upstream_sampled or head_sampled
+        self.spans = []
+        self.root = self.add_span(name, parent_id, attributes or {})
+        self._token = None
+
+    def add_span(self, name, parent_id, attributes):
+        span_ = Span(self, name, parent_id, attributes)
+        self.spans.append(span_)
+        return span_
+
+    def traceparent(self):
+        """Header value identifying the server span, for the response or outgoing calls."""
+        return f"00-{self.trace_id}-{self.root.span_id}-{SAMPLED_FLAG if self.sampled else 0:02x}"
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Record a child span of the current span. Does nothing outside a traced request.
+
+    Yields:
+        The Span (or None when not tracing), so attributes can be added
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.trace.add_span(name, parent.span_id, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+class Tracer:
+    def __init__(self, path, slow_ms=1000.0, sample_rate=0.01, max_upstream_per_second=10.0, flush_interval=1.0,
+                 max_batch=500, max_queue=10000, max_file_bytes=100 * 1024 * 1024):
+        """
+        Args:
+            path: JSON lines file spans are appended to
+            slow_ms: Requests at least this slow always keep their full trace
+            sample_rate: Fraction of other requests kept
+            max_upstream_per_second: Traces per second kept because the caller sampled
+                them; beyond this, callers' sampled flags are ignored (None: no limit)
+            flush_interval: Longest time a kept span waits before it is written
+            max_batch: Spans per write
+            max_queue: Spans held in memory; beyond this whole traces are dropped
+            max_file_bytes: The file is rotated to <path>.1 above this size
+        """
+        self.path = path
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_upstream_per_second = max_upstream_per_second
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_file_bytes = max_file_bytes
+        self.kept = {"sampled": 0, "slow": 0}
+        self.discarded = 0
+        self.upstream_limited = 0
+        self.dropped = 0
+        self.written = 0
+
+        # Counters are updated from request threads and the writer thread
+        self._lock = threading.Lock()
+        # Token bucket for upstream-sampled traces, holding up to one second's worth
+        self._upstream_tokens = max_upstream_per_second or 0.0
+        self._upstream_refilled = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def start(self, traceparent=None, name="request", **attributes):
+        """Begin a trace for the current request and make its root span current."""
+        head_sampled = random.random() < self.sample_rate
+        trace = Trace(name, traceparent, head_sampled=head_sampled, attributes=attributes)
+        if trace.upstream_sampled and not head_sampled and not self._take_upstream_token():
+            trace.sampled = False
+        trace._token = _current.set(trace.root)
+        return trace
+
+    def _take_upstream_token(self):
+        if self.max_upstream_per_second is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._upstream_tokens = min(
+                self.max_upstream_per_second,
+                self._upstream_tokens + (now - self._upstream_refilled) * self.max_upstream_per_second
+            )
+            self._upstream_refilled = now
+            if self._upstream_tokens < 1.0:
+                self.upstream_limited += 1
+                return False
+            self._upstream_tokens -= 1.0
+            return True
+
+    def finish(self, trace, **attributes):
+        """
+        End the root span, decide whether to keep the trace and queue it for export.
+
+        Returns:
+            True if the trace was kept
+        """
+        if trace._token is not None:
+            try:
+                _current.reset(trace._token)
+            except ValueError:
+                # Finished from a different context (e.g. a teardown hook)
+                _current.set(None)
+            trace._token = None
+        root = trace.root
+        root.set(**attributes)
+        root.end_ns = time.time_ns()
+
+        slow = (root.end_ns - root.start_ns) / 1e6 >= self.slow_ms
+        if not (trace.sampled or slow):
+            with self._lock:
+                self.discarded += 1
+            return False
+        if self._queue.qsize() + len(trace.spans) > self._queue.maxsize:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        root.set(slow=slow)
+        with self._lock:
+            self.kept["sampled" if trace.sampled else "slow"] += 1
+        for span_ in trace.spans:
+            if span_.end_ns is None:
+                span_.end_ns = root.end_ns
+            try:
+                self._queue.put_nowait(span_.to_dict())
+            except queue.Full:
+                break
+        return True
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(spans) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    spans.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(spans)
+            for _ in spans:
+                self._queue.task_done()
+
+    def _write(self, spans):
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_file_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s, default=str) + "\n" for s in spans))
+        except Exception as e:
+            logger.error("Failed to export spans", extra={"spans": len(spans), "error": str(e)})
+            return
+        with self._lock:
+            self.written += len(spans)
+
+    def flush(self):
+        """Block until every queued span has been written."""
+        self._queue.join()
+
+    def status(self):
+        with self._lock:
+            return {
+                "kept": dict(self.kept),
+                "discarded": self.discarded,
+                "dropped": self.dropped,
+                "upstream_limited": self.upstream_limited,
+                "written": self.written,
+                "slow_ms": self.slow_ms,
+                "sample_rate": self.sample_rate,
+                "max_upstream_per_second": self.max_upstream_per_second,
+            }
@@ -0,0 +1,540 @@
+"""
+MobileNetV2 Training Script
+Packaged version of the train.ipynb pipeline built on tf.data.
+
+Images are decoded in parallel, resized once and cached as uint8, augmented
+a whole batch at a time and prefetched, so the accelerator is not left waiting
+on Python between batches. The model and the two-stage schedule (frozen
+backbone, then fine-tuning from layer fine_tune_at) match the notebook.
+
+Usage:
+    python train.py --data-dir BananaLSD/AugmentedSet
+    python train.py --data-dir BananaLSD/AugmentedSet --cache-dir /tmp/banana_cache
+    python train.py --shard-dir shards/
+    python train.py --data-dir BananaLSD/AugmentedSet --img-size 128
+    python train.py --shard-dir shards/ --distill-from saved_models/banana_mobilenetv2_final.keras --student-alpha 0.35
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping, ModelCheckpoint
+from tensorflow.keras.optimizers import Adam
+
+# ------- Defaults (same as train.ipynb) -------
+DISEASES = ['cordana', 'healthy', 'pestalotiopsis', 'sigatoka']
+IMG_HEIGHT = 160
+IMG_WIDTH = 160
+BATCH_SIZE = 32
+EPOCHS_STAGE1 = 8     # initial training with frozen base
+EPOCHS_STAGE2 = 8     # fine-tuning after unfreeze
+LEARNING_RATE = 1e-4
+FINE_TUNE_AT = 100    # layer index to start fine-tuning
+DISTILL_ALPHA = 0.1   # weight of the hard-label loss when distilling
+DISTILL_TEMPERATURE = 4.0
+VALIDATION_SPLIT = 0.2
+SEED = 42
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+AUTOTUNE = tf.data.AUTOTUNE
+# ----------------------------------------------
+
+
+def list_image_files(base_dir, diseases=DISEASES, validation_split=VALIDATION_SPLIT):
+    """
+    List the images of every class and split them into training and validation.
+
+    Like flow_from_directory, the split is taken per class over the sorted file
+    names, so it is the same on every run and on every machine.
+
+    Args:
+        base_dir: Directory with one sub-directory per class
+        diseases: Class names, in label order
+        validation_split: Fraction of each class used for validation
+
+    Returns:
+        Tuple of ((train_paths, train_labels), (val_paths, val_labels))
+    """
+    train_paths, train_labels, val_paths, val_labels = [], [], [], []
+
+    for label, disease in enumerate(diseases):
+        class_dir = os.path.join(base_dir, disease)
+        files = sorted(
+            f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS)
+        ) if os.path.exists(class_dir) else []
+        print(f"{disease}: {len(files)} images")
+
+        split_at = int(len(files) * validation_split)
+        for i, filename in enumerate(files):
+            path = os.path.join(class_dir, filename)
+            if i < split_at:
+                val_paths.append(path)
+                val_labels.append(label)
+            else:
+                train_paths.append(path)
+                train_labels.append(label)
+
+    return (train_paths, train_labels), (val_paths, val_labels)
+
+
+def decode_and_resize(path, label, img_size=(IMG_HEIGHT, IMG_WIDTH)):
+    """Read, decode and resize one image, keeping it as uint8 for caching."""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, img_size)
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    image.set_shape((img_size[0], img_size[1], 3))
+    return image, label
+
+
+def build_augmenter(seed=SEED):
+    """
+    Batch-level augmentations equivalent to the notebook's ImageDataGenerator
+    settings (rotation 20 degrees, 15% shifts and zoom, horizontal flips).
+    """
+    return tf.keras.Sequential([
+        layers.RandomRotation(20 / 360, fill_mode='nearest', seed=seed),
+        layers.RandomTranslation(0.15, 0.15, fill_mode='nearest', seed=seed + 1),
+        layers.RandomZoom(0.15, fill_mode='nearest', seed=seed + 2),
+        layers.RandomFlip('horizontal', seed=seed + 3),
+    ], name='augmentation')
+
+
+def build_dataset(paths, labels, training, batch_size=BATCH_SIZE, img_size=(IMG_HEIGHT, IMG_WIDTH),
+                  num_classes=len(DISEASES), cache_path=None, num_shards=1, shard_index=0, seed=SEED):
+    """
+    Build the input pipeline for one split.
+
+    Args:
+        paths: Image file paths
+        labels: Integer labels
+        training: Whether to shuffle and augment
+        batch_size: Batch size
+        img_size: Model input size
+        num_classes: Number of classes for one-hot labels
+        cache_path: File prefix for an on-disk cache; None caches in memory
+        num_shards: Number of workers sharing the data
+        shard_index: Index of this worker
+        seed: Seed for shuffling and augmentation
+
+    Returns:
+        A batched, prefetched tf.data.Dataset of (image, one_hot_label)
+    """
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+
+    # Shard on file names before decoding so every worker reads only its own files
+    if num_shards > 1:
+        ds = ds.shard(num_shards, shard_index)
+
+    ds = ds.map(lambda p, y: decode_and_resize(p, y, img_size), num_parallel_calls=AUTOTUNE)
+
+    # Decoded, resized images are cached so JPEGs are only decoded on the first epoch
+    ds = ds.cache(cache_path) if cache_path else ds.cache()
+
+    if training:
+        ds = ds.shuffle(min(len(paths), 4096), seed=seed, reshuffle_each_iteration=True)
+
+    ds = ds.batch(batch_size)
+
+    return _augment_and_prefetch(ds, training, num_classes, seed)
+
+
+def build_shard_dataset(shards, indices, training, batch_size=BATCH_SIZE, num_classes=len(DISEASES),
+                        num_shards=1, shard_index=0, seed=SEED, img_size=None):
+    """
+    Build the input pipeline for one split from pre-decoded shards
+    (see dataset_shards.py), skipping JPEG decoding entirely.
+
+    Args:
+        shards: A dataset_shards.ShardedDataset
+        indices: Global row indices of this split
+        training: Whether to shuffle and augment
+        batch_size: Batch size
+        num_classes: Number of classes for one-hot labels
+        num_shards: Number of workers sharing the data
+        shard_index: Index of this worker
+        seed: Seed for shuffling and augmentation
+        img_size: Model input size, if different from the size stored in the shards
+
+    Returns:
+        A batched, prefetched tf.data.Dataset of (image, one_hot_label)
+    """
+    indices = np.asarray(indices)[shard_index::num_shards]
+    rng = np.random.default_rng(seed)
+    width, height = shards.image_size
+
+    def generator():
+        # A new permutation per epoch, drawn from a seeded generator
+        order = rng.permutation(indices) if training else indices
+        for images, labels, _ in shards.iter_batches(batch_size, order):
+            yield images, labels
+
+    ds = tf.data.Dataset.from_generator(
+        generator,
+        output_signature=(
+            tf.TensorSpec(shape=(None, height, width, 3), dtype=tf.uint8),
+            tf.TensorSpec(shape=(None,), dtype=tf.int64),
+        )
+    )
+    if img_size and tuple(img_size) != (height, width):
+        ds = ds.map(lambda x, y: (tf.cast(tf.image.resize(x, img_size, antialias=True), tf.uint8), y),
+                    num_parallel_calls=AUTOTUNE)
+
+    return _augment_and_prefetch(ds, training, num_classes, seed)
+
+
+def _augment_and_prefetch(ds, training, num_classes, seed):
+    """Batch-level augmentation, MobileNetV2 preprocessing and prefetching."""
+    if training:
+        augmenter = build_augmenter(seed)
+        ds = ds.map(lambda x, y: (augmenter(tf.cast(x, tf.float32), training=True), y),
+                    num_parallel_calls=AUTOTUNE)
+
+    ds = ds.map(lambda x, y: (preprocess_input(tf.cast(x, tf.float32)), tf.one_hot(y, num_classes)),
+                num_parallel_calls=AUTOTUNE)
+
+    options = tf.data.Options()
+    options.deterministic = True
+    ds = ds.with_options(options)
+
+    return ds.prefetch(AUTOTUNE)
+
+
+def build_model(img_size=(IMG_HEIGHT, IMG_WIDTH), num_classes=len(DISEASES), alpha=1.0):
+    """
+    Build the MobileNetV2 transfer model used in production.
+
+    Args:
+        img_size: Model input size
+        num_classes: Number of output classes
+        alpha: MobileNetV2 width multiplier (0.35 or 0.5 for distilled students)
+
+    Returns:
+        Tuple of (model, base_model)
+    """
+    base_model = MobileNetV2(weights='imagenet', include_top=False, alpha=alpha,
+                             input_shape=(img_size[0], img_size[1], 3))
+    base_model.trainable = False  # freeze the pretrained backbone
+
+    inputs = layers.Input(shape=(img_size[0], img_size[1], 3))
+    x = base_model(inputs, training=False)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.3)(x)
+    x = layers.Dense(128, activation='relu')(x)   # small head
+    x = layers.Dropout(0.2)(x)
+    outputs = layers.Dense(num_classes, activation='softmax')(x)
+
+    return models.Model(inputs, outputs), base_model
+
+
+def _match_input(x, model):
+    """Resize a batch to the model's input size (a student may train at a smaller size than its teacher)."""
+    size = tuple(model.input_shape[1:3])
+    if tuple(x.shape[1:3]) == size:
+        return x
+    return tf.image.resize(x, size)
+
+
+class Distiller(models.Model):
+    """
+    Trains a student model against a frozen teacher.
+
+    The loss mixes cross-entropy on the true labels (weight alpha) with the
+    KL divergence between temperature-softened teacher and student outputs.
+    Both models end in a softmax, so log-probabilities stand in for logits;
+    the softmax is unaffected by the constant offset this introduces.
+    """
+
+    def __init__(self, student, teacher, alpha=DISTILL_ALPHA, temperature=DISTILL_TEMPERATURE, **kwargs):
+        super().__init__(**kwargs)
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.alpha = alpha
+        self.temperature = temperature
+        self._hard_loss = tf.keras.losses.CategoricalCrossentropy()
+        self._soft_loss = tf.keras.losses.KLDivergence()
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def compute_loss(self, x=None, y=None, y_pred=None, sample_weight=None, **kwargs):
+        teacher_pred = self.teacher(_match_input(x, self.teacher), training=False)
+        soft_teacher = tf.nn.softmax(tf.math.log(teacher_pred + 1e-8) / self.temperature)
+        soft_student = tf.nn.softmax(tf.math.log(y_pred + 1e-8) / self.temperature)
+
+        hard = self._hard_loss(y, y_pred)
+        soft = self._soft_loss(soft_teacher, soft_student) * self.temperature ** 2
+        return self.alpha * hard + (1 - self.alpha) * soft
+
+
+def compare_with_teacher(student, teacher_classifier, val_ds):
+    """
+    Compare a distilled student with its teacher on the validation set.
+
+    Both models are fed what the server feeds them: pixels scaled to [0, 1],
+    as BananaLeafClassifier.preprocess_image produces, not the [-1, 1]
+    training input. Rejection decisions apply the teacher classifier's rules
+    (including any calibrated thresholds) to both models' probabilities.
+
+    Args:
+        student: Trained student model
+        teacher_classifier: BananaLeafClassifier wrapping the teacher
+        val_ds: Validation dataset of (preprocessed image, one_hot_label)
+
+    Returns:
+        Report dictionary
+    """
+    rules = teacher_classifier
+    teacher = teacher_classifier.model
+
+    labels, student_probs, teacher_probs, leaf_like = [], [], [], []
+    for x, y in val_ds:
+        labels.append(np.argmax(y.numpy(), axis=1))
+        # Undo preprocess_input: (x + 1) / 2 equals the uint8 pixels / 255 the server uses
+        images = tf.constant((x.numpy() + 1.0) / 2.0, dtype=tf.float32)
+        student_probs.append(student(images, training=False).numpy())
+        teacher_probs.append(teacher(_match_input(images, teacher), training=False).numpy())
+        leaf_like.extend(rules.is_banana_leaf_like(images[i:i + 1].numpy()) for i in range(len(images)))
+
+    labels = np.concatenate(labels)
+    student_probs = np.concatenate(student_probs)
+    teacher_probs = np.concatenate(teacher_probs)
+
+    student_rejected = np.array([rules._build_result(p, l)["is_rejected"] for p, l in zip(student_probs, leaf_like)])
+    teacher_rejected = np.array([rules._build_result(p, l)["is_rejected"] for p, l in zip(teacher_probs, leaf_like)])
+
+    def latency_ms(model):
+        sample = tf.zeros((1,) + tuple(model.input_shape[1:]))
+        for _ in range(5):
+            model(sample, training=False)
+        start = time.perf_counter()
+        for _ in range(50):
+            model(sample, training=False)
+        return round((time.perf_counter() - start) * 1000 / 50, 3)
+
+    return {
+        "images": int(len(labels)),
+        "student_accuracy": float(np.mean(student_probs.argmax(axis=1) == labels)),
+        "teacher_accuracy": float(np.mean(teacher_probs.argmax(axis=1) == labels)),
+        "top1_agreement": float(np.mean(student_probs.argmax(axis=1) == teacher_probs.argmax(axis=1))),
+        "student_rejection_rate": float(student_rejected.mean()),
+        "teacher_rejection_rate": float(teacher_rejected.mean()),
+        "rejection_agreement": float(np.mean(student_rejected == teacher_rejected)),
+        "student_params": int(student.count_params()),
+        "teacher_params": int(teacher.count_params()),
+        "student_latency_ms": latency_ms(student),
+        "teacher_latency_ms": latency_ms(teacher),
+    }
+
+
+def build_callbacks(checkpoint_path):
+    """Callbacks shared by both training stages."""
+    return [
+        ModelCheckpoint(
+            checkpoint_path,
+            monitor='val_accuracy',
+            save_best_only=True,
+            save_weights_only=True,
+            verbose=1
+        ),
+        ReduceLROnPlateau(
+            monitor='val_loss', factor=0.2, patience=3, min_lr=1e-6, verbose=1
+        ),
+        EarlyStopping(
+            monitor='val_accuracy', patience=8, restore_best_weights=True, verbose=1
+        )
+    ]
+
+
+def train(data_dir, model_out_dir='saved_models', epochs_stage1=EPOCHS_STAGE1, epochs_stage2=EPOCHS_STAGE2,
+          batch_size=BATCH_SIZE, learning_rate=LEARNING_RATE, fine_tune_at=FINE_TUNE_AT,
+          cache_dir=None, num_shards=1, shard_index=0, seed=SEED, shard_dir=None,
+          teacher_path=None, student_alpha=0.35, distill_alpha=DISTILL_ALPHA, temperature=DISTILL_TEMPERATURE,
+          img_size=IMG_HEIGHT):
+    """
+    Train the model with the two-stage schedule from train.ipynb.
+
+    With teacher_path, a narrower MobileNetV2 student is distilled from the
+    given model instead. It keeps the same input size and outputs, so
+    BananaLeafClassifier can serve it in place of the full model.
+
+    A smaller img_size produces a variant the server can fall back to under
+    load (see BANANA_RESOLUTION_MODELS in server.py).
+
+    Args:
+        data_dir: Directory with one sub-directory per class (ignored with shard_dir)
+        model_out_dir: Where to write weights, the final model and class indices
+        epochs_stage1: Epochs with the backbone frozen
+        epochs_stage2: Epochs of fine-tuning
+        batch_size: Batch size
+        learning_rate: Stage 1 learning rate (stage 2 uses a tenth of it)
+        fine_tune_at: First backbone layer that is unfrozen in stage 2
+        cache_dir: Directory for on-disk caches; None caches in memory
+        num_shards: Number of workers sharing the data
+        shard_index: Index of this worker
+        seed: Random seed
+        shard_dir: Read pre-decoded shards from dataset_shards.py instead of JPEGs
+        teacher_path: Distill from this model instead of training with labels only
+        student_alpha: MobileNetV2 width multiplier of the student
+        distill_alpha: Weight of the hard-label loss when distilling
+        temperature: Softmax temperature for distillation
+        img_size: Square model input size in pixels
+
+    Returns:
+        Tuple of (model, path to the saved .keras file)
+    """
+    tf.random.set_seed(seed)
+    np.random.seed(seed)
+    os.makedirs(model_out_dir, exist_ok=True)
+    input_size = (img_size, img_size)
+
+    if shard_dir:
+        from dataset_shards import ShardedDataset
+        shards = ShardedDataset(shard_dir)
+        train_idx, val_idx = shards.split(VALIDATION_SPLIT)
+        print(f"📁 {len(train_idx)} training / {len(val_idx)} validation images from {shard_dir}")
+
+        train_ds = build_shard_dataset(shards, train_idx, training=True, batch_size=batch_size,
+                                       num_shards=num_shards, shard_index=shard_index, seed=seed,
+                                       img_size=input_size)
+        val_ds = build_shard_dataset(shards, val_idx, training=False, batch_size=batch_size,
+                                     num_shards=num_shards, shard_index=shard_index, seed=seed,
+                                     img_size=input_size)
+    else:
+        (train_paths, train_labels), (val_paths, val_labels) = list_image_files(data_dir)
+
+        train_cache = val_cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            train_cache = os.path.join(cache_dir, f'train_{img_size}px_{shard_index}_of_{num_shards}')
+            val_cache = os.path.join(cache_dir, f'val_{img_size}px_{shard_index}_of_{num_shards}')
+
+        train_ds = build_dataset(train_paths, train_labels, training=True, batch_size=batch_size,
+                                 img_size=input_size, cache_path=train_cache, num_shards=num_shards, shard_index=shard_index, seed=seed)
+        val_ds = build_dataset(val_paths, val_labels, training=False, batch_size=batch_size,
+                               img_size=input_size, cache_path=val_cache, num_shards=num_shards, shard_index=shard_index, seed=seed)
+
+    teacher = None
+    if teacher_path:
+        from enhanced_inference import BananaLeafClassifier
+        print(f"🔄 Loading teacher from {teacher_path}...")
+        teacher_classifier = BananaLeafClassifier(teacher_path)
+        teacher = teacher_classifier.model
+        model, base_model = build_model(img_size=input_size, alpha=student_alpha)
+        fit_model = Distiller(model, teacher, alpha=distill_alpha, temperature=temperature)
+        name = f"banana_mobilenetv2_student_a{int(student_alpha * 100):03d}"
+    else:
+        model, base_model = build_model(img_size=input_size)
+        fit_model = model
+        name = "banana_mobilenetv2"
+    if img_size != IMG_HEIGHT:
+        name += f"_{img_size}"
+
+    fit_model.compile(
+        optimizer=Adam(learning_rate=learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    model.summary()
+
+    checkpoint_path = os.path.join(model_out_dir, f'best_{name[len("banana_"):]}.weights.h5')
+
+    # Stage 1: train head (backbone frozen)
+    print("🔄 Stage 1: training classification head...")
+    history1 = fit_model.fit(train_ds, validation_data=val_ds, epochs=epochs_stage1,
+                             callbacks=build_callbacks(checkpoint_path))
+
+    if os.path.exists(checkpoint_path):
+        fit_model.load_weights(checkpoint_path)
+
+    # Stage 2: fine-tune - unfreeze the backbone from fine_tune_at onwards
+    print(f"🔄 Stage 2: fine-tuning from layer {fine_tune_at}...")
+    base_model.trainable = True
+    for i, layer in enumerate(base_model.layers):
+        layer.trainable = i >= fine_tune_at
+
+    fit_model.compile(
+        optimizer=Adam(learning_rate=learning_rate / 10),  # lower LR for fine-tuning
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    history2 = fit_model.fit(train_ds, validation_data=val_ds, epochs=epochs_stage2,
+                             callbacks=build_callbacks(checkpoint_path))
+
+    loss, acc = fit_model.evaluate(val_ds)
+    print(f"Final validation accuracy: {acc*100:.2f}%")
+
+    # Only the student is saved when distilling, so it loads like any other model
+    final_keras_path = os.path.join(model_out_dir, f'{name}_final.keras')
+    model.save(final_keras_path)
+    print(f"✅ Keras model saved to: {final_keras_path}")
+
+    if teacher is not None:
+        report = compare_with_teacher(model, teacher_classifier, val_ds)
+        report.update({"student_alpha": student_alpha, "distill_alpha": distill_alpha, "temperature": temperature})
+        with open(os.path.join(model_out_dir, f'{name}_distillation_report.json'), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+
+    with open(os.path.join(model_out_dir, 'class_indices.json'), 'w') as f:
+        json.dump({disease: i for i, disease in enumerate(DISEASES)}, f)
+
+    history = pd.concat([pd.DataFrame(history1.history), pd.DataFrame(history2.history)], ignore_index=True)
+    history.rename(columns={'learning_rate': 'lr'}).to_csv(
+        os.path.join(model_out_dir, 'training_history.csv' if teacher is None else f'{name}_history.csv'), index=False
+    )
+
+    return model, final_keras_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the banana leaf MobileNetV2 classifier.")
+    parser.add_argument("--data-dir", help="Directory with one sub-directory per class")
+    parser.add_argument("--shard-dir", default=None, help="Pre-decoded shards from dataset_shards.py")
+    parser.add_argument("--model-out-dir", default="saved_models")
+    parser.add_argument("--epochs-stage1", type=int, default=EPOCHS_STAGE1)
+    parser.add_argument("--epochs-stage2", type=int, default=EPOCHS_STAGE2)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--learning-rate", type=float, default=LEARNING_RATE)
+    parser.add_argument("--fine-tune-at", type=int, default=FINE_TUNE_AT)
+    parser.add_argument("--cache-dir", default=None, help="On-disk cache for decoded images (default: memory)")
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument("--shard-index", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--img-size", type=int, default=IMG_HEIGHT,
+                        help="Square input size; smaller sizes give a faster fallback model")
+    parser.add_argument("--distill-from", default=None, help="Teacher model to distill a smaller student from")
+    parser.add_argument("--student-alpha", type=float, default=0.35, choices=[0.35, 0.5, 0.75, 1.0],
+                        help="MobileNetV2 width multiplier of the student")
+    parser.add_argument("--distill-alpha", type=float, default=DISTILL_ALPHA, help="Weight of the hard-label loss")
+    parser.add_argument("--temperature", type=float, default=DISTILL_TEMPERATURE)
+    args = parser.parse_args(argv)
+    if not args.data_dir and not args.shard_dir:
+        parser.error("one of --data-dir or --shard-dir is required")
+
+    try:
+        train(
+            args.data_dir, model_out_dir=args.model_out_dir, epochs_stage1=args.epochs_stage1,
+            epochs_stage2=args.epochs_stage2, batch_size=args.batch_size, learning_rate=args.learning_rate,
+            fine_tune_at=args.fine_tune_at, cache_dir=args.cache_dir, num_shards=args.num_shards,
+            shard_index=args.shard_index, seed=args.seed, shard_dir=args.shard_dir,
+            teacher_path=args.distill_from, student_alpha=args.student_alpha,
+            distill_alpha=args.distill_alpha, temperature=args.temperature, img_size=args.img_size,
+        )
+    except Exception as e:
+        print(f"❌ Training failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())